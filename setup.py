@@ -45,6 +45,9 @@ setup(
         'udata.harvesters': [
             'dcat = udata.harvest.backends.dcat:DcatBackend',
         ],
+        'udata.linkcheckers': [
+            'http = udata.linkchecker.backends:HttpLinkchecker',
+        ],
         'udata.avatars': [
             'internal = udata.features.identicon.backends:internal',
             'adorable = udata.features.identicon.backends:adorable',
@@ -19,10 +19,9 @@ from udata.i18n import get_locale
 from udata.auth import (
     current_user, login_user, Permission, RoleNeed, PermissionDenied
 )
-from udata.core.user.models import User
 from udata.utils import safe_unicode
 
-from . import fields, oauth2
+from . import auth_cache, fields, oauth2
 from .signals import on_api_call
 
 
@@ -133,9 +132,8 @@ class UDataApi(Api):
 
             apikey = request.headers.get(HEADER_API_KEY)
             if apikey:
-                try:
-                    user = User.objects.get(apikey=apikey)
-                except User.DoesNotExist:
+                user = auth_cache.user_for_apikey(apikey)
+                if not user:
                     self.abort(401, 'Invalid API Key')
 
                 if not login_user(user, False):
@@ -335,4 +333,5 @@ def init_app(app):
     app.register_blueprint(apiv2_blueprint)
 
     oauth2.init_app(app)
+    auth_cache.init_app(app)
     cors.init_app(app)
@@ -0,0 +1,177 @@
+'''
+A short-lived in-process cache of authenticated API principals.
+
+API keys and OAuth access tokens are resolved once and kept for
+`API_AUTH_CACHE_TIMEOUT` seconds keyed by a hash of the credentials.
+Entries are invalidated when their user or token is saved or deleted.
+Invalidations are also stamped in the shared Flask cache and checked
+on each hit, so they reach the other processes.
+'''
+import copy
+import hashlib
+import logging
+import threading
+import time
+
+from flask import current_app
+from mongoengine.signals import post_save, post_delete
+
+from udata.app import cache as shared_cache
+from udata.core.user.models import User
+
+log = logging.getLogger(__name__)
+
+
+class AuthCache(object):
+    '''
+    Authenticated principals keyed by a hash of their credentials.
+
+    Raw documents are cached and a fresh instance is built on each hit
+    so no document instance is shared between requests.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}  # key -> (expires_at, user_id, payload, cached_at)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind, credentials):
+        digest = hashlib.sha256(credentials.encode('utf8')).hexdigest()
+        return '{0}:{1}'.format(kind, digest)
+
+    @staticmethod
+    def stamp_key(key=None, user_id=None):
+        '''The shared cache key of an entry or user invalidation date'''
+        return 'auth-cache:user:{0}'.format(user_id) if user_id else 'auth-cache:{0}'.format(key)
+
+    @property
+    def timeout(self):
+        return current_app.config['API_AUTH_CACHE_TIMEOUT']
+
+    def invalidated_elsewhere(self, key, entry):
+        '''Whether an entry has been invalidated by another process since it was cached'''
+        keys = [self.stamp_key(key=key)]
+        if entry[1]:
+            keys.append(self.stamp_key(user_id=entry[1]))
+        try:
+            stamps = shared_cache.get_many(*keys)
+        except Exception:
+            # Do not fail authentication on a shared cache failure
+            return True
+        return any(stamp and stamp >= entry[3] for stamp in stamps)
+
+    def get(self, key):
+        if not self.timeout:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry[0] > now and not self.invalidated_elsewhere(key, entry):
+            with self.lock:
+                self.hits += 1
+            return copy.deepcopy(entry[2])
+        with self.lock:
+            self.entries.pop(key, None)
+            self.misses += 1
+        return None
+
+    def set(self, key, user_id, payload):
+        if not self.timeout:
+            return
+        now = time.monotonic()
+        size = current_app.config['API_AUTH_CACHE_SIZE']
+        with self.lock:
+            if len(self.entries) >= size:
+                self.entries = {k: e for k, e in self.entries.items() if e[0] > now}
+            while self.entries and len(self.entries) >= size:
+                # Evict the oldest entries first
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[key] = (now + self.timeout, str(user_id) if user_id else None,
+                                 copy.deepcopy(payload), time.time())
+
+    def invalidate(self, key=None, user_id=None):
+        '''
+        Remove a given entry and/or all the entries of a given user
+        and stamp the invalidation in the shared cache for the other processes.
+        '''
+        user_id = str(user_id) if user_id else None
+        with self.lock:
+            if key:
+                self.entries.pop(key, None)
+            if user_id:
+                self.entries = {k: e for k, e in self.entries.items() if e[1] != user_id}
+        if not self.timeout:
+            return
+        stamps = {}
+        if key:
+            stamps[self.stamp_key(key=key)] = time.time()
+        if user_id:
+            stamps[self.stamp_key(user_id=user_id)] = time.time()
+        try:
+            # Stamps only need to outlive the entries they invalidate
+            shared_cache.set_many(stamps, timeout=self.timeout)
+        except Exception:
+            log.exception('Unable to share the API authentication cache invalidation')
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+
+cache = AuthCache()
+
+
+def user_for_apikey(apikey):
+    '''Get the user owning a given API key if any'''
+    key = cache.key('apikey', apikey)
+    son = cache.get(key)
+    if son is not None:
+        return User._from_son(son)
+    user = User.objects(apikey=apikey).first()
+    if user:
+        cache.set(key, user.id, user.to_mongo())
+    return user
+
+
+def token_for_access_token(access_token):
+    '''Get an OAuth2 token and its user given an access token if any'''
+    from .oauth2 import OAuth2Token
+
+    key = cache.key('token', access_token)
+    cached = cache.get(key)
+    if cached is not None:
+        token_son, user_son = cached
+        token = OAuth2Token._from_son(token_son)
+        if user_son is not None:
+            token.user = User._from_son(user_son)
+        return token
+    token = OAuth2Token.objects(access_token=access_token).first()
+    if token:
+        user = token.user
+        cache.set(key, user.id if user else None,
+                  (token.to_mongo(), user.to_mongo() if user else None))
+    return token
+
+
+def invalidate_user(sender, document, **kwargs):
+    cache.invalidate(user_id=document.id)
+
+
+def invalidate_token(sender, document, **kwargs):
+    if document.access_token:
+        cache.invalidate(key=cache.key('token', document.access_token))
+
+
+def init_app(app):
+    from .oauth2 import OAuth2Token
+
+    post_save.connect(invalidate_user, sender=User)
+    post_delete.connect(invalidate_user, sender=User)
+    post_save.connect(invalidate_token, sender=OAuth2Token)
+    post_delete.connect(invalidate_token, sender=OAuth2Token)
@@ -275,7 +275,8 @@ class RevokeToken(RevocationEndpoint):
 
 class BearerToken(BearerTokenValidator):
     def authenticate_token(self, token_string):
-        return OAuth2Token.objects(access_token=token_string).first()
+        from .auth_cache import token_for_access_token
+        return token_for_access_token(token_string)
 
     def request_invalid(self, request):
         return False
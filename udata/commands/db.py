@@ -1,10 +1,16 @@
 import collections
+import json
 import logging
 import os
 
+from concurrent.futures import ThreadPoolExecutor
+
 import click
 import mongoengine
 
+from bson import DBRef
+from pymongo.errors import PyMongoError
+
 from udata import migrations, models as core_models
 from udata.api import oauth2 as oauth2_models
 from udata.commands import cli, green, yellow, cyan, red, magenta, white, echo
@@ -136,9 +142,8 @@ def display_op(op):
     format_output(op['output'], success=op['success'], traceback=op.get('traceback'))
 
 
-def check_references(models_to_check):
-    errors = collections.defaultdict(int)
-
+def list_references(models_to_check, err=False):
+    '''List the reference paths to check with their Mongo path'''
     _models = []
     for models in core_models, harvest_models, oauth2_models:
         _models += [
@@ -149,10 +154,10 @@ def check_references(models_to_check):
     references = []
     for model in _models:
         if model.__name__ == 'Activity':
-            print(f'Skipping Activity model, scheduled for deprecation')
+            echo('Skipping Activity model, scheduled for deprecation', err=err)
             continue
         if model.__name__ == 'GeoLevel':
-            print(f'Skipping GeoLevel model, scheduled for deprecation')
+            echo('Skipping GeoLevel model, scheduled for deprecation', err=err)
             continue
 
         if models_to_check and model.__name__ not in models_to_check:
@@ -165,7 +170,9 @@ def check_references(models_to_check):
             'model': model,
             'repr': f'{model.__name__}.{r.name}',
             'name': r.name,
+            'path': r.db_field,
             'destination': r.document_type.__name__,
+            'collection': r.document_type._get_collection_name(),
             'type': 'direct',
         } for r in refs]
 
@@ -176,7 +183,9 @@ def check_references(models_to_check):
             'model': model,
             'repr': f'{model.__name__}.{r.name}',
             'name': r.name,
+            'path': f'{r.db_field}._ref',
             'destination': 'Generic',
+            'collection': None,
             'type': 'direct',
         } for r in refs]
 
@@ -189,7 +198,9 @@ def check_references(models_to_check):
             'model': model,
             'repr': f'{model.__name__}.{lr.name}',
             'name': lr.name,
+            'path': lr.db_field,
             'destination': lr.field.document_type.__name__,
+            'collection': lr.field.document_type._get_collection_name(),
             'type': 'list',
         } for lr in list_refs]
 
@@ -203,7 +214,9 @@ def check_references(models_to_check):
                 'model': model,
                 'repr': f'{model.__name__}.{embed.name}__{er.name}',
                 'name': f'{embed.name}__{er.name}',
+                'path': f'{embed.db_field}.{er.db_field}',
                 'destination': er.document_type.__name__,
+                'collection': er.document_type._get_collection_name(),
                 'type': 'embed_list',
             } for er in embed_refs]
 
@@ -217,7 +230,9 @@ def check_references(models_to_check):
                 'model': model,
                 'repr': f'{model.__name__}.{embed_field.name}__{er.name}',
                 'name': f'{embed_field.name}__{er.name}',
+                'path': f'{embed_field.db_field}.{er.db_field}',
                 'destination': er.document_type.__name__,
+                'collection': er.document_type._get_collection_name(),
                 'type': 'embed',
             } for er in embed_refs]
 
@@ -231,65 +246,130 @@ def check_references(models_to_check):
                 'model': model,
                 'repr': f'{model.__name__}.{embed_field.name}__{lr.name}',
                 'name': f'{embed_field.name}__{lr.name}',
+                'path': f'{embed_field.db_field}.{lr.db_field}',
                 'destination': lr.field.document_type.__name__,
+                'collection': lr.field.document_type._get_collection_name(),
                 'type': 'embed_list_ref',
             } for lr in elists_refs]
 
-    print('Those references will be inspected:')
-    for reference in references:
-        print(f'- {reference["repr"]}({reference["destination"]}) — {reference["type"]}')
-    print('')
+    return references
+
+
+def iter_referenced_ids(reference, batch_size):
+    '''Stream the distinct values of a reference path by batches'''
+    path = reference['path']
+    pipeline = [
+        {'$match': {path: {'$ne': None}}},
+        {'$project': {'_id': 0, 'ref': f'${path}'}},
+        # Flatten lists, scalar values are kept as is
+        {'$unwind': '$ref'},
+        {'$match': {'ref': {'$ne': None}}},
+        {'$group': {'_id': '$ref'}},
+    ]
+    collection = reference['model']._get_collection()
+    cursor = collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+    batch = []
+    for row in cursor:
+        batch.append(row['_id'])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def find_dangling(reference, values):
+    '''Filter the referenced values whose target document does not exist'''
+    database = reference['model']._get_db()
+    by_collection = collections.defaultdict(list)
+    for value in values:
+        # Generic references (and `dbref=True` ones) are stored as DBRef
+        if isinstance(value, DBRef):
+            by_collection[value.collection].append((value, value.id))
+        else:
+            by_collection[reference['collection']].append((value, value))
+    dangling = []
+    for name, refs in by_collection.items():
+        ids = [_id for _, _id in refs]
+        existing = set(doc['_id'] for doc in database[name].find(
+            {'_id': {'$in': ids}}, {'_id': 1}))
+        dangling += [value for value, _id in refs if _id not in existing]
+    return dangling
+
+
+def check_reference(reference, batch_size=1000):
+    '''
+    Check a reference path with a set-based diff of its distinct values
+    against the target collection `_id`s.
+    '''
+    result = {
+        'reference': reference['repr'],
+        'destination': reference['destination'],
+        'type': reference['type'],
+        'path': reference['path'],
+        'checked': 0,
+        'dangling': [],
+        'documents': 0,
+    }
+    dangling = []
+    try:
+        for values in iter_referenced_ids(reference, batch_size):
+            result['checked'] += len(values)
+            dangling += find_dangling(reference, values)
+        collection = reference['model']._get_collection()
+        for i in range(0, len(dangling), batch_size):
+            result['documents'] += collection.count_documents(
+                {reference['path']: {'$in': dangling[i:i + batch_size]}})
+    except PyMongoError as e:
+        result['error'] = str(e)
+    result['dangling'] = [str(getattr(value, 'id', value)) for value in dangling]
+    return result
+
+
+def check_references(models_to_check, workers=1, batch_size=1000, err=False):
+    '''
+    Check the references integrity, one reference path per worker.
+
+    Returns a report with the dangling referenced ids of each reference path
+    and the count of documents holding them.
+    Progress is displayed on stderr if `err` is set.
+    '''
+    references = list_references(models_to_check, err=err)
 
+    echo('Those references will be inspected:', err=err)
     for reference in references:
-        print(f'- {reference["repr"]}({reference["destination"]}) — {reference["type"]}...')
-        query = {f'{reference["name"]}__ne': None}
-        qs = reference['model'].objects(**query).no_cache().all()
-        try:
-            for obj in qs:
-                if reference['type'] == 'direct':
-                    try:
-                        _ = getattr(obj, reference['name'])
-                    except mongoengine.errors.DoesNotExist:
-                        errors[reference["repr"]] += 1
-                elif reference['type'] == 'list':
-                    for sub in getattr(obj, reference['name']):
-                        try:
-                            _ = sub.id
-                        except mongoengine.errors.DoesNotExist:
-                            errors[reference["repr"]] += 1
-                elif reference['type'] == 'embed_list':
-                    p1, p2 = reference['name'].split('__')
-                    for sub in getattr(obj, p1):
-                        try:
-                            getattr(sub, p2)
-                        except mongoengine.errors.DoesNotExist:
-                            errors[reference["repr"]] += 1
-                elif reference['type'] == 'embed':
-                    p1, p2 = reference['name'].split('__')
-                    sub = getattr(obj, p1)
-                    try:
-                        getattr(sub, p2)
-                    except mongoengine.errors.DoesNotExist:
-                        errors[reference["repr"]] += 1
-                elif reference['type'] == 'embed_list_ref':
-                    p1, p2 = reference['name'].split('__')
-                    sub = getattr(getattr(obj, p1), p2)
-                    for obj in sub:
-                        try:
-                            obj.id
-                        except mongoengine.errors.DoesNotExist:
-                            errors[reference["repr"]] += 1
-                else:
-                    print(f'Unknown ref type {reference["type"]}')
-            print('Errors:', errors[reference["repr"]])
-        except mongoengine.errors.FieldDoesNotExist as e:
-            print('[ERROR]', e)
-
-    print(f'\n Total errors: {sum(errors.values())}')
+        echo(f'- {reference["repr"]}({reference["destination"]}) — {reference["type"]}',
+             err=err)
+    echo('', err=err)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda r: check_reference(r, batch_size), references)
+        report = []
+        for result in results:
+            echo(f'- {result["reference"]}({result["destination"]}) — {result["type"]}...',
+                 err=err)
+            if 'error' in result:
+                echo('[ERROR] {0}'.format(result['error']), err=err)
+            echo('Errors: {0}'.format(len(result['dangling'])), err=err)
+            report.append(result)
+
+    total = sum(len(result['dangling']) for result in report)
+    echo(f'\n Total errors: {total}', err=err)
+    return {'references': report, 'total': total}
 
 
 @grp.command()
 @click.option('--models', multiple=True, default=[], help='Model(s) to check')
-def check_integrity(models):
+@click.option('-w', '--workers', default=1, type=int,
+              help='Number of reference paths checked in parallel')
+@click.option('-b', '--batch-size', default=1000, type=int,
+              help='Number of referenced ids checked at once')
+@click.option('-r', '--report', type=click.File('w'), default=None,
+              help='Write a JSON report to this file (- for stdout)')
+def check_integrity(models, workers, batch_size, report):
     '''Check the integrity of the database from a business perspective'''
-    check_references(models)
+    # Keep stdout for the report only when it is written there
+    result = check_references(models, workers=workers, batch_size=batch_size,
+                              err=report is not None)
+    if report:
+        json.dump(result, report, indent=2)
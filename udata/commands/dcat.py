@@ -8,7 +8,7 @@ from rdflib import Graph
 from udata.commands import cli, green, yellow, cyan, echo, magenta
 from udata.core.dataset.factories import DatasetFactory
 from udata.core.dataset.rdf import dataset_from_rdf
-from udata.harvest.backends.dcat import DcatBackend
+from udata.harvest.backends.dcat import DcatBackend, index_nodes
 from udata.rdf import namespace_manager
 
 log = logging.getLogger(__name__)
@@ -58,12 +58,16 @@ def parse_url(url, quiet=False, rid=''):
         serialized = subgraph.serialize(format=format, indent=None)
         _subgraph = Graph(namespace_manager=namespace_manager)
         graph += _subgraph.parse(data=serialized, format=format)
+    nodes = index_nodes(graph)
 
     for item in backend.job.items:
         if not rid or rid in item.remote_id:
             echo(magenta('Processing item {}'.format(item.remote_id)))
             echo('Item kwargs: {}'.format(yellow(item.kwargs)))
-            node = backend.get_node_from_item(graph, item)
+            node = nodes.get(item.remote_id)
+            if node is None:
+                log.error('Unable to find dataset with DCT.identifier:%s', item.remote_id)
+                continue
             dataset = MockDatasetFactory()
             dataset = dataset_from_rdf(graph, dataset, node=node)
             echo('')
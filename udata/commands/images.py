@@ -1,11 +1,29 @@
 import logging
+import multiprocessing
+import time
 
-from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+from flask import current_app
+from pymongo import UpdateOne
 
 from udata.commands import cli, header, success
+from udata.models import db
 
 log = logging.getLogger(__name__)
 
+#: Rendered images kinds as (label, model class name, image field name)
+IMAGES = (
+    ('Organization logos', 'Organization', 'logo'),
+    ('User avatars', 'User', 'avatar'),
+    ('Post images', 'Post', 'image'),
+    ('Reuse images', 'Reuse', 'image'),
+)
+
+_context = None
+
 
 @cli.group('images')
 def grp():
@@ -13,57 +31,122 @@ def grp():
     pass
 
 
-def render_or_skip(obj, attr):
-    try:
-        getattr(obj, attr).rerender()
-        obj.save()
-        return 1
-    except Exception as e:
-        log.warning('Skipped "%s": %s(%s)', obj, e.__class__.__name__, e)
-        return 0
+def init_worker(app):
+    '''
+    Give the forked rendering processes an application context.
+
+    The MongoDB client inherited from the parent process is closed:
+    its sockets and monitoring threads do not survive the fork,
+    it is reopened by the first query of the process.
+    '''
+    global _context
+    _context = app.app_context()
+    _context.push()
+    db.connection.close()
+
+
+def render_executor(app, workers=None):
+    '''A pool of forked rendering processes, inheriting the loaded application'''
+    context = multiprocessing.get_context('fork')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                               initializer=init_worker, initargs=(app,))
+
+
+def render_image(classname, attr, value):
+    '''
+    Rerender a stored image and its thumbnails from its original.
+
+    Returns the image field new stored value.
+    '''
+    field = db.resolve_model(classname)._fields[attr]
+    image = field.proxy(**value)
+    image.rerender()
+    return image.to_mongo()
+
+
+def is_rendered(field, value):
+    '''Whether a stored image has all its expected thumbnails'''
+    expected = set(str(size) for size in field.thumbnail_sizes or [])
+    thumbnails = value.get('thumbnails') or {}
+    return expected == set(size for size, filename in thumbnails.items() if filename)
+
+
+def render_model(executor, model, attr, force=False, batch_size=100):
+    '''
+    Rerender a model images within an executor by batches.
+
+    Only the image field is written, with one bulk of targeted updates
+    per batch: neither validation, save signals nor search indexation.
+    Images already having all their thumbnails are skipped unless `force` is set.
+
+    Returns the `(rendered, skipped, errors)` counts.
+    '''
+    field = model._fields[attr]
+    collection = model._get_collection()
+    rendered = skipped = errors = 0
+
+    def process(batch):
+        nonlocal rendered, errors
+        futures = [(id, stored, executor.submit(render_image, model.__name__, attr, value))
+                   for id, stored, value in batch]
+        updates = []
+        for id, stored, future in futures:
+            try:
+                updates.append(UpdateOne(
+                    # Do not override an image changed in the meantime
+                    {'_id': id, field.db_field: stored},
+                    {'$set': {field.db_field: future.result()}}
+                ))
+            except Exception as e:
+                errors += 1
+                log.warning('Skipped %s "%s": %s(%s)', model.__name__, id,
+                            e.__class__.__name__, e)
+        if updates:
+            # Images changed in the meantime are not matched thus not counted
+            rendered += collection.bulk_write(updates, ordered=False).modified_count
+
+    batch = []
+    query = {field.db_field: {'$exists': True, '$nin': [None, '']}}
+    for doc in collection.find(query, {field.db_field: 1}):
+        stored = value = doc[field.db_field]
+        if isinstance(value, str):
+            value = {'filename': value}
+        if not value.get('filename') or (not force and is_rendered(field, value)):
+            skipped += 1
+            continue
+        batch.append((doc['_id'], stored, value))
+        if len(batch) >= batch_size:
+            process(batch)
+            batch = []
+    if batch:
+        process(batch)
+    return rendered, skipped, errors
 
 
 @grp.command()
-def render():
-    '''Force (re)rendering stored images'''
-    from udata.core.organization.models import Organization
-    from udata.core.post.models import Post
-    from udata.core.reuse.models import Reuse
-    from udata.core.user.models import User
-
+@click.option('-w', '--workers', type=int, default=None,
+              help='Number of rendering processes (defaults to the CPUs count)')
+@click.option('-f', '--force', is_flag=True,
+              help='Also rerender images having all their thumbnails')
+def render(workers, force):
+    '''(Re)render stored images missing some thumbnails'''
     header('Rendering images')
 
-    count = Counter()
-    total = Counter()
-
-    organizations = Organization.objects(logo__exists=True)
-    total['orgs'] = organizations.count()
-    log.info('Processing {0} organizations logos'.format(total['orgs']))
-    for org in organizations:
-        count['orgs'] += render_or_skip(org, 'logo')
-
-    users = User.objects(avatar__exists=True)
-    total['users'] = users.count()
-    log.info('Processing {0} user avatars'.format(total['users']))
-    for user in users:
-        count['users'] += render_or_skip(user, 'avatar')
-
-    posts = Post.objects(image__exists=True)
-    total['posts'] = posts.count()
-    log.info('Processing {0} post images'.format(total['posts']))
-    for post in posts:
-        count['posts'] += render_or_skip(post, 'image')
-
-    reuses = Reuse.objects(image__exists=True)
-    total['reuses'] = reuses.count()
-    log.info('Processing {0} reuse images'.format(total['reuses']))
-    for reuse in reuses:
-        count['reuses'] += render_or_skip(reuse, 'image')
-
-    log.info('''Summary:
-    Organization logos: {count[orgs]}/{total[orgs]}
-    User avatars: {count[users]}/{total[users]}
-    Post images: {count[posts]}/{total[posts]}
-    Reuse images: {count[reuses]}/{total[reuses]}
-    '''.format(count=count, total=total))
+    app = current_app._get_current_object()
+    summary = []
+    with render_executor(app, workers) as executor:
+        for label, classname, attr in IMAGES:
+            log.info('Processing %s', label.lower())
+            start = time.monotonic()
+            rendered, skipped, errors = render_model(executor, db.resolve_model(classname),
+                                                     attr, force=force)
+            elapsed = time.monotonic() - start
+            summary.append(
+                '{0}: {1} rendered, {2} up to date, {3} errors '
+                'in {4:.1f}s ({5:.1f} images/s)'.format(
+                    label, rendered, skipped, errors, elapsed,
+                    rendered / elapsed if elapsed else 0)
+            )
+
+    log.info('Summary:\n    %s', '\n    '.join(summary))
     success('Images rendered')
@@ -79,6 +79,7 @@ class DatasetApiParser(ModelApiParser):
         'reuses': 'metrics.reuses',
         'followers': 'metrics.followers',
         'views': 'metrics.views',
+        'quality': 'quality.score',
     }
 
     def __init__(self):
@@ -94,6 +95,8 @@ class DatasetApiParser(ModelApiParser):
         self.parser.add_argument('format', type=str, location='args')
         self.parser.add_argument('schema', type=str, location='args')
         self.parser.add_argument('schema_version', type=str, location='args')
+        self.parser.add_argument('quality', type=float, location='args',
+                                 help='The minimum quality score (between 0 and 1)')
 
     @staticmethod
     def parse_filters(datasets, args):
@@ -127,6 +130,8 @@ class DatasetApiParser(ModelApiParser):
             datasets = datasets.filter(resources__schema__name=args['schema'])
         if args.get('schema_version'):
             datasets = datasets.filter(resources__schema__version=args['schema_version'])
+        if args.get('quality') is not None:
+            datasets = datasets.filter(quality__score__gte=args['quality'])
         return datasets
 
 
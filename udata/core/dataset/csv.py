@@ -39,6 +39,10 @@ class DatasetCsvAdapter(csv.Adapter):
         ('harvest.modified_at', lambda r: r.harvest and r.harvest.modified_at),
         ('quality_score', lambda o: format(o.quality['score'], '.2f')),
     )
+    requires = (
+        'slug', 'spatial', 'featured', 'created_at_internal', 'last_modified_internal',
+        'tags', 'archived', 'resources', 'harvest', 'quality', 'metrics',
+    )
 
     def dynamic_fields(self):
         return csv.metric_fields(Dataset)
@@ -67,6 +71,7 @@ class ResourcesCsvAdapter(csv.NestedAdapter):
             'archived',
             lambda r: r.archived or False),
     )
+    requires = ('slug', 'organization', 'archived')
     nested_fields = (
         'id',
         'url',
@@ -100,3 +105,4 @@ class DiscussionCsvAdapter(csv.Adapter):
         'closed',
         'closed_by',
     )
+    requires = ('discussion',)
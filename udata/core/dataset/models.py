@@ -10,6 +10,7 @@ from flask import current_app
 from mongoengine import DynamicEmbeddedDocument, ValidationError as MongoEngineValidationError
 from mongoengine.signals import pre_save, post_save
 from mongoengine.fields import DateTimeField
+from pymongo import UpdateOne
 from stringdist import rdlevenshtein
 from werkzeug.utils import cached_property
 import requests
@@ -141,6 +142,7 @@ class HarvestDatasetMetadata(DynamicEmbeddedDocument):
     dct_identifier = db.StringField()
     archived_at = db.DateTimeField()
     archived = db.StringField()
+    fingerprint = db.StringField()
 
 
 class HarvestResourceMetadata(DynamicEmbeddedDocument):
@@ -451,6 +453,39 @@ class Resource(ResourceMixin, WithMetrics, db.EmbeddedDocument):
             raise RuntimeError('Impossible to save an orphan resource')
         self.dataset.save(*args, **kwargs)
 
+    def extras_update(self, extras):
+        '''
+        Build a positional update setting only the given extras keys
+        on this resource, suitable for `bulk_write`.
+        '''
+        if not self.dataset:
+            raise RuntimeError('Impossible to update an orphan resource')
+        id_field = self._fields['id']
+        extras_field = self._fields['extras']
+        values = extras_field.to_mongo(extras)
+        return UpdateOne(
+            {'_id': self.dataset.id,
+             f'resources.{id_field.db_field}': id_field.to_mongo(self.id)},
+            {'$set': {f'resources.$.{extras_field.db_field}.{key}': value
+                      for key, value in values.items()}}
+        )
+
+    def update_extras(self, extras):
+        '''
+        Atomically set some extras keys on this resource.
+
+        Only the given keys and the dataset quality are written:
+        the dataset is neither validated nor saved as a whole and no signal is sent.
+        '''
+        if not extras:
+            return
+        self.extras.update(extras)
+        # Extras may change the dataset quality (ie. resources availability)
+        Dataset._get_collection().bulk_write([
+            self.extras_update(extras),
+            self.dataset.quality_update(),
+        ])
+
 
 class Dataset(WithMetrics, BadgeMixin, db.Owned, db.Document):
     title = db.StringField(required=True)
@@ -477,6 +512,9 @@ class Dataset(WithMetrics, BadgeMixin, db.Owned, db.Document):
 
     featured = db.BooleanField(required=True, default=False)
 
+    # Precomputed on save, see `compute_quality`
+    quality = db.DictField()
+
     created_at_internal = DateTimeField(verbose_name=_('Creation date'),
                                         default=datetime.utcnow, required=True)
     last_modified_internal = DateTimeField(verbose_name=_('Last modification date'),
@@ -506,6 +544,7 @@ class Dataset(WithMetrics, BadgeMixin, db.Owned, db.Document):
             'metrics.reuses',
             'metrics.followers',
             'metrics.views',
+            'quality.score',
             'slug',
             'resources.id',
             'resources.urlhash',
@@ -532,18 +571,19 @@ class Dataset(WithMetrics, BadgeMixin, db.Owned, db.Document):
     @classmethod
     def pre_save(cls, sender, document, **kwargs):
         cls.before_save.send(document)
+        document.quality = document.compute_quality()
 
     @classmethod
     def post_save(cls, sender, document, **kwargs):
         if 'post_save' in kwargs.get('ignores', []):
             return
-        cls.after_save.send(document)
+        db.send_signal(cls.after_save, document)
         if kwargs.get('created'):
-            cls.on_create.send(document)
+            db.send_signal(cls.on_create, document)
         else:
-            cls.on_update.send(document)
+            db.send_signal(cls.on_update, document)
         if document.deleted:
-            cls.on_delete.send(document)
+            db.send_signal(cls.on_delete, document)
 
     def clean(self):
         super(Dataset, self).clean()
@@ -663,8 +703,7 @@ class Dataset(WithMetrics, BadgeMixin, db.Owned, db.Document):
         else:
             return self.last_update + delta
 
-    @cached_property
-    def quality(self):
+    def compute_quality(self):
         """Return a dict filled with metrics related to the inner
 
         quality of the dataset:
@@ -672,12 +711,11 @@ class Dataset(WithMetrics, BadgeMixin, db.Owned, db.Document):
             * number of tags
             * description length
             * and so on
+
+        It is stored as `quality` on save, use `update_quality`
+        to refresh it on atomic updates.
         """
         result = {}
-        if not self.id:
-            # Quality is only relevant on saved Datasets
-            return result
-
         result['license'] = True if self.license else False
         result['temporal_coverage'] = True if self.temporal_coverage else False
         result['spatial'] = True if self.spatial else False
@@ -754,6 +792,20 @@ class Dataset(WithMetrics, BadgeMixin, db.Owned, db.Document):
                 score += UNIT
         return self.normalize_score(score)
 
+    def quality_update(self):
+        '''
+        Refresh the stored quality and build its update,
+        suitable for `bulk_write`.
+        '''
+        self.quality = self.compute_quality()
+        field = self._fields['quality']
+        return UpdateOne({'_id': self.id},
+                         {'$set': {field.db_field: field.to_mongo(self.quality)}})
+
+    def update_quality(self):
+        '''Atomically refresh the stored quality without any signal'''
+        self.__class__._get_collection().bulk_write([self.quality_update()])
+
     @classmethod
     def get(cls, id_or_slug):
         obj = cls.objects(slug=id_or_slug).first()
@@ -771,6 +823,7 @@ class Dataset(WithMetrics, BadgeMixin, db.Owned, db.Document):
             }
         })
         self.reload()
+        self.update_quality()
         self.on_resource_added.send(self.__class__, document=self, resource_id=resource.id)
 
     def update_resource(self, resource):
@@ -781,6 +834,7 @@ class Dataset(WithMetrics, BadgeMixin, db.Owned, db.Document):
         }
         self.update(**data)
         self.reload()
+        self.update_quality()
         self.on_resource_updated.send(self.__class__, document=self, resource_id=resource.id)
 
     def remove_resource(self, resource):
@@ -167,9 +167,11 @@ def resource_to_rdf(resource, dataset=None, graph=None):
     return r
 
 
-def dataset_to_rdf(dataset, graph=None):
+def dataset_to_rdf(dataset, graph=None, publisher=True):
     '''
     Map a dataset domain model to a DCAT/RDF graph
+
+    :param bool publisher: whether to serialize the publisher too
     '''
     # Use the unlocalized permalink to the dataset as URI when available
     # unless there is already an upstream URI
@@ -211,7 +213,7 @@ def dataset_to_rdf(dataset, graph=None):
     if frequency:
         d.set(DCT.accrualPeriodicity, frequency)
 
-    publisher = owner_to_rdf(dataset, graph)
+    publisher = owner_to_rdf(dataset, graph) if publisher else None
     if publisher:
         d.set(DCT.publisher, publisher)
 
@@ -3,7 +3,7 @@ from udata.models import (
     Dataset, Organization, User, GeoZone, License
 )
 from udata.search import (
-    ModelSearchAdapter, register,
+    ModelSearchAdapter, register, prefetch, reference_id,
     ModelTermsFilter, BoolFilter, Filter,
     TemporalCoverageFilter
 )
@@ -60,19 +60,47 @@ class DatasetSearch(ModelSearchAdapter):
 
     @classmethod
     def serialize(cls, dataset):
+        return cls.serialize_many([dataset])[0]
+
+    @classmethod
+    def serialize_many(cls, datasets):
+        '''
+        Serialize a batch of datasets resolving their organizations,
+        owners and spatial zones with a single query each.
+        '''
+        datasets = list(datasets)
+        organizations = prefetch(
+            Organization, (reference_id(d, 'organization') for d in datasets),
+            'name', 'public_service', 'metrics'
+        )
+        owners = prefetch(User, (reference_id(d, 'owner') for d in datasets), 'id')
+        zones = prefetch(GeoZone, (
+            zone_id for d in datasets if d.spatial is not None
+            for zone_id in cls.zones_ids(d.spatial)
+        ), 'name', 'keys', 'parents', 'level')
+        return [cls.serialize_one(d, organizations, owners, zones) for d in datasets]
+
+    @staticmethod
+    def zones_ids(spatial):
+        return [getattr(z, 'id', z) for z in spatial._data.get('zones') or []]
+
+    @classmethod
+    def serialize_one(cls, dataset, organizations, owners, zones):
         organization = None
         owner = None
 
-        if dataset.organization:
-            org = Organization.objects(id=dataset.organization.id).first()
+        org_id = reference_id(dataset, 'organization')
+        owner_id = reference_id(dataset, 'owner')
+        if org_id:
+            org = organizations.get(org_id)
             organization = {
                 'id': str(org.id),
                 'name': org.name,
                 'public_service': 1 if org.public_service else 0,
                 'followers': org.metrics.get('followers', 0)
-            }
-        elif dataset.owner:
-            owner = User.objects(id=dataset.owner.id).first()
+            } if org else None
+        elif owner_id:
+            owner = owners.get(owner_id)
 
         document = {
             'id': str(dataset.id),
@@ -81,7 +109,7 @@ class DatasetSearch(ModelSearchAdapter):
             'acronym': dataset.acronym or None,
             'url': dataset.display_url,
             'tags': dataset.tags,
-            'license': getattr(dataset.license, 'id', None),
+            'license': reference_id(dataset, 'license'),
             'badges': [badge.kind for badge in dataset.badges],
             'frequency': dataset.frequency,
             'created_at': to_iso_datetime(dataset.created_at),
@@ -119,12 +147,13 @@ class DatasetSearch(ModelSearchAdapter):
         if dataset.spatial is not None:
             # Index precise zone labels and parents zone identifiers
             # to allow fast filtering.
-            zone_ids = [z.id for z in dataset.spatial.zones]
-            zones = GeoZone.objects(id__in=zone_ids).exclude('geom')
             parents = set()
             geozones = []
             coverage_level = ADMIN_LEVEL_MAX
-            for zone in zones:
+            for zone_id in cls.zones_ids(dataset.spatial):
+                zone = zones.get(zone_id)
+                if zone is None:
+                    continue
                 geozones.append({
                     'id': zone.id,
                     'name': zone.name,
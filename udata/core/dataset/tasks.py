@@ -1,5 +1,7 @@
 import collections
+import gzip
 import os
+import shutil
 
 from datetime import datetime, timedelta
 from tempfile import NamedTemporaryFile
@@ -110,8 +112,30 @@ def send_frequency_reminder(self):
 @job('update-datasets-reuses-metrics')
 def update_datasets_reuses_metrics(self):
     all_datasets = Dataset.objects.visible().timeout(False)
-    for dataset in all_datasets:
-        dataset.count_reuses()
+    with db.coalesce_signals():
+        for dataset in all_datasets:
+            dataset.count_reuses()
+
+
+@job('update-datasets-quality')
+def update_datasets_quality(self, batch_size=500):
+    '''
+    Refresh the stored datasets quality.
+
+    Some criteria depend on the current date (ie. `update_fulfilled_in_time`)
+    so it should be scheduled periodically.
+    '''
+    count = 0
+    updates = []
+    for dataset in Dataset.objects.timeout(False).no_cache():
+        updates.append(dataset.quality_update())
+        if len(updates) >= batch_size:
+            count += Dataset._get_collection().bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        count += Dataset._get_collection().bulk_write(updates, ordered=False).modified_count
+    log.info('Updated quality of %s datasets', count)
+    return count
 
 
 def get_queryset(model_cls):
@@ -127,10 +151,11 @@ def get_queryset(model_cls):
     return model_cls.objects.filter(**params).no_cache()
 
 
-def get_or_create_resource(r_info, model, dataset):
+def get_or_create_resource(r_info, model, dataset, compressed=False):
     resource = None
     for r in dataset.resources:
-        if r.extras.get('csv-export:model', '') == model:
+        if (r.extras.get('csv-export:model', '') == model
+                and r.extras.get('csv-export:gzip', False) == compressed):
             resource = r
             break
     if resource:
@@ -140,12 +165,16 @@ def get_or_create_resource(r_info, model, dataset):
         return False, resource
     else:
         r_info['extras'] = {'csv-export:model': model}
+        if compressed:
+            r_info['extras']['csv-export:gzip'] = True
         return True, Resource(**r_info)
 
 
-def store_resource(csvfile, model, dataset):
+def store_resource(csvfile, model, dataset, compressed=False):
     timestr = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
     filename = 'export-%s-%s.csv' % (model, timestr)
+    if compressed:
+        filename += '.gz'
     prefix = '/'.join((dataset.slug, timestr))
     storage = storages.resources
     with open(csvfile.name, 'rb') as infile:
@@ -160,7 +189,7 @@ def store_resource(csvfile, model, dataset):
     r_info['filesize'] = r_info.pop('size')
     del r_info['filename']
     r_info['title'] = filename
-    return get_or_create_resource(r_info, model, dataset)
+    return get_or_create_resource(r_info, model, dataset, compressed)
 
 
 def export_csv_for_model(model, dataset):
@@ -178,23 +207,33 @@ def export_csv_for_model(model, dataset):
     log.info('Exporting CSV for %s...' % model)
 
     csvfile = NamedTemporaryFile(mode='w', encoding='utf8', delete=False)
+    gzfile = None
     try:
         # write adapter results into a tmp file
-        writer = csv.get_writer(csvfile)
-        writer.writerow(adapter.header())
-        for row in adapter.rows():
-            writer.writerow(row)
-        csvfile.flush()
+        csv.write_chunked(adapter, csvfile,
+                          chunk_size=current_app.config['EXPORT_CSV_CHUNK_SIZE'],
+                          workers=current_app.config['EXPORT_CSV_WORKERS'])
         # make a resource from this tmp file
         created, resource = store_resource(csvfile, model, dataset)
         # add it to the dataset
         if created:
             dataset.add_resource(resource)
+        if current_app.config['EXPORT_CSV_GZIP']:
+            gzfile = NamedTemporaryFile(mode='wb', delete=False)
+            with open(csvfile.name, 'rb') as infile, gzip.GzipFile(fileobj=gzfile) as out:
+                shutil.copyfileobj(infile, out)
+            gzfile.flush()
+            created, resource = store_resource(gzfile, model, dataset, compressed=True)
+            if created:
+                dataset.add_resource(resource)
         dataset.last_modified_internal = datetime.utcnow()
         dataset.save()
     finally:
         csvfile.close()
         os.unlink(csvfile.name)
+        if gzfile:
+            gzfile.close()
+            os.unlink(gzfile.name)
 
 
 @job('export-csv')
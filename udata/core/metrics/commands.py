@@ -5,7 +5,9 @@ import click
 from flask import current_app
 
 from udata.commands import cli, success, echo, white
-from udata.models import User, Dataset, Reuse, Organization, Site
+from udata.models import db, User, Dataset, Reuse, Organization, Site
+
+from . import engine
 
 log = logging.getLogger(__name__)
 
@@ -28,90 +30,36 @@ def grp():
 def update(site=False, organizations=False, users=False, datasets=False,
            reuses=False, drop=False):
     '''Update all metrics for the current date'''
+    with db.coalesce_signals():
+        update_metrics(site, organizations, users, datasets, reuses, drop)
+    success('All metrics have been updated')
+
+
+def update_metrics(site=False, organizations=False, users=False, datasets=False,
+                   reuses=False, drop=False):
     do_all = not any((site, organizations, users, datasets, reuses))
 
     if do_all or site:
         log.info('Update site metrics')
         try:
             site = Site.objects(id=current_app.config['SITE_ID']).first()
-            if drop:
-                site.metrics.clear()
-            site.count_users()
-            site.count_org()
-            site.count_datasets()
-            site.count_resources()
-            site.count_reuses()
-            site.count_followers()
-            site.count_discussions()
-            site.count_max_dataset_followers()
-            site.count_max_dataset_reuses()
-            site.count_max_reuse_datasets()
-            site.count_max_reuse_followers()
-            site.count_max_org_followers()
-            site.count_max_org_reuses()
-            site.count_max_org_datasets()
+            site.update_metrics(drop=drop)
         except Exception as e:
             log.info(f'Error during update: {e}')
 
 
     if do_all or datasets:
         log.info('Update datasets metrics')
-        all_datasets = Dataset.objects.visible().timeout(False)
-        with click.progressbar(all_datasets, length=Dataset.objects.count()) as dataset_bar:
-            for dataset in dataset_bar:
-                try:
-                    if drop:
-                        dataset.metrics.clear()
-                    dataset.count_discussions()
-                    dataset.count_reuses()
-                    dataset.count_followers()
-                except Exception as e:
-                    log.info(f'Error during update: {e}')
-                    continue
+        engine.update_metrics(Dataset.objects.visible(), engine.dataset_metrics, drop)
 
     if do_all or reuses:
         log.info('Update reuses metrics')
-        all_reuses = Reuse.objects.visible().timeout(False)
-        with click.progressbar(all_reuses, length=Reuse.objects.visible().count()) as reuses_bar:
-            for reuse in reuses_bar:
-                try:
-                    if drop:
-                        reuse.metrics.clear()
-                    reuse.count_discussions()
-                    reuse.count_followers()
-                except Exception as e:
-                    log.info(f'Error during update: {e}')
-                    continue
+        engine.update_metrics(Reuse.objects.visible(), engine.reuse_metrics, drop)
 
     if do_all or organizations:
         log.info('Update organizations metrics')
-        all_org = Organization.objects.visible().timeout(False)
-        with click.progressbar(all_org, length=Organization.objects.visible().count()) as org_bar:
-            for organization in org_bar:
-                try:
-                    if drop:
-                        organization.metrics.clear()
-                    organization.count_datasets()
-                    organization.count_reuses()
-                    organization.count_followers()
-                    organization.count_members()
-                except Exception as e:
-                    log.info(f'Error during update: {e}')
-                    continue
+        engine.update_metrics(Organization.objects.visible(), engine.organization_metrics, drop)
 
     if do_all or users:
         log.info('Update user metrics')
-        all_users = User.objects.timeout(False)
-        with click.progressbar(all_users, length=User.objects.count()) as users_bar:
-            for user in users_bar:
-                try:
-                    if drop:
-                        user.metrics.clear()
-                    user.count_datasets()
-                    user.count_reuses()
-                    user.count_followers()
-                    user.count_following()
-                except Exception as e:
-                    log.info(f'Error during update: {e}')
-                    continue
-    success('All metrics have been updated')
+        engine.update_metrics(User.objects, engine.user_metrics, drop)
@@ -0,0 +1,303 @@
+'''
+Bulk metrics computation.
+
+Each metric is computed for a whole collection with a single
+aggregation grouping by target document, then only the changed metrics
+are written back in bulk with one `$set` of the changed `metrics.*`
+fields per document, matched by `_id`.
+'''
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from pymongo import UpdateOne
+
+log = logging.getLogger(__name__)
+
+#: Number of updates sent per `bulk_write`
+BULK_SIZE = 1000
+
+#: Number of site metrics computed concurrently
+SITE_WORKERS = 4
+
+
+def ref_id(field):
+    '''
+    Aggregation expression extracting the target id of a `GenericReferenceField`.
+
+    The `$id` of the stored DBRef can't be accessed as a field path
+    and `$getField` requires MongoDB 5.0, so the DBRef is turned into
+    its `[$ref, $id]` values instead (supported from MongoDB 3.6).
+    '''
+    return {'$arrayElemAt': [
+        {'$map': {'input': {'$objectToArray': f'${field}._ref'}, 'in': '$$this.v'}},
+        1,
+    ]}
+
+
+def aggregate_counts(queryset, group_by, unwind=None):
+    '''
+    Count the documents of `queryset` grouped by the `group_by` expression.
+
+    :param queryset: the (filtered) queryset to aggregate on
+    :param group_by: an aggregation expression or field path
+    :param str unwind: an optional list field to unwind before grouping
+    :returns: a dict target id -> count
+    '''
+    pipeline = []
+    if unwind:
+        # Deduplicate first so a document is only counted once per target
+        pipeline.append({'$project': {unwind: {'$setUnion': [f'${unwind}', []]}}})
+        pipeline.append({'$unwind': f'${unwind}'})
+    pipeline.append({'$group': {'_id': group_by, 'count': {'$sum': 1}}})
+    return {
+        row['_id']: row['count']
+        for row in queryset.aggregate(*pipeline, allowDiskUse=True)
+        if row['_id'] is not None
+    }
+
+
+def aggregate_sizes(queryset, field):
+    '''The size of a list field for each document: a dict id -> size'''
+    pipeline = [{'$project': {'size': {'$size': {'$ifNull': [f'${field}', []]}}}}]
+    return {row['_id']: row['size'] for row in queryset.aggregate(*pipeline)}
+
+
+def count_discussions(model):
+    from udata.models import Discussion
+    qs = Discussion.objects(subject__ne=None, closed=None).filter(
+        __raw__={'subject._cls': model._class_name})
+    return aggregate_counts(qs, ref_id('subject'))
+
+
+def count_followers(model):
+    from udata.models import Follow
+    qs = Follow.objects(following__ne=None, until=None).filter(
+        __raw__={'following._cls': model._class_name})
+    return aggregate_counts(qs, ref_id('following'))
+
+
+def count_following():
+    from udata.models import Follow
+    return aggregate_counts(Follow.objects(until=None), '$follower')
+
+
+def count_visible(model, field, unwind=False):
+    '''Count visible documents of `model` for each target of `field`'''
+    return aggregate_counts(model.objects.visible(), f'${field}',
+                            unwind=field if unwind else None)
+
+
+def dataset_metrics():
+    from udata.models import Dataset, Reuse
+    return {
+        'discussions': count_discussions(Dataset),
+        'reuses': count_visible(Reuse, 'datasets', unwind=True),
+        'followers': count_followers(Dataset),
+    }
+
+
+def reuse_metrics():
+    from udata.models import Reuse
+    return {
+        'discussions': count_discussions(Reuse),
+        'followers': count_followers(Reuse),
+    }
+
+
+def organization_metrics():
+    from udata.models import Dataset, Reuse, Organization
+    return {
+        'datasets': count_visible(Dataset, 'organization'),
+        'reuses': count_visible(Reuse, 'organization'),
+        'followers': count_followers(Organization),
+        'members': aggregate_sizes(Organization.objects.visible(), 'members'),
+    }
+
+
+def user_metrics():
+    from udata.models import Dataset, Reuse, User
+    return {
+        'datasets': count_visible(Dataset, 'owner'),
+        'reuses': count_visible(Reuse, 'owner'),
+        'followers': count_followers(User),
+        'following': count_following(),
+    }
+
+
+def apply_metrics(queryset, metrics, drop=False):
+    '''
+    Write some precomputed metrics on every document of `queryset`.
+
+    Documents absent from a metric counts get `0`.
+    Only the changed values are written, without loading,
+    validating nor saving documents (no signal is sent).
+
+    :param queryset: the documents to update
+    :param dict metrics: a dict metric key -> (dict id -> value)
+    :param bool drop: if ``True``, other existing metrics are removed
+    :returns: the list of updated document ids
+    '''
+    collection = queryset._document._get_collection()
+    updated, ops = [], []
+    for doc in queryset.only('id', 'metrics').as_pymongo().timeout(False):
+        current = doc.get('metrics') or {}
+        values = {key: counts.get(doc['_id'], 0) for key, counts in metrics.items()}
+        if drop:
+            if values == current:
+                continue
+            update = {'$set': {'metrics': values}}
+        else:
+            changed = {f'metrics.{k}': v for k, v in values.items() if current.get(k) != v}
+            if not changed:
+                continue
+            update = {'$set': changed}
+        ops.append(UpdateOne({'_id': doc['_id']}, update))
+        updated.append(doc['_id'])
+        if len(ops) >= BULK_SIZE:
+            collection.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+    return updated
+
+
+def update_metrics(queryset, compute, drop=False):
+    '''
+    Recompute the metrics of all documents of `queryset` in bulk
+    and trigger the reindexation of the changed ones.
+
+    :param compute: a callable returning the metrics to apply (see `apply_metrics`)
+    :returns: the number of updated documents
+    '''
+    from udata.search import reindex_ids
+
+    model = queryset._document
+    updated = apply_metrics(queryset, compute(), drop=drop)
+    log.info('%s %s metrics updated', len(updated), model.__name__)
+    reindex_ids(model, updated)
+    return len(updated)
+
+
+def count_users():
+    from udata.models import User
+    return User.objects(confirmed_at__ne=None, deleted=None).count()
+
+
+def count_organizations():
+    from udata.models import Organization
+    return Organization.objects.visible().count()
+
+
+def count_org_for_badge(badge_kind):
+    from udata.models import Organization
+    return Organization.objects(badges__kind=badge_kind).count()
+
+
+def count_datasets():
+    from udata.models import Dataset
+    return Dataset.objects.visible().count()
+
+
+def count_resources():
+    from udata.models import Dataset
+    pipeline = [
+        {'$project': {'size': {'$size': {'$ifNull': ['$resources', []]}}}},
+        {'$group': {'_id': None, 'count': {'$sum': '$size'}}},
+    ]
+    return next(Dataset.objects.visible().aggregate(*pipeline), {}).get('count', 0)
+
+
+def count_reuses():
+    from udata.models import Reuse
+    return Reuse.objects.visible().count()
+
+
+def count_all_followers():
+    from udata.models import Follow
+    return Follow.objects(until=None).count()
+
+
+def count_all_discussions():
+    from udata.models import Discussion
+    return Discussion.objects.count()
+
+
+def max_metric(model, key):
+    '''The highest `key` metric of visible `model` documents'''
+    doc = (model.objects(**{f'metrics__{key}__gt': 0}).visible()
+           .order_by(f'-metrics.{key}').only('metrics').as_pymongo().first())
+    return doc['metrics'][key] if doc else 0
+
+
+def max_model_metric(name, key):
+    from udata import models
+    return max_metric(getattr(models, name), key)
+
+
+#: Site metrics key -> callable computing its value
+SITE_METRICS = {
+    'users': count_users,
+    'organizations': count_organizations,
+    'public-service': partial(count_org_for_badge, 'public-service'),
+    'datasets': count_datasets,
+    'resources': count_resources,
+    'reuses': count_reuses,
+    'followers': count_all_followers,
+    'discussions': count_all_discussions,
+    'max_dataset_followers': partial(max_model_metric, 'Dataset', 'followers'),
+    'max_dataset_reuses': partial(max_model_metric, 'Dataset', 'reuses'),
+    'max_reuse_datasets': partial(max_model_metric, 'Reuse', 'datasets'),
+    'max_reuse_followers': partial(max_model_metric, 'Reuse', 'followers'),
+    'max_org_followers': partial(max_model_metric, 'Organization', 'followers'),
+    'max_org_reuses': partial(max_model_metric, 'Organization', 'reuses'),
+    'max_org_datasets': partial(max_model_metric, 'Organization', 'datasets'),
+}
+
+
+def timed(compute):
+    start = time.perf_counter()
+    value = compute()
+    return value, time.perf_counter() - start
+
+
+def compute_site_metrics(keys=None, workers=SITE_WORKERS, computations=None):
+    '''
+    Compute some site metrics concurrently.
+
+    :param list keys: the metrics to compute, all of them by default
+    :param dict computations: extra `key -> callable` metrics computations
+    :returns: a tuple of dicts `(key -> value, key -> duration in seconds)`
+    '''
+    computations = dict(SITE_METRICS, **(computations or {}))
+    keys = keys or list(SITE_METRICS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {key: executor.submit(timed, computations[key]) for key in keys}
+        results = {key: future.result() for key, future in futures.items()}
+    metrics = {key: value for key, (value, _) in results.items()}
+    timings = {key: duration for key, (_, duration) in results.items()}
+    return metrics, timings
+
+
+def update_site_metrics(site, keys=None, drop=False, workers=SITE_WORKERS, computations=None):
+    '''
+    Compute the site metrics and write them all with a single update.
+
+    :param bool drop: if ``True``, other existing metrics are removed
+    :param dict computations: extra `key -> callable` metrics computations
+    :returns: the computation duration in seconds of each metric
+    '''
+    metrics, timings = compute_site_metrics(keys, workers, computations)
+    for key, duration in sorted(timings.items(), key=lambda item: -item[1]):
+        log.debug('Site metric %s computed in %.3fs', key, duration)
+    if drop:
+        site.metrics = metrics
+        update = {'$set': {'metrics': metrics}}
+    else:
+        site.metrics.update(metrics)
+        update = {'$set': {f'metrics.{k}': v for k, v in metrics.items()}}
+    site._get_collection().update_one({'_id': site.pk}, update)
+    log.info('%s site metrics updated in %.3fs', len(metrics), sum(timings.values()))
+    return timings
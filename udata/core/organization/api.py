@@ -38,13 +38,13 @@ from udata.core.discussions.api import discussion_fields
 from udata.core.discussions.models import Discussion
 from udata.core.reuse.api_fields import reuse_fields
 from udata.core.reuse.models import Reuse
+from udata.suggest import SuggestIndex
 from udata.core.storages.api import (
     uploaded_image_fields, image_parser, parse_uploaded_image
 )
 
 
 DEFAULT_SORTING = '-created_at'
-SUGGEST_SORTING = '-metrics.followers'
 
 
 class OrgApiParser(ModelApiParser):
@@ -381,15 +381,26 @@ suggest_parser.add_argument(
     location='args', default=10)
 
 
+def load_organizations():
+    qs = Organization.objects(deleted=None).only('id', 'name', 'metrics').as_pymongo()
+    for org in qs:
+        followers = (org.get('metrics') or {}).get('followers') or 0
+        yield followers, [org['name']], org['_id']
+
+
+suggest_index = SuggestIndex('organizations', load_organizations, model=Organization)
+
+
 @ns.route('/suggest/', endpoint='suggest_organizations')
 class OrganizationSuggestAPI(API):
     @api.doc('suggest_organizations')
     @api.expect(suggest_parser)
     @api.marshal_list_with(org_suggestion_fields)
     def get(self):
-        '''Organizations suggest endpoint using mongoDB contains'''
+        '''Organizations suggest endpoint ranked by followers'''
         args = suggest_parser.parse_args()
-        orgs = Organization.objects(deleted=None, name__icontains=args['q'])
+        ids = suggest_index.search(args['q'], args['size'])
+        orgs = Organization.objects.in_bulk(ids)
         return [
             {
                 'id': org.id,
@@ -398,7 +409,7 @@ class OrganizationSuggestAPI(API):
                 'slug': org.slug,
                 'image_url': org.logo,
             }
-            for org in orgs.order_by(SUGGEST_SORTING).limit(args['size'])
+            for org in (orgs[id] for id in ids if id in orgs)
         ]
 
 
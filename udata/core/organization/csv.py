@@ -16,6 +16,7 @@ class OrganizationCsvAdapter(csv.Adapter):
         'created_at',
         'last_modified',
     )
+    requires = ('slug', 'logo', 'badges', 'metrics')
 
     def dynamic_fields(self):
         return csv.metric_fields(Organization)
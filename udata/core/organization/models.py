@@ -164,11 +164,11 @@ class Organization(WithMetrics, BadgeMixin, db.Datetimed, db.Document):
 
     @classmethod
     def post_save(cls, sender, document, **kwargs):
-        cls.after_save.send(document)
+        db.send_signal(cls.after_save, document)
         if kwargs.get('created'):
-            cls.on_create.send(document)
+            db.send_signal(cls.on_create, document)
         else:
-            cls.on_update.send(document)
+            db.send_signal(cls.on_update, document)
 
     def url_for(self, *args, **kwargs):
         return endpoint_for('organizations.show', 'api.organization', org=self, *args, **kwargs)
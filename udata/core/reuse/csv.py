@@ -22,6 +22,7 @@ class ReuseCsvAdapter(csv.Adapter):
         ('tags', lambda r: ','.join(r.tags)),
         ('datasets', lambda r: ','.join([str(d.id) for d in r.datasets])),
     )
+    requires = ('slug', 'image', 'featured', 'tags', 'datasets', 'metrics')
 
     def dynamic_fields(self):
         return csv.metric_fields(Reuse)
@@ -129,13 +129,13 @@ class Reuse(db.Datetimed, WithMetrics, BadgeMixin, db.Owned, db.Document):
     def post_save(cls, sender, document, **kwargs):
         if 'post_save' in kwargs.get('ignores', []):
             return
-        cls.after_save.send(document)
+        db.send_signal(cls.after_save, document)
         if kwargs.get('created'):
-            cls.on_create.send(document)
+            db.send_signal(cls.on_create, document)
         else:
-            cls.on_update.send(document)
+            db.send_signal(cls.on_update, document)
         if document.deleted:
-            cls.on_delete.send(document)
+            db.send_signal(cls.on_delete, document)
 
     def url_for(self, *args, **kwargs):
         return endpoint_for('reuses.show', 'api.reuse', reuse=self, *args, **kwargs)
@@ -3,7 +3,7 @@ from udata.models import (
     Reuse, Organization, User
 )
 from udata.search import (
-    ModelSearchAdapter, register,
+    ModelSearchAdapter, register, prefetch, reference_id,
     ModelTermsFilter, BoolFilter, Filter
 )
 from udata.core.reuse.api import ReuseApiParser, DEFAULT_SORTING
@@ -52,18 +52,38 @@ class ReuseSearch(ModelSearchAdapter):
 
     @classmethod
     def serialize(cls, reuse):
+        return cls.serialize_many([reuse])[0]
+
+    @classmethod
+    def serialize_many(cls, reuses):
+        '''
+        Serialize a batch of reuses resolving their organizations
+        and owners with a single query each.
+        '''
+        reuses = list(reuses)
+        organizations = prefetch(
+            Organization, (reference_id(r, 'organization') for r in reuses),
+            'name', 'public_service', 'metrics'
+        )
+        owners = prefetch(User, (reference_id(r, 'owner') for r in reuses), 'id')
+        return [cls.serialize_one(r, organizations, owners) for r in reuses]
+
+    @classmethod
+    def serialize_one(cls, reuse, organizations, owners):
         organization = None
         owner = None
-        if reuse.organization:
-            org = Organization.objects(id=reuse.organization.id).first()
+        org_id = reference_id(reuse, 'organization')
+        owner_id = reference_id(reuse, 'owner')
+        if org_id:
+            org = organizations.get(org_id)
             organization = {
                 'id': str(org.id),
                 'name': org.name,
                 'public_service': 1 if org.public_service else 0,
                 'followers': org.metrics.get('followers', 0)
-            }
-        elif reuse.owner:
-            owner = User.objects(id=reuse.owner.id).first()
+            } if org else None
+        elif owner_id:
+            owner = owners.get(owner_id)
 
         extras = {}
         for key, value in reuse.extras.items():
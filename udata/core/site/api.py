@@ -6,16 +6,17 @@ from udata.api import api, API, fields
 from udata.auth import admin_permission
 from udata.models import Dataset, Reuse
 from udata.utils import multi_to_dict
+from udata.core import storages
 from udata.rdf import (
     CONTEXT, RDF_EXTENSIONS,
-    negociate_content, graph_response
+    negociate_content, graph_response, guess_format
 )
 
 from udata.core.dataset.api_fields import dataset_fields
 from udata.core.reuse.api_fields import reuse_fields
 
 from .models import current_site
-from .rdf import build_catalog
+from .rdf import build_catalog, dump_filename
 
 site_fields = api.model('Site', {
     'id': fields.String(
@@ -112,6 +113,19 @@ class SiteRdfCatalogFormat(API):
         return make_response(*graph_response(catalog, format))
 
 
+@api.route('/site/catalog/dump.<format>', endpoint='site_rdf_catalog_dump')
+class SiteRdfCatalogDump(API):
+    def get(self, format):
+        '''Redirect to the latest gzipped full catalog dump in a given format'''
+        fmt = guess_format(format)
+        if fmt not in RDF_EXTENSIONS:
+            api.abort(404, 'Unknown format')
+        filename = dump_filename(fmt)
+        if not storages.catalogs.exists(filename):
+            api.abort(404, 'Catalog dump not available yet')
+        return redirect(storages.catalogs.url(filename, external=True))
+
+
 @api.route('/site/context.jsonld', endpoint='site_jsonld_context')
 class SiteJsonLdContext(API):
     def get(self):
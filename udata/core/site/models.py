@@ -1,8 +1,9 @@
+from functools import partial
+
 from flask import g, current_app
 from werkzeug.local import LocalProxy
 
 from udata.models import db, WithMetrics
-from udata.core.organization.models import Organization
 from udata.core.dataset.models import Dataset
 from udata.core.reuse.models import Reuse
 
@@ -48,89 +49,62 @@ class Site(WithMetrics, db.Document):
     def __str__(self):
         return self.title or ''
 
+    def count_metric(self, key, compute=None):
+        '''Compute and save a single metric, optionally given its computation'''
+        from udata.core.metrics.engine import update_site_metrics
+        computations = {key: compute} if compute else None
+        update_site_metrics(self, keys=[key], workers=1, computations=computations)
+
     def count_users(self):
-        from udata.models import User
-        self.metrics['users'] = User.objects(confirmed_at__ne=None, deleted=None).count()
-        self.save()
+        self.count_metric('users')
 
     def count_org(self):
-        from udata.models import Organization
-        self.metrics['organizations'] = Organization.objects.visible().count()
-        self.save()
+        self.count_metric('organizations')
 
     def count_org_for_badge(self, badge_kind):
-        from udata.models import Organization
-        self.metrics[badge_kind] = Organization.objects(badges__kind=badge_kind).count()
-        self.save()
+        from udata.core.metrics.engine import count_org_for_badge
+        self.count_metric(badge_kind, partial(count_org_for_badge, badge_kind))
 
     def count_datasets(self):
-        from udata.models import Dataset
-        self.metrics['datasets'] = Dataset.objects.visible().count()
-        self.save()
+        self.count_metric('datasets')
 
     def count_resources(self):
-        self.metrics['resources'] = next(Dataset.objects.visible().aggregate(
-            {'$project': {'resources': 1}},
-            {'$unwind': '$resources' },
-            {'$group': {'_id': 'result', 'count': {'$sum': 1}}}
-        ), {}).get('count', 0)
-        self.save()
+        self.count_metric('resources')
 
     def count_reuses(self):
-        self.metrics['reuses'] = Reuse.objects.visible().count()
-        self.save()
+        self.count_metric('reuses')
 
     def count_followers(self):
-        from udata.models import Follow
-        self.metrics['followers'] = Follow.objects(until=None).count()
-        self.save()
+        self.count_metric('followers')
 
     def count_discussions(self):
-        from udata.models import Discussion
-        self.metrics['discussions'] = Discussion.objects.count()
-        self.save()
+        self.count_metric('discussions')
 
     def count_max_dataset_followers(self):
-        dataset = (Dataset.objects(metrics__followers__gt=0).visible()
-                          .order_by('-metrics.followers').first())
-        self.metrics['max_dataset_followers'] = dataset.metrics['followers'] if dataset else 0
-        self.save()
+        self.count_metric('max_dataset_followers')
 
     def count_max_dataset_reuses(self):
-        dataset = (Dataset.objects(metrics__reuses__gt=0).visible()
-                        .order_by('-metrics.reuses').first())
-        self.metrics['max_dataset_reuses'] = dataset.metrics['reuses'] if dataset else 0
-        self.save()
+        self.count_metric('max_dataset_reuses')
 
     def count_max_reuse_datasets(self):
-        reuse = (Reuse.objects(metrics__datasets__gt=0).visible()
-                 .order_by('-metrics.datasets').first())
-        self.metrics['max_reuse_datasets'] = reuse.metrics['datasets'] if reuse else 0
-        self.save()
+        self.count_metric('max_reuse_datasets')
 
     def count_max_reuse_followers(self):
-        reuse = (Reuse.objects(metrics__followers__gt=0).visible()
-                 .order_by('-metrics.followers').first())
-        self.metrics['max_reuse_followers'] = reuse.metrics['followers'] if reuse else 0
-        self.save()
+        self.count_metric('max_reuse_followers')
 
     def count_max_org_followers(self):
-        org = (Organization.objects(metrics__followers__gt=0).visible()
-               .order_by('-metrics.followers').first())
-        self.metrics['max_org_followers'] = org.metrics['followers'] if org else 0
-        self.save()
+        self.count_metric('max_org_followers')
 
     def count_max_org_reuses(self):
-        org = (Organization.objects(metrics__reuses__gt=0).visible()
-               .order_by('-metrics.reuses').first())
-        self.metrics['max_org_reuses'] = org.metrics['reuses'] if org else 0
-        self.save()
+        self.count_metric('max_org_reuses')
 
     def count_max_org_datasets(self):
-        org = (Organization.objects(metrics__datasets__gt=0).visible()
-               .order_by('-metrics.datasets').first())
-        self.metrics['max_org_datasets'] = org.metrics['datasets'] if org else 0
-        self.save()
+        self.count_metric('max_org_datasets')
+
+    def update_metrics(self, drop=False):
+        '''Compute all metrics concurrently and write them at once'''
+        from udata.core.metrics.engine import update_site_metrics
+        return update_site_metrics(self, drop=drop)
 
 
 def get_current_site():
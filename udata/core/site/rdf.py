@@ -1,23 +1,76 @@
 '''
 This module centralize site helpers for RDF/DCAT serialization and parsing
 '''
+import gzip
+import json
+import re
+import shutil
+import tempfile
+
+from contextlib import ExitStack
+
 from flask import url_for, current_app
 from rdflib import Graph, URIRef, Literal, BNode
 from rdflib.namespace import RDF, FOAF
 
+from udata.app import cache
+from udata.core import storages
+from udata.core.dataset.models import Dataset
 from udata.core.dataset.rdf import dataset_to_rdf
+from udata.core.organization.models import Organization
 from udata.core.organization.rdf import organization_to_rdf
+from udata.core.user.models import User
 from udata.core.user.rdf import user_to_rdf
-from udata.rdf import DCAT, DCT, namespace_manager, paginate_catalog
+from udata.rdf import (
+    CONTEXT, DCAT, DCT, RDF_EXTENSIONS, namespace_manager, paginate_catalog, serialize_graph
+)
+from udata.search.adapter import prefetch, reference_id
 from udata.utils import Paginable
 from udata.uris import endpoint_for
 
 
-def build_catalog(site, datasets, format=None):
-    '''Build the DCAT catalog for this site'''
+def fragment_key(dataset_id):
+    return 'dcat:dataset:{0}'.format(dataset_id)
+
+
+def cached_dataset_to_rdf(dataset, graph, root, cached=None, missing=None):
+    '''
+    Add a dataset (without its publisher) to a graph
+    from its cached triples when available.
+
+    :param str root: the external URLs root the triples have been built for
+    :param tuple cached: the dataset prefetched cache entry if any
+    :param dict missing: if given, built entries are collected into it
+                         to be cached at once instead of being cached right away
+    '''
+    timeout = current_app.config['SITE_CATALOG_CACHE_TIMEOUT']
+    key = fragment_key(dataset.id)
+    if cached is None and missing is None and timeout:
+        cached = cache.get(key)
+    if cached and cached[0] == root:
+        _, triples, identifier = cached
+    else:
+        fragment = Graph()
+        identifier = dataset_to_rdf(dataset, fragment, publisher=False).identifier
+        triples = list(fragment)
+        if missing is not None:
+            missing[key] = (root, triples, identifier)
+        elif timeout:
+            cache.set(key, (root, triples, identifier), timeout=timeout)
+    for triple in triples:
+        graph.add(triple)
+    return graph.resource(identifier)
+
+
+@Dataset.after_save.connect
+def invalidate_dataset_fragment(dataset):
+    cache.delete(fragment_key(dataset.id))
+
+
+def catalog_resource(site, graph):
+    '''Add the site catalog description to a graph'''
     site_url = endpoint_for('site.home_redirect', 'api.site', _external=True)
     catalog_url = url_for('api.site_rdf_catalog', _external=True)
-    graph = Graph(namespace_manager=namespace_manager)
     catalog = graph.resource(URIRef(catalog_url))
 
     catalog.set(RDF.type, DCAT.Catalog)
@@ -31,16 +84,202 @@ def build_catalog(site, datasets, format=None):
     publisher.set(RDF.type, FOAF.Organization)
     publisher.set(FOAF.name, Literal(current_app.config['SITE_AUTHOR']))
     catalog.set(DCT.publisher, publisher)
+    return catalog
 
-    for dataset in datasets:
-        rdf_dataset = dataset_to_rdf(dataset, graph)
-        if dataset.owner:
-            rdf_dataset.add(DCT.publisher, user_to_rdf(dataset.owner, graph))
-        elif dataset.organization:
-            rdf_dataset.add(DCT.publisher, organization_to_rdf(dataset.organization, graph))
+
+def add_datasets(catalog, datasets):
+    '''
+    Add some datasets and their publishers to a catalog.
+
+    Datasets fragments are fetched from the cache at once
+    and each publisher is fetched and serialized once.
+    '''
+    graph = catalog.graph
+    site_url = endpoint_for('site.home_redirect', 'api.site', _external=True)
+    items = list(datasets)
+    keys = [fragment_key(d.id) for d in items]
+    timeout = current_app.config['SITE_CATALOG_CACHE_TIMEOUT']
+    fragments = cache.get_many(*keys) if timeout and keys else [None] * len(items)
+    missing = {}
+    owners = prefetch(User, (reference_id(d, 'owner') for d in items))
+    orgs = prefetch(Organization, (reference_id(d, 'organization') for d in items))
+    publishers = {}
+    for dataset, cached in zip(items, fragments):
+        rdf_dataset = cached_dataset_to_rdf(dataset, graph, site_url, cached, missing)
+        owner_id = reference_id(dataset, 'owner')
+        org_id = reference_id(dataset, 'organization')
+        if owner_id in owners:
+            if owner_id not in publishers:
+                publishers[owner_id] = user_to_rdf(owners[owner_id], graph)
+            rdf_dataset.set(DCT.publisher, publishers[owner_id])
+        elif org_id in orgs:
+            if org_id not in publishers:
+                publishers[org_id] = organization_to_rdf(orgs[org_id], graph)
+            rdf_dataset.set(DCT.publisher, publishers[org_id])
         catalog.add(DCAT.dataset, rdf_dataset)
+    if timeout and missing:
+        cache.set_many(missing, timeout=timeout)
+    return catalog
+
+
+def build_catalog(site, datasets, format=None):
+    '''Build the DCAT catalog for this site'''
+    graph = Graph(namespace_manager=namespace_manager)
+    catalog = catalog_resource(site, graph)
+    add_datasets(catalog, datasets)
 
     if isinstance(datasets, Paginable):
         paginate_catalog(catalog, graph, datasets, format, 'api.site_rdf_catalog_format')
 
     return catalog
+
+
+def dump_filename(fmt):
+    '''The catalog dump filename for a given serialization format'''
+    return 'catalog.{0}.gz'.format(RDF_EXTENSIONS[fmt])
+
+
+class CatalogWriter(object):
+    '''
+    Write a catalog serialization page by page into a file.
+
+    Serializations of formats made of statements (Turtle, N-Triples...)
+    are simply concatenated.
+    '''
+    def __init__(self, fmt, out):
+        self.fmt = fmt
+        self.out = out
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf8')
+        self.out.write(data)
+
+    def start(self):
+        pass
+
+    def page(self, graph):
+        self.write(serialize_graph(graph, self.fmt))
+        self.write('\n')
+
+    def end(self):
+        pass
+
+
+class JsonLdCatalogWriter(CatalogWriter):
+    '''Write the pages nodes into a single JSON-LD `@graph`'''
+    def start(self):
+        self.write('{{"@context": {0}, "@graph": ['.format(json.dumps(CONTEXT)))
+        self.first = True
+
+    def page(self, graph):
+        data = json.loads(serialize_graph(graph, self.fmt))
+        data.pop('@context', None)
+        for node in data.pop('@graph', None) or [data]:
+            if not self.first:
+                self.write(',\n')
+            self.write(json.dumps(node))
+            self.first = False
+
+    def end(self):
+        self.write(']}\n')
+
+
+class XmlCatalogWriter(CatalogWriter):
+    '''
+    Write the pages descriptions into a single `rdf:RDF` root element.
+
+    Descriptions are spooled to a temporary file until all
+    the namespaces used by the pages are known.
+    '''
+    ROOT_RE = re.compile(r'<rdf:RDF(?P<attrs>[^>]*)>(?P<body>.*)</rdf:RDF>', re.DOTALL)
+    XMLNS_RE = re.compile(r'xmlns:(?P<prefix>[\w.-]+)="(?P<uri>[^"]*)"')
+
+    def start(self):
+        self.namespaces = {}
+        self.body = tempfile.TemporaryFile()
+
+    def page(self, graph):
+        match = self.ROOT_RE.search(serialize_graph(graph, self.fmt))
+        if not match:
+            return
+        for prefix, uri in self.XMLNS_RE.findall(match.group('attrs')):
+            self.namespaces[prefix] = uri
+        self.body.write(match.group('body').encode('utf8'))
+
+    def end(self):
+        self.write('<?xml version="1.0" encoding="utf-8"?>\n<rdf:RDF')
+        for prefix, uri in sorted(self.namespaces.items()):
+            # URIs are kept as escaped by the pages serializations
+            self.write('\n   xmlns:{0}="{1}"'.format(prefix, uri))
+        self.write('\n>')
+        self.body.seek(0)
+        shutil.copyfileobj(self.body, self.out)
+        self.body.close()
+        self.write('</rdf:RDF>\n')
+
+
+CATALOG_WRITERS = {
+    'json-ld': JsonLdCatalogWriter,
+    'xml': XmlCatalogWriter,
+}
+
+
+def iter_pages(datasets, page_size):
+    page = []
+    for dataset in datasets:
+        page.append(dataset)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def dump_catalog(site, datasets, formats, page_size=None):
+    '''
+    Build the full catalog page by page and stream a gzipped serialization
+    for each format in the `catalogs` storage.
+
+    Only one page graph is kept in memory: each page is serialized
+    into temporary gzip files, copied to the storage once complete.
+
+    :returns: the list of stored filenames
+    '''
+    page_size = page_size or current_app.config['SITE_CATALOG_DUMP_PAGE_SIZE']
+    with ExitStack() as stack:
+        files = {fmt: stack.enter_context(tempfile.TemporaryFile()) for fmt in formats}
+        writers = {}
+        for fmt, f in files.items():
+            out = stack.enter_context(gzip.GzipFile(fileobj=f, mode='wb'))
+            writers[fmt] = CATALOG_WRITERS.get(fmt, CatalogWriter)(fmt, out)
+            writers[fmt].start()
+
+        catalog = None
+        for page in iter_pages(datasets, page_size):
+            graph = Graph(namespace_manager=namespace_manager)
+            if catalog is None:
+                catalog = catalog_resource(site, graph)
+            else:
+                # The catalog is only described once
+                catalog = graph.resource(catalog.identifier)
+            add_datasets(catalog, page)
+            for writer in writers.values():
+                writer.page(graph)
+        if catalog is None:
+            # An empty catalog is still described
+            graph = Graph(namespace_manager=namespace_manager)
+            catalog_resource(site, graph)
+            for writer in writers.values():
+                writer.page(graph)
+
+        filenames = []
+        for fmt, writer in writers.items():
+            writer.end()
+            writer.out.close()
+            files[fmt].seek(0)
+            filename = dump_filename(fmt)
+            with storages.catalogs.open(filename, 'wb') as out:
+                shutil.copyfileobj(files[fmt], out)
+            filenames.append(filename)
+    return filenames
@@ -0,0 +1,23 @@
+from celery.utils.log import get_task_logger
+from flask import current_app
+
+from udata.core.dataset.models import Dataset
+from udata.tasks import job
+
+from .models import Site
+from .rdf import dump_catalog
+
+log = get_task_logger(__name__)
+
+
+@job('dump-site-catalog')
+def dump_site_catalog(self):
+    '''Store the full DCAT catalog in each configured format'''
+    site = Site.objects(id=current_app.config['SITE_ID']).first()
+    if not site:
+        log.error('Site "%s" does not exist', current_app.config['SITE_ID'])
+        return
+    datasets = Dataset.objects.visible().no_cache().timeout(False)
+    formats = current_app.config['SITE_CATALOG_DUMP_FORMATS']
+    for filename in dump_catalog(site, datasets, formats):
+        log.info('Site catalog dumped to %s', filename)
@@ -1,11 +1,13 @@
+from datetime import date
+
 from flask import current_app, abort
-from mongoengine.queryset.visitor import Q
 
 from flask_restx import inputs
 
 from udata.api import api, API
 from udata.i18n import _
 from udata.models import Dataset, TERRITORY_DATASETS
+from udata.suggest import SuggestIndex
 from udata.core.dataset.api_fields import dataset_ref_fields
 
 from .api_fields import (
@@ -22,9 +24,6 @@ GEOM_TYPES = (
     'MultiPolygon'
 )
 
-DEFAULT_SORTING = '-created_at'
-
-
 ns = api.namespace('spatial', 'Spatial references')
 
 
@@ -42,24 +41,34 @@ def payload_name(name):
     return _(name)  # Avoid dict quotes in gettext
 
 
+def load_zones():
+    '''Current zones ranked by population'''
+    fields = ('id', 'name', 'code', 'level', 'keys', 'population')
+    for zone in GeoZone.objects.valid_at(date.today()).only(*fields).as_pymongo():
+        payload = {
+            'id': zone['_id'],
+            'name': zone['name'],
+            'code': zone['code'],
+            'level': zone['level'],
+            'keys': zone.get('keys') or {},
+        }
+        yield zone.get('population') or 0, [zone['name'], zone['code']], payload
+
+
+suggest_index = SuggestIndex('zones', load_zones, model=GeoZone)
+
+
 @ns.route('/zones/suggest/', endpoint='suggest_zones')
 class SuggestZonesAPI(API):
     @api.marshal_list_with(zone_suggestion_fields)
     @api.expect(suggest_parser)
     @api.doc('suggest_zones')
     def get(self):
-        '''Geospatial zones suggest endpoint using mongoDB contains'''
+        '''Geospatial current zones suggest endpoint by name or code'''
         args = suggest_parser.parse_args()
-        geozones = GeoZone.objects(Q(name__icontains=args['q']) | Q(code__icontains=args['q']))
         return [
-            {
-                'id': geozone.id,
-                'name': payload_name(geozone.name),
-                'code': geozone.code,
-                'level': geozone.level,
-                'keys': geozone.keys
-            }
-            for geozone in geozones.order_by(DEFAULT_SORTING).limit(args['size']) if geozone.is_current
+            dict(zone, name=payload_name(zone['name']))
+            for zone in suggest_index.search(args['q'], args['size'])
         ]
 
 
@@ -199,6 +199,29 @@ class SpatialApiTest(APITestCase):
             self.assertIsInstance(suggestion['keys'], dict)
             self.assertTrue(suggestion['name'].endswith('-current'))
 
+    def test_suggest_current_zones_up_to_size(self):
+        '''It should not count legacy zones in the suggestions size'''
+        GeoZoneFactory.create_batch(5, name='test-legacy')
+        current = GeoZoneFactory.create_batch(2, name='test-current', is_current=True)
+
+        response = self.get(
+            url_for('api.suggest_zones'), qs={'q': 'test', 'size': '2'})
+        self.assert200(response)
+
+        self.assertEqual(set(s['id'] for s in response.json), set(z.id for z in current))
+
+    def test_suggest_zones_by_population(self):
+        '''It should suggest the most populated zones first'''
+        small = GeoZoneFactory(name='test-small', population=10, is_current=True)
+        big = GeoZoneFactory(name='test-big', population=1000, is_current=True)
+        unknown = GeoZoneFactory(name='test-unknown', population=None, is_current=True)
+
+        response = self.get(
+            url_for('api.suggest_zones'), qs={'q': 'test', 'size': '5'})
+        self.assert200(response)
+
+        self.assertEqual([s['id'] for s in response.json], [big.id, small.id, unknown.id])
+
     def test_spatial_levels(self):
         levels = [GeoLevelFactory() for _ in range(3)]
 
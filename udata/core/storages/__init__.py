@@ -29,6 +29,8 @@ images = fs.Storage('images', fs.IMAGES)
 chunks = fs.Storage('chunks', AUTHORIZED_TYPES)
 tmp = fs.Storage('tmp', fs.ALL, upload_to=tmp_upload_to)
 references = fs.Storage('references', AUTHORIZED_TYPES)
+harvest = fs.Storage('harvest', fs.ALL)
+catalogs = fs.Storage('catalogs', fs.ALL, overwrite=True)
 
 
 def default_image_basename(*args, **kwargs):
@@ -40,4 +42,5 @@ def init_app(app):
     if 'BUCKETS_PREFIX' not in app.config:
         app.config['BUCKETS_PREFIX'] = '/s'
     fs.init_app(
-        app, resources, avatars, logos, images, chunks, tmp, references)
+        app, resources, avatars, logos, images, chunks, tmp, references, harvest,
+        catalogs)
@@ -12,6 +12,9 @@ from . import utils, chunks
 
 META = 'meta.json'
 
+# Mime type of files not recognized by their extension, as `storage.metadata()` does
+DEFAULT_MIME = 'application/octet-stream'
+
 IMAGES_MIMETYPES = ('image/jpeg', 'image/png', 'image/webp')
 
 
@@ -109,21 +112,35 @@ def combine_chunks(storage, args, prefix=None):
     '''
     Combine a chunked file into a whole file again.
     Goes through each part, in order,
-    and appends that part's bytes to another destination file.
+    and streams that part's bytes to another destination file.
     Chunks are stored in the chunks storage.
+
+    The file checksums are computed while writing so the combined file
+    is never read again. Returns the target filename and its metadata
+    (as `storage.metadata()` would).
     '''
     uuid = args['uuid']
     # Normalize filename including extension
     target = utils.normalize(args['filename'])
     if prefix:
         target = os.path.join(prefix, target)
+    hasher = utils.Hasher()
     with storage.open(target, 'wb') as out:
         for i in range(args['totalparts']):
             partname = chunk_filename(uuid, i)
-            out.write(chunks.read(partname))
+            with chunks.open(partname, 'rb') as part:
+                utils.copy(part, out, hasher)
             chunks.delete(partname)
     chunks.delete(chunk_filename(uuid, META))
-    return target
+    metadata = {
+        'checksum': 'sha1:{0}'.format(hasher.sha1),
+        'size': hasher.size,
+        'mime': utils.mime(target) or DEFAULT_MIME,
+        'modified': datetime.utcnow(),
+        'filename': os.path.basename(target),
+        'url': storage.url(target, external=True),
+    }
+    return target, metadata
 
 
 def handle_upload(storage, prefix=None):
@@ -135,7 +152,7 @@ def handle_upload(storage, prefix=None):
         if uploaded_file:
             save_chunk(uploaded_file, args)
         else:
-            fs_filename = combine_chunks(storage, args, prefix=prefix)
+            fs_filename, metadata = combine_chunks(storage, args, prefix=prefix)
     elif not uploaded_file:
         raise UploadError('Missing file parameter')
     else:
@@ -146,8 +163,8 @@ def handle_upload(storage, prefix=None):
             prefix=prefix,
             filename=filename
         )
+        metadata = storage.metadata(fs_filename)
 
-    metadata = storage.metadata(fs_filename)
     metadata['last_modified_internal'] = metadata.pop('modified')
     metadata['fs_filename'] = fs_filename
     checksum = metadata.pop('checksum')
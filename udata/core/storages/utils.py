@@ -34,10 +34,56 @@ def md5(file):
 
 def crc32(file):
     '''Perform a CRC digest on a file'''
-    value = zlib.crc32(file.read())
+    value = 0
+    while True:
+        read_data = file.read(CHUNK_SIZE)
+        if not read_data:
+            break
+        value = zlib.crc32(read_data, value)
     return '%08X' % (value & 0xFFFFFFFF)
 
 
+class Hasher(object):
+    '''
+    Compute a file size and its SHA1, MD5 and CRC32 digests incrementally,
+    ie. while the file is being written.
+    '''
+    def __init__(self):
+        self.size = 0
+        self._sha1 = hashlib.sha1()
+        self._md5 = hashlib.md5()
+        self._crc32 = 0
+
+    def update(self, data):
+        self.size += len(data)
+        self._sha1.update(data)
+        self._md5.update(data)
+        self._crc32 = zlib.crc32(data, self._crc32)
+
+    @property
+    def sha1(self):
+        return self._sha1.hexdigest()
+
+    @property
+    def md5(self):
+        return self._md5.hexdigest()
+
+    @property
+    def crc32(self):
+        return '%08X' % (self._crc32 & 0xFFFFFFFF)
+
+
+def copy(infile, out, hasher=None, buffer_size=CHUNK_SIZE):
+    '''Copy a file into another by fixed-size buffers, optionally feeding a `Hasher`'''
+    while True:
+        data = infile.read(buffer_size)
+        if not data:
+            break
+        out.write(data)
+        if hasher:
+            hasher.update(data)
+
+
 def mime(url):
     '''Get the mimetype from an url or a filename'''
     return mimetypes.guess_type(url)[0]
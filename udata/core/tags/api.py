@@ -1,5 +1,6 @@
 from udata.api import api, API
 
+from udata.suggest import SuggestIndex
 from udata.tags import slug  # TODO: merge this into this package
 from udata.models import Tag
 
@@ -7,6 +8,14 @@ DEFAULT_SIZE = 8
 
 ns = api.namespace('tags', 'Tags related operations')
 
+
+def load_tags():
+    for tag in Tag.objects.only('name', 'total').as_pymongo():
+        yield tag.get('total') or 0, [tag['name']], {'text': tag['name']}
+
+
+suggest_index = SuggestIndex('tags', load_tags, model=Tag)
+
 parser = api.parser()
 parser.add_argument(
     'q', type=str, help='The string to autocomplete/suggest',
@@ -24,5 +33,5 @@ class SuggestTagsAPI(API):
         '''Suggest tags'''
         args = parser.parse_args()
         q = slug(args['q'])
-        results = [{'text': i.name} for i in Tag.objects(name__icontains=q).limit(args['size'])]
+        results = suggest_index.search(q, args['size'])
         return sorted(results, key=lambda o: len(o['text']))
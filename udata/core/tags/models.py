@@ -1,5 +1,9 @@
 import logging
 
+from mongoengine.signals import pre_save, post_save, post_delete
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
 from udata.models import db
 
 log = logging.getLogger(__name__)
@@ -7,11 +11,17 @@ log = logging.getLogger(__name__)
 
 __all__ = ('Tag', )
 
+#: Tagged models class names with their counts key
+TAGGED_MODELS = {
+    'Dataset': 'datasets',
+    'Reuse': 'reuses',
+}
+
 
 class Tag(db.Document):
     '''
-    This collection is auto-populated every hour map-reducing tag properties
-    from Datasets dans Reuses.
+    This collection is incrementally updated on Datasets and Reuses changes
+    and checked every hour against an aggregation of their tags.
     '''
     name = db.StringField(required=True, unique=True)
     counts = db.DictField()
@@ -24,3 +34,56 @@ class Tag(db.Document):
 
     def clean(self):
         self.total = sum(self.counts.values())
+
+    @classmethod
+    def update_counts(cls, key, added=(), removed=()):
+        '''Increment the `key` count of `added` tags and decrement the `removed` ones'''
+        ops = [
+            UpdateOne({'name': name}, {'$inc': {f'counts.{key}': 1, 'total': 1}}, upsert=True)
+            for name in added
+        ] + [
+            UpdateOne({'name': name}, {'$inc': {f'counts.{key}': -1, 'total': -1}})
+            for name in removed
+        ]
+        if not ops:
+            return
+        try:
+            cls._get_collection().bulk_write(ops, ordered=False)
+        except BulkWriteError:
+            # ie. concurrent upserts, fixed by the next `count-tags` run
+            log.exception('Unable to update %s tags counts', key)
+
+
+def has_changed_tags(document):
+    return any(field == 'tags' or field.startswith('tags.')
+               for field in document._get_changed_fields())
+
+
+@pre_save.connect
+def remember_previous_tags(sender, document, **kwargs):
+    '''Keep track of the stored tags before saving a tagged document'''
+    if sender.__name__ not in TAGGED_MODELS:
+        return
+    if document._created or not document.pk:
+        document._previous_tags = []
+    elif has_changed_tags(document):
+        document._previous_tags = sender.objects(pk=document.pk).scalar('tags').first() or []
+
+
+@post_save.connect
+def update_tags_counts_on_save(sender, document, **kwargs):
+    if sender.__name__ not in TAGGED_MODELS:
+        return
+    previous = document.__dict__.pop('_previous_tags', None)
+    if previous is None:
+        return
+    previous, current = set(previous), set(document.tags or [])
+    Tag.update_counts(TAGGED_MODELS[sender.__name__],
+                      added=current - previous, removed=previous - current)
+
+
+@post_delete.connect
+def update_tags_counts_on_delete(sender, document, **kwargs):
+    if sender.__name__ not in TAGGED_MODELS:
+        return
+    Tag.update_counts(TAGGED_MODELS[sender.__name__], removed=set(document.tags or []))
@@ -1,5 +1,7 @@
 import logging
 
+from pymongo import UpdateOne
+
 from udata.models import Dataset, Reuse
 from udata.tasks import job
 
@@ -7,39 +9,56 @@ from .models import Tag
 
 log = logging.getLogger(__name__)
 
-map_tags = '''
-function() {
-    this.tags.forEach(function(tag) {
-        emit(tag, 1);
-    });
-}
-'''
-
-reduce_tags = '''
-function(key, values) {
-    var total = 0;
-    for(var i = 0; i < values.length; i++) {
-        total += values[i];
-    }
-    return total;
-}
-'''
-
 TAGGED = {
     'datasets': Dataset,
     'reuses': Reuse,
 }
 
+#: Number of updates sent per `bulk_write`
+BULK_SIZE = 1000
+
+
+def aggregate_tags(model):
+    '''Count tag occurences for a given model: a dict tag name -> count'''
+    pipeline = [
+        {'$match': {'tags.0': {'$exists': True}}},
+        {'$unwind': '$tags'},
+        {'$group': {'_id': '$tags', 'count': {'$sum': 1}}},
+    ]
+    return {
+        row['_id']: row['count']
+        for row in model.objects.aggregate(*pipeline, allowDiskUse=True)
+    }
+
+
+def set_counts(counts):
+    return {'$set': {'counts': counts, 'total': sum(counts.values())}}
+
 
 @job('count-tags')
 def count_tags(self):
-    '''Count tag occurences by type and update the tag collection'''
+    '''
+    Count tag occurences by type and fix the tag collection if needed.
+
+    Counts are maintained incrementally on save and delete,
+    so this is only a consistency check.
+    '''
+    expected = {}
     for key, model in TAGGED.items():
-        collection = '{0}_tags'.format(key)
-        results = (model.objects(tags__exists=True)
-                        .map_reduce(map_tags, reduce_tags, collection))
-        for result in results:
-            tag, created = Tag.objects.get_or_create(name=result.key,
-                                                     auto_save=False)
-            tag.counts[key] = int(result.value) if result.value else 0
-            tag.save()
+        for name, count in aggregate_tags(model).items():
+            expected.setdefault(name, {})[key] = count
+
+    ops = []
+    for tag in Tag.objects.only('name', 'counts').as_pymongo():
+        counts = expected.pop(tag['name'], {})
+        current = {k: v for k, v in (tag.get('counts') or {}).items() if v}
+        if current != counts:
+            ops.append(UpdateOne({'_id': tag['_id']}, set_counts(counts)))
+    for name, counts in expected.items():
+        ops.append(UpdateOne({'name': name}, set_counts(counts), upsert=True))
+
+    if ops:
+        log.info('Fixing %s tags counts', len(ops))
+    collection = Tag._get_collection()
+    for i in range(0, len(ops), BULK_SIZE):
+        collection.bulk_write(ops[i:i + BULK_SIZE], ordered=False)
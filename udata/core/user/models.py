@@ -200,11 +200,11 @@ class User(WithMetrics, UserMixin, db.Document):
 
     @classmethod
     def post_save(cls, sender, document, **kwargs):
-        cls.after_save.send(document)
+        db.send_signal(cls.after_save, document)
         if kwargs.get('created'):
-            cls.on_create.send(document)
+            db.send_signal(cls.on_create, document)
         else:
-            cls.on_update.send(document)
+            db.send_signal(cls.on_update, document)
 
     @cached_property
     def json_ld(self):
@@ -1,15 +1,20 @@
 import logging
+import os
+import shutil
+import time
+import zlib
 
 from io import StringIO
 import itertools
 import csv
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
+from tempfile import TemporaryDirectory
 
-from flask import Response, stream_with_context
+from flask import Response, current_app, request, stream_with_context
 
 from udata.models import db
-from udata.utils import recursive_get
 
 
 log = logging.getLogger(__name__)
@@ -32,13 +37,61 @@ def safestr(value):
         return str(value)
 
 
+def compile_getter(path):
+    '''
+    Compile a dotted-notation attribute or key getter once,
+    behaving like `udata.utils.recursive_get`.
+    '''
+    parts = path.split('.')
+
+    def getter(obj):
+        for part in parts:
+            if not obj:
+                return None
+            obj = obj.get(part, None) if isinstance(obj, dict) else getattr(obj, part, None)
+        return obj
+    return getter
+
+
+def compile_row(fields):
+    '''Compile some `(name, getter)` fields into a row function'''
+    getters = [getter or (lambda o: '') for name, getter in fields]
+
+    def row(obj):
+        return [safestr(getter(obj)) for getter in getters]
+    return row
+
+
+def safe_row(adapter, fields, obj):
+    '''Build a row field by field, blanking and logging the faulty ones'''
+    row = []
+    for name, getter in fields:
+        content = ''
+        if getter is not None:
+            try:
+                content = safestr(getter(obj))
+            except Exception as e:  # Catch all errors intentionally.
+                log.error('Error exporting CSV for {name}: {error}'.format(
+                    name=adapter.__class__.__name__, error=e))
+        row.append(content)
+    return row
+
+
 class Adapter(object):
-    '''A Base model CSV adapter'''
+    '''
+    A Base model CSV adapter
+
+    Querysets are restricted to the model fields used by the declared fields
+    string paths and the `requires` ones, needed by callables and properties.
+    No projection is applied if `requires` is `None`.
+    '''
     fields = None
+    requires = None
 
     def __init__(self, queryset):
         self.queryset = queryset
         self._fields = None
+        self._row = None
 
     def get_fields(self):
         if not self._fields:
@@ -68,9 +121,33 @@ class Adapter(object):
             method = 'field_{0}'.format(name)
             return (getattr(self, method)
                     if hasattr(self, method)
-                    else lambda o: recursive_get(o, name))
-        return ((lambda o: recursive_get(o, getter))
-                if isinstance(getter, str) else getter)
+                    else compile_getter(name))
+        return compile_getter(getter) if isinstance(getter, str) else getter
+
+    def paths(self, fields):
+        '''The attributes paths of some declared fields'''
+        for field in fields:
+            if isinstance(field, str):
+                if not hasattr(self, 'field_{0}'.format(field)):
+                    yield field
+            elif len(field) > 1 and isinstance(field[1], str):
+                yield field[1]
+
+    def projection(self):
+        '''The model fields to load or `None` to load full documents'''
+        model = getattr(self.queryset, '_document', None)
+        if model is None or self.requires is None:
+            return None
+        only = set(self.requires)
+        for path in self.paths(itertools.chain(self.fields, self.dynamic_fields())):
+            root = path.split('.', 1)[0]
+            if root in model._fields:
+                only.add(root)
+        return sorted(only)
+
+    def get_queryset(self):
+        only = self.projection()
+        return self.queryset.only(*only) if only else self.queryset
 
     def header(self):
         '''Generate the CSV header row'''
@@ -78,21 +155,17 @@ class Adapter(object):
 
     def rows(self):
         '''Iterate over queryset objects'''
-        return (self.to_row(o) for o in self.queryset)
+        return (self.to_row(o) for o in self.get_queryset())
 
     def to_row(self, obj):
         '''Convert an object into a flat csv row'''
-        row = []
-        for name, getter in self.get_fields():
-            content = ''
-            if getter is not None:
-                try:
-                    content = safestr(getter(obj))
-                except Exception as e:  # Catch all errors intentionally.
-                    log.error('Error exporting CSV for {name}: {error}'.format(
-                        name=self.__class__.__name__, error=e))
-            row.append(content)
-        return row
+        if self._row is None:
+            self._row = compile_row(self.get_fields())
+        try:
+            return self._row(obj)
+        except Exception:
+            # Isolate the faulty field(s)
+            return safe_row(self, self.get_fields(), obj)
 
     def dynamic_fields(self):
         return []
@@ -105,6 +178,7 @@ class NestedAdapter(Adapter):
     def __init__(self, queryset):
         super(NestedAdapter, self).__init__(queryset)
         self._nested_fields = None
+        self._nested_row = None
 
     def header(self):
         '''Generate the CSV header row'''
@@ -135,30 +209,26 @@ class NestedAdapter(Adapter):
                 self._nested_fields.append(field_tuple)
         return self._nested_fields
 
-    def get_queryset(self):
-        return ((o, n)
-                for o in self.queryset
-                for n in getattr(o, self.attribute))
+    def projection(self):
+        only = super(NestedAdapter, self).projection()
+        return sorted(set(only) | {self.attribute}) if only else only
 
     def rows(self):
         '''Iterate over queryset objects'''
         return (self.nested_row(o, n)
-                for o in self.queryset
+                for o in self.get_queryset()
                 for n in getattr(o, self.attribute, []))
 
     def nested_row(self, obj, nested):
         '''Convert an object into a flat csv row'''
-        row = self.to_row(obj)
-        for name, getter in self.get_nested_fields():
-            content = ''
-            if getter is not None:
-                try:
-                    content = safestr(getter(nested))
-                except Exception as e:  # Catch all errors intentionally.
-                    log.error('Error exporting CSV for {name}: {error}'.format(
-                        name=self.__class__.__name__, error=e))
-            row.append(content)
-        return row
+        if self._nested_row is None:
+            self._nested_row = compile_row(self.get_nested_fields())
+        try:
+            nested_row = self._nested_row(nested)
+        except Exception:
+            # Isolate the faulty field(s)
+            nested_row = safe_row(self, self.get_nested_fields(), nested)
+        return self.to_row(obj) + nested_row
 
     def nested_dynamic_fields(self):
         return []
@@ -177,7 +247,8 @@ def get_adapter(cls):
 
 
 def _metric_getter(key):
-    return lambda o: o.get_metrics().get(key, 0)
+    # Read the metrics dict directly instead of rebuilding it for each metric
+    return lambda o: o.metrics.get(key, 0)
 
 
 def metric_fields(cls):
@@ -197,21 +268,99 @@ def get_reader(infile):
     return csv.reader(infile, **CONFIG)
 
 
-def yield_rows(adapter):
-    '''Yield a dataset catalog line by line'''
-    csvfile = StringIO()
-    writer = get_writer(csvfile)
+def yield_rows(adapter, block_size=None):
+    '''
+    Yield an adapter CSV export by blocks of at least `block_size` characters
+    (`CSV_STREAM_BLOCK_SIZE`), the header being yielded first on its own.
+
+    A single writer and buffer are reused for all rows.
+    '''
+    block_size = block_size or current_app.config['CSV_STREAM_BLOCK_SIZE']
+    buffer = StringIO()
+    writer = get_writer(buffer)
     # Generate header
     writer.writerow(adapter.header())
-    yield csvfile.getvalue()
-    del csvfile
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
 
+    start = time.monotonic()
+    count = 0
     for row in adapter.rows():
-        csvfile = StringIO()
-        writer = get_writer(csvfile)
         writer.writerow(row)
-        yield csvfile.getvalue()
-        del csvfile
+        count += 1
+        if buffer.tell() >= block_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+    elapsed = time.monotonic() - start
+    log.info('Streamed %s %s CSV rows in %.2fs (%.0f rows/s)', count,
+             adapter.__class__.__name__, elapsed, count / elapsed if elapsed else 0)
+
+
+def gzip_blocks(blocks, level=6):
+    '''Gzip-encode a stream of text blocks on the fly'''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block.encode('utf8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def id_ranges(queryset, size):
+    '''
+    Partition a queryset into consecutive `_id` ranges
+    of at most `size` documents.
+
+    Returns a list of `(lower, upper)` bounds, `upper` being excluded
+    and `None` for the last range.
+    '''
+    ids = queryset.order_by('id').scalar('id')
+    bounds = [id for idx, id in enumerate(ids) if idx % size == 0]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def chunk_queryset(queryset, lower, upper=None):
+    '''Restrict a queryset to an `_id` range'''
+    queryset = queryset.filter(id__gte=lower)
+    if upper is not None:
+        queryset = queryset.filter(id__lt=upper)
+    return queryset.order_by('id')
+
+
+def write_chunked(adapter, out, chunk_size, workers=1):
+    '''
+    Write an adapter CSV export into `out` by chunks of `_id` ranges.
+
+    Chunks are rendered concurrently into temporary files
+    by `workers` threads then concatenated in order.
+    '''
+    app = current_app._get_current_object()
+    get_writer(out).writerow(adapter.header())
+    out.flush()
+
+    with TemporaryDirectory() as tmpdir:
+        def render(args):
+            idx, (lower, upper) = args
+            filename = os.path.join(tmpdir, '{0}.csv'.format(idx))
+            chunk = adapter.__class__(chunk_queryset(adapter.queryset, lower, upper))
+            with app.app_context(), open(filename, 'w', encoding='utf8') as chunkfile:
+                writer = get_writer(chunkfile)
+                for row in chunk.rows():
+                    writer.writerow(row)
+            return filename
+
+        ranges = enumerate(id_ranges(adapter.queryset, chunk_size))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # `map` yields results in submission order
+            for filename in executor.map(render, ranges):
+                with open(filename, encoding='utf8', newline='') as chunkfile:
+                    shutil.copyfileobj(chunkfile, out)
+                os.unlink(filename)
+    out.flush()
 
 
 def stream(queryset_or_adapter, basename=None):
@@ -238,5 +387,11 @@ def stream(queryset_or_adapter, basename=None):
         'Content-Disposition': 'attachment; filename={0}-{1}.csv'.format(
             basename or 'export', timestamp),
     }
-    streamer = stream_with_context(yield_rows(adapter))
+    blocks = yield_rows(adapter)
+    if current_app.config['CSV_STREAM_GZIP']:
+        headers['Vary'] = 'Accept-Encoding'
+        if 'gzip' in request.accept_encodings:
+            headers['Content-Encoding'] = 'gzip'
+            blocks = gzip_blocks(blocks)
+    streamer = stream_with_context(blocks)
     return Response(streamer, mimetype="text/csv", headers=headers)
@@ -1,3 +1,7 @@
+import hashlib
+import threading
+
+from collections import OrderedDict
 from functools import partial
 from urllib.parse import urlparse
 
@@ -7,10 +11,11 @@ import mistune
 import re
 
 from bleach.linkifier import LinkifyFilter
-from flask import current_app, Markup, request
+from flask import current_app, Markup, request, has_request_context
 from werkzeug.local import LocalProxy
 from jinja2.filters import do_truncate, do_striptags
 
+from udata.app import cache
 from udata.i18n import _
 
 
@@ -22,6 +27,11 @@ RE_AUTOLINK = re.compile(
     r'<([A-Za-z][A-Za-z0-9.+-]{1,31}:[^<>\x00-\x20]*)>',
     re.IGNORECASE)
 
+RE_LINK_DEFINITION = re.compile(r'^ {0,3}\[[^\]]+\]:', re.MULTILINE)
+
+# Leeway used by `mdstrip` truncation
+TRUNCATE_LEEWAY = 2
+
 
 def source_tooltip_callback(attrs, new=False):
     """
@@ -82,6 +92,54 @@ class UdataCleaner(bleach.Cleaner):
                              callbacks=callbacks)])
 
 
+class RenderCache(object):
+    '''
+    A rendered markdown cache keyed by content hash:
+    a bounded in-process LRU backed by the Flask cache.
+    '''
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    @staticmethod
+    def key(*parts):
+        '''Build a cache key from the rendered source and its rendering parameters'''
+        digest = hashlib.sha1('\x00'.join(str(p) for p in parts).encode('utf8'))
+        return 'markdown:{0}'.format(digest.hexdigest())
+
+    def get(self, key):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                return self.items[key]
+        if not self.timeout:
+            return None
+        value = cache.get(key)
+        if value is not None:
+            self.remember(key, value)
+        return value
+
+    def set(self, key, value):
+        self.remember(key, value)
+        if self.timeout:
+            cache.set(key, value, timeout=self.timeout)
+
+    def remember(self, key, value):
+        if not self.size:
+            return
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
 class UDataMarkdown(object):
     """Consistent with Flask's extensions signature."""
 
@@ -89,23 +147,51 @@ class UDataMarkdown(object):
         app.jinja_env.filters.setdefault('markdown', self.__call__)
         renderer = Renderer(escape=False, hard_wrap=True)
         self.markdown = mistune.Markdown(renderer=renderer)
+        self.cache = RenderCache(app.config['MD_CACHE_SIZE'], app.config['MD_CACHE_TIMEOUT'])
+        # Bleach cleaners are not thread-safe: keep one per thread
+        self._local = threading.local()
+
+    def cleaner(self, source_tooltip=False):
+        '''A reusable cleaner for the current thread'''
+        cleaners = self._local.__dict__.setdefault('cleaners', {})
+        if source_tooltip not in cleaners:
+            cleaners[source_tooltip] = UdataCleaner(source_tooltip)
+        return cleaners[source_tooltip]
+
+    def cache_key(self, *parts):
+        '''
+        A cache key for some rendered content.
+
+        Relative links rendering depends on the server name and the request scheme.
+        '''
+        secure = request.is_secure if has_request_context() else None
+        return self.cache.key(current_app.config['SERVER_NAME'], secure, *parts)
 
     def __call__(self, stream, source_tooltip=False, wrap=True):
         if not stream:
             return ''
 
+        # The tooltip is translated
+        tooltip = _('Source') if source_tooltip else None
+        key = self.cache_key('html', tooltip, wrap, stream)
+        html = self.cache.get(key)
+        if html is None:
+            html = self.render(stream, source_tooltip, wrap)
+            self.cache.set(key, html)
+        # Return a `Markup` element considered as safe by Jinja.
+        return Markup(html)
+
+    def render(self, stream, source_tooltip=False, wrap=True):
         # Prepare angle bracket autolinks to avoid bleach treating them as tag
         stream = RE_AUTOLINK.sub(r'[\g<1>](\g<1>)', stream)
         # Turn markdown to HTML.
         html = self.markdown(stream)
 
-        cleaner = UdataCleaner(source_tooltip)
-        html = cleaner.clean(html)
+        html = self.cleaner(source_tooltip).clean(html)
 
         if wrap:
             html = '<div class="markdown">{0}</div>'.format(html.strip())
-        # Return a `Markup` element considered as safe by Jinja.
-        return Markup(html)
+        return html
 
 
 def mdstrip(value, length=None, end='…'):
@@ -119,10 +205,26 @@ def mdstrip(value, length=None, end='…'):
         return ''
     if EXCERPT_TOKEN in value:
         value = value.split(EXCERPT_TOKEN, 1)[0]
-    rendered = md(value, wrap=False)
-    text = do_striptags(rendered)
+    key = md.cache_key('text', length, end, value)
+    text = md.cache.get(key)
+    if text is None:
+        text = _strip(value, length, end)
+        md.cache.set(key, text)
+    return text
+
+
+def _strip(value, length=None, end='…'):
+    if length and length > 0:
+        # Fast path: only render the leading paragraphs if they are long enough.
+        # Reference-style links definitions may be anywhere so they are excluded.
+        cut = value.find('\n\n', 2 * length)
+        if cut > 0 and not RE_LINK_DEFINITION.search(value):
+            text = do_striptags(md(value[:cut], wrap=False))
+            if len(text) > length + TRUNCATE_LEEWAY:
+                return do_truncate(None, text, length, end=end, leeway=TRUNCATE_LEEWAY)
+    text = do_striptags(md(value, wrap=False))
     if length and length > 0:
-        text = do_truncate(None, text, length, end=end, leeway=2)
+        text = do_truncate(None, text, length, end=end, leeway=TRUNCATE_LEEWAY)
     return text
 
 
@@ -1,6 +1,10 @@
+import hashlib
+import json
 import logging
+import time
 import traceback
 
+from collections import OrderedDict
 from datetime import datetime, date, timedelta
 from uuid import UUID
 
@@ -10,11 +14,15 @@ from flask import current_app
 from voluptuous import MultipleInvalid, RequiredFieldInvalid
 
 from udata.core.dataset.models import HarvestDatasetMetadata
-from udata.models import Dataset
+from udata.models import db, Dataset
 from udata.utils import safe_unicode
 
-from ..exceptions import HarvestException, HarvestSkipException, HarvestValidationError
-from ..models import HarvestItem, HarvestJob, HarvestError, archive_harvested_dataset
+from ..exceptions import (
+    HarvestException, HarvestSkipException, HarvestValidationError, HarvestNotModified
+)
+from ..models import (
+    HarvestItem, HarvestJob, HarvestError, HarvestSource, archive_harvested_dataset
+)
 from ..signals import before_harvest_job, after_harvest_job
 
 log = logging.getLogger(__name__)
@@ -91,15 +99,34 @@ class BaseBackend(object):
             self.job = None
         self.dryrun = dryrun
         self.max_items = max_items or current_app.config['HARVEST_MAX_ITEMS']
+        self._pending_items = OrderedDict()
+        self._last_flush = time.monotonic()
+        self._validators = {}
 
     @property
     def config(self):
         return self.source.config
 
-    def get(self, url, **kwargs):
+    def get(self, url, conditional=False, **kwargs):
+        '''
+        Perform a GET request on a remote URL.
+
+        If `conditional` is `True`, the ETag/Last-Modified validators
+        known from the last successful harvest are sent along
+        and :class:`~udata.harvest.exceptions.HarvestNotModified` is raised
+        on a `304 Not Modified` response.
+        This is meant to be used while processing an item.
+        '''
         headers = self.get_headers()
+        if conditional and not self.dryrun:
+            headers.update(self.get_conditional_headers(url))
         kwargs['verify'] = kwargs.get('verify', self.verify_ssl)
-        return requests.get(url, headers=headers, **kwargs)
+        response = requests.get(url, headers=headers, **kwargs)
+        if conditional and not self.dryrun:
+            if response.status_code == 304:
+                raise HarvestNotModified('{0} has not been modified'.format(url), url=url)
+            self.keep_validators(url, response)
+        return response
 
     def post(self, url, data, **kwargs):
         headers = self.get_headers()
@@ -112,6 +139,80 @@ class BaseBackend(object):
             'User-Agent': 'uData/0.1 {0.name}'.format(self),
         }
 
+    @property
+    def config_digest(self):
+        '''A stable digest of the source configuration (filters, features...)'''
+        config = json.dumps(self.config or {}, sort_keys=True, default=str)
+        return hashlib.sha1(config.encode('utf8')).hexdigest()
+
+    def url_key(self, url):
+        # A configuration change invalidates the stored validators
+        return hashlib.sha1((self.config_digest + url).encode('utf8')).hexdigest()
+
+    def get_conditional_headers(self, url):
+        validators = (self.source.validators or {}).get(self.url_key(url)) or {}
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def keep_validators(self, url, response):
+        '''Keep a response validators until its item is successfully processed'''
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.ok and (etag or last_modified):
+            self._validators[self.url_key(url)] = {
+                'etag': etag,
+                'last_modified': last_modified,
+            }
+
+    def save_validators(self):
+        '''Persist the validators collected while processing an item'''
+        if self._validators and not self.dryrun:
+            HarvestSource.objects(id=self.source.id).update_one(**dict(
+                ('set__validators__{0}'.format(key), value)
+                for key, value in self._validators.items()
+            ))
+        self._validators = {}
+
+    def clear_validators(self, url):
+        '''Forget a remote URL stored validators'''
+        key = self.url_key(url)
+        (self.source.validators or {}).pop(key, None)
+        self._validators.pop(key, None)
+        if not self.dryrun:
+            HarvestSource.objects(id=self.source.id).update_one(
+                **{'unset__validators__{0}'.format(key): True}
+            )
+
+    def fingerprint(self, *parts):
+        '''Compute a content fingerprint from some string parts'''
+        # udata version is part of the fingerprint to reprocess all items after an upgrade
+        # and the source configuration to reprocess them after a filters or mappings change
+        from udata import __version__
+        sha1 = hashlib.sha1()
+        base = (__version__, self.name or self.display_name, self.config_digest)
+        for part in base + parts:
+            sha1.update(str(part).encode('utf8'))
+        return sha1.hexdigest()
+
+    def skip_unchanged(self, item, fingerprint):
+        '''
+        Store the item content fingerprint and raise
+        :class:`~udata.harvest.exceptions.HarvestNotModified`
+        if it matches the one of the last harvest of its dataset.
+        '''
+        item.fingerprint = fingerprint
+        if self.dryrun or not current_app.config['HARVEST_SKIP_UNCHANGED']:
+            return
+        dataset = Dataset.objects(__raw__=dict(
+            self.dataset_query(item.remote_id), **{'harvest.fingerprint': fingerprint}
+        )).only('id', 'archived').first()
+        if dataset and not dataset.archived:
+            raise HarvestNotModified('Item has not changed since the last harvest', dataset)
+
     def has_feature(self, key):
         try:
             feature = next(f for f in self.features if f.key == key)
@@ -124,9 +225,10 @@ class BaseBackend(object):
 
     def harvest(self):
         '''Start the harvesting process'''
-        if self.perform_initialization() is not None:
-            self.process_items()
-            self.finalize()
+        with db.coalesce_signals():
+            if self.perform_initialization() is not None:
+                self.process_items()
+                self.finalize()
         return self.job
 
     def perform_initialization(self):
@@ -176,18 +278,41 @@ class BaseBackend(object):
         '''Process the data identified in the initialize stage'''
         for item in self.job.items:
             self.process_item(item)
+        self.flush_items()
+
+    def save_item(self, item):
+        '''
+        Persist an item state.
+
+        Writes are buffered and flushed every `HARVEST_ITEMS_FLUSH_SIZE` items
+        or `HARVEST_ITEMS_FLUSH_DELAY` seconds, whichever comes first.
+        '''
+        if self.dryrun:
+            return
+        self._pending_items[item.remote_id] = item
+        size = current_app.config['HARVEST_ITEMS_FLUSH_SIZE']
+        delay = current_app.config['HARVEST_ITEMS_FLUSH_DELAY']
+        if len(self._pending_items) >= size or time.monotonic() - self._last_flush >= delay:
+            self.flush_items()
+
+    def flush_items(self):
+        '''Write the buffered items states'''
+        if self._pending_items and not self.dryrun:
+            self.job.update_items(*self._pending_items.values())
+        self._pending_items.clear()
+        self._last_flush = time.monotonic()
 
     def process_item(self, item):
         log.debug('Processing: %s', item.remote_id)
         item.status = 'started'
         item.started = datetime.utcnow()
-        if not self.dryrun:
-            self.job.save()
+        self.save_item(item)
 
         try:
-            dataset = self.process(item)
+            dataset = self.process_or_refetch(item)
             if not dataset.harvest:
                 dataset.harvest = HarvestDatasetMetadata()
+            dataset.harvest.fingerprint = item.fingerprint
             dataset.harvest.domain = self.source.domain
             dataset.harvest.remote_id = item.remote_id
             dataset.harvest.source_id = str(self.source.id)
@@ -215,6 +340,10 @@ class BaseBackend(object):
                 dataset.save()
             item.dataset = dataset
             item.status = 'done'
+            self.save_validators()
+        except HarvestNotModified as e:
+            log.debug('Item %s has not changed: %s', item.remote_id, safe_unicode(e))
+            self.keep_unchanged(item, e.dataset)
         except HarvestSkipException as e:
             log.info('Skipped item %s : %s', item.remote_id, safe_unicode(e))
             item.status = 'skipped'
@@ -233,8 +362,53 @@ class BaseBackend(object):
             item.status = 'failed'
 
         item.ended = datetime.utcnow()
-        if not self.dryrun:
-            self.job.save()
+        self.save_item(item)
+
+    def process_or_refetch(self, item):
+        '''
+        Process an item, fetching it again without conditional headers
+        if its remote URL has not been modified but it has no local dataset
+        (ie. deleted or never created because of an earlier failure).
+        '''
+        try:
+            return self.process(item)
+        except HarvestNotModified as e:
+            if not e.url or e.dataset:
+                raise
+            dataset = self.get_dataset(item.remote_id)
+            if dataset.id:
+                e.dataset = dataset
+                raise
+            log.info('%s has not been modified but has no local dataset, fetching it again',
+                     e.url)
+            self.clear_validators(e.url)
+            return self.process(item)
+
+    def keep_unchanged(self, item, dataset=None):
+        '''
+        Mark an unchanged item as done without rebuilding and saving its dataset.
+
+        Only the harvest last update date is refreshed (to prevent autoarchiving).
+        '''
+        self._validators = {}
+        dataset = dataset or self.get_dataset(item.remote_id)
+        if not dataset.id:
+            item.status = 'failed'
+            msg = 'Remote item has not been modified but has no local dataset'
+            item.errors.append(HarvestError(message=msg))
+            return
+        now = datetime.utcnow()
+        if not self.dryrun and dataset.archived:
+            # Still on the remote platform: unarchive
+            dataset.archived = None
+            dataset.harvest.archived = None
+            dataset.harvest.archived_at = None
+            dataset.harvest.last_update = now
+            dataset.save()
+        elif not self.dryrun:
+            Dataset.objects(id=dataset.id).update_one(set__harvest__last_update=now)
+        item.dataset = dataset
+        item.status = 'done'
 
     def autoarchive(self):
         '''
@@ -275,6 +449,7 @@ class BaseBackend(object):
         return item
 
     def finalize(self):
+        self.flush_items()
         if self.source.autoarchive:
             self.autoarchive()
         self.job.status = 'done'
@@ -292,14 +467,17 @@ class BaseBackend(object):
         '''Get or create a dataset given its remote ID (and its source)
         We first try to match `source_id` to be source domain independent
         '''
-        dataset = Dataset.objects(__raw__={
+        dataset = Dataset.objects(__raw__=self.dataset_query(remote_id)).first()
+        return dataset or Dataset()
+
+    def dataset_query(self, remote_id):
+        return {
             'harvest.remote_id': remote_id,
             '$or': [
                 {'harvest.domain': self.source.domain},
                 {'harvest.source_id': str(self.source.id)},
             ],
-        }).first()
-        return dataset or Dataset()
+        }
 
     def validate(self, data, schema):
         '''Perform a data validation against a given schema.
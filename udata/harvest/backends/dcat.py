@@ -1,15 +1,23 @@
 import logging
+import tempfile
+import threading
+
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 
 import requests
 
-from rdflib import Graph, URIRef, BNode
+from flask import current_app
+from rdflib import Graph, BNode
+from rdflib.compare import to_isomorphic
 from rdflib.namespace import RDF
-from typing import List
+from typing import Generator, List, Tuple
 
 from udata.rdf import (
     DCAT, DCT, HYDRA, SPDX, namespace_manager, guess_format, url_from_rdf
 )
 from udata.core.dataset.rdf import dataset_from_rdf
+from udata.core.storages import harvest as harvest_storage
 
 from .base import BaseBackend
 
@@ -43,17 +51,93 @@ def extract_graph(source, target, node, specs):
             extract_graph(source, target, o, specs[p])
 
 
+def extract_node_graph(source, node, specs=DCAT_NESTING, target=None):
+    '''Extract a node description including its nested nodes and blank nodes'''
+    target = Graph() if target is None else target
+    for p, o in source.predicate_objects(node):
+        if (node, p, o) in target:
+            continue
+        target.add((node, p, o))
+        if p in specs or isinstance(o, BNode):
+            extract_node_graph(source, o, specs.get(p, {}), target)
+    return target
+
+
+def index_nodes(graph):
+    '''Index a graph `DCAT.Dataset` nodes by their `DCT.identifier`, first match wins'''
+    nodes = {}
+    for node in graph.subjects(RDF.type, DCAT.Dataset):
+        nodes.setdefault(str(graph.value(node, DCT.identifier)), node)
+    return nodes
+
+
+# Size of the chunks used to spool downloaded pages
+SPOOL_CHUNK_SIZE = 64 * 1024
+
+# A parsed page graph and its `DCT.identifier -> DCAT.Dataset node` index
+ParsedPage = namedtuple('ParsedPage', ('graph', 'nodes'))
+
+
+class ParsedPagesCache(object):
+    '''
+    A bounded LRU cache of parsed page graphs, keyed by (job id, page).
+
+    It lives in the worker process so a page is parsed once
+    for all the items of a job processed by this worker
+    instead of once per item.
+    '''
+    def __init__(self):
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            page = self.pages.get(key)
+            if page is not None:
+                self.pages.move_to_end(key)
+            return page
+
+    def set(self, key, page, maxsize):
+        with self.lock:
+            self.pages[key] = page
+            self.pages.move_to_end(key)
+            while len(self.pages) > maxsize:
+                self.pages.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.pages.clear()
+
+
+parsed_pages = ParsedPagesCache()
+
+
 class DcatBackend(BaseBackend):
     display_name = 'DCAT'
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Parsed pages of unsaved jobs (ie. dry runs) can't be shared
+        self._local_pages = {}
+
+    @property
+    def spool_pages(self):
+        return current_app.config['HARVEST_SPOOL_PAGES'] and not self.dryrun
+
     def initialize(self):
         '''List all datasets for a given ...'''
         fmt = self.get_format()
-        graphs = self.parse_graph(self.source.url, fmt)
-        self.job.data = {
-            'graphs': [graph.serialize(format=fmt, indent=None) for graph in graphs],
-            'format': fmt,
-        }
+        self.job.data = {'format': fmt}
+        pages = self.walk_graph(self.source.url, fmt)
+        if self.spool_pages:
+            # Pages are spooled to the storage while being walked,
+            # recorded as they are so a failed walk still cleans them up
+            spooled = self.job.data['pages'] = []
+            for page, _ in pages:
+                spooled.append(self.page_filename(page))
+        else:
+            self.job.data['graphs'] = [graph.serialize(format=fmt, indent=None)
+                                       for _, graph in pages]
 
     def get_format(self):
         fmt = guess_format(self.source.url)
@@ -76,11 +160,23 @@ class DcatBackend(BaseBackend):
         Returns an instance of rdflib.Graph for each detected page
         The index in the list is the page number
         """
-        graphs = []
+        return [graph for _, graph in self.walk_graph(url, fmt)]
+
+    def walk_graph(self, url, fmt) -> Generator[Tuple[int, Graph], None, None]:
+        """
+        Lazily yield a `(page number, rdflib.Graph)` tuple for each detected page
+        and register its datasets as harvest items.
+
+        Only the current page is kept in memory.
+        """
         page = 0
         while url:
             subgraph = Graph(namespace_manager=namespace_manager)
-            subgraph.parse(data=requests.get(url).text, format=fmt)
+            if self.spool_pages:
+                with self.spool_page(url, page) as source:
+                    subgraph.parse(file=source, format=fmt)
+            else:
+                subgraph.parse(data=requests.get(url).text, format=fmt)
 
             url = None
             for cls, prop in KNOWN_PAGINATION:
@@ -89,7 +185,6 @@ class DcatBackend(BaseBackend):
                     pagination = subgraph.resource(pagination)
                     url = url_from_rdf(pagination, prop)
                     break
-            graphs.append(subgraph)
 
             for node in subgraph.subjects(RDF.type, DCAT.Dataset):
                 id = subgraph.value(node, DCT.identifier)
@@ -99,24 +194,73 @@ class DcatBackend(BaseBackend):
                     # this will stop iterating on pagination
                     url = None
 
+            yield page, subgraph
             page += 1
 
-        return graphs
+    def page_filename(self, page):
+        return f'{self.job.id}/{page}'
 
-    def get_node_from_item(self, graph, item):
-        for node in graph.subjects(RDF.type, DCAT.Dataset):
-            if str(graph.value(node, DCT.identifier)) == item.remote_id:
-                return node
-        raise ValueError(f'Unable to find dataset with DCT.identifier:{item.remote_id}')
+    @contextmanager
+    def spool_page(self, url, page):
+        '''
+        Download a page by chunks to the harvest storage
+        and yield a local temporary copy rewound for parsing
+        instead of reading the stored page back.
+        '''
+        filename = self.page_filename(page)
+        with tempfile.TemporaryFile() as local:
+            with requests.get(url, stream=True) as response:
+                with harvest_storage.open(filename, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=SPOOL_CHUNK_SIZE):
+                        f.write(chunk)
+                        local.write(chunk)
+            local.seek(0)
+            yield local
 
-    def process(self, item):
+    def parse_page(self, page):
+        '''Parse a stored page graph and index its datasets nodes by identifier'''
         graph = Graph(namespace_manager=namespace_manager)
-        data = self.job.data['graphs'][item.kwargs['page']]
         format = self.job.data['format']
+        if 'pages' in self.job.data:
+            with harvest_storage.open(self.job.data['pages'][page], 'rb') as f:
+                graph.parse(file=f, format=format)
+        else:
+            data = bytes(self.job.data['graphs'][page], encoding='utf8')
+            graph.parse(data=data, format=format)
+        return ParsedPage(graph, index_nodes(graph))
 
-        graph.parse(data=bytes(data, encoding='utf8'), format=format)
-        node = self.get_node_from_item(graph, item)
+    def get_page(self, page):
+        '''Get a parsed page, parsing it only once per job and worker'''
+        if not self.job.id:
+            if page not in self._local_pages:
+                self._local_pages[page] = self.parse_page(page)
+            return self._local_pages[page]
+        key = (str(self.job.id), page)
+        parsed = parsed_pages.get(key)
+        if parsed is None:
+            parsed = self.parse_page(page)
+            parsed_pages.set(key, parsed, current_app.config['HARVEST_GRAPHS_CACHE_SIZE'])
+        return parsed
+
+    def process(self, item):
+        page = self.get_page(item.kwargs['page'])
+        node = page.nodes.get(item.remote_id)
+        if node is None:
+            raise ValueError(f'Unable to find dataset with DCT.identifier:{item.remote_id}')
+
+        # Blank nodes identifiers are not stable, use the isomorphic graph digest
+        digest = to_isomorphic(extract_node_graph(page.graph, node)).graph_digest()
+        self.skip_unchanged(item, self.fingerprint(digest))
 
         dataset = self.get_dataset(item.remote_id)
-        dataset = dataset_from_rdf(graph, dataset, node=node)
+        dataset = dataset_from_rdf(page.graph, dataset, node=node)
         return dataset
+
+    def end(self):
+        super().end()
+        if self.job.data and 'pages' in self.job.data:
+            # Spooled pages are not needed anymore
+            try:
+                harvest_storage.delete(str(self.job.id))
+            except Exception:
+                log.exception('Unable to delete spooled pages for job %s', self.job.id)
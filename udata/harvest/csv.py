@@ -15,3 +15,4 @@ class HarvestSourceCsvAdapter(csv.Adapter):
         'created_at',
         ('validation', lambda o: o.validation.state),
     )
+    requires = ('validation',)
@@ -11,3 +11,11 @@ class HarvestSkipException(HarvestException):
 class HarvestValidationError(HarvestException):
     '''Raised when an harvested item is invalid'''
     pass
+
+
+class HarvestNotModified(HarvestException):
+    '''Raised when an harvested item did not change since the last harvest'''
+    def __init__(self, message=None, dataset=None, url=None):
+        super(HarvestNotModified, self).__init__(message)
+        self.dataset = dataset
+        self.url = url
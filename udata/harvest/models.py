@@ -3,6 +3,7 @@ from datetime import datetime
 import logging
 from urllib.parse import urlparse
 
+from pymongo import UpdateOne
 from werkzeug.utils import cached_property
 
 from udata.core.dataset.models import HarvestDatasetMetadata
@@ -60,6 +61,7 @@ class HarvestItem(db.EmbeddedDocument):
     errors = db.ListField(db.EmbeddedDocumentField(HarvestError))
     args = db.ListField(db.StringField())
     kwargs = db.DictField()
+    fingerprint = db.StringField()
 
 
 VALIDATION_ACCEPTED = 'accepted'
@@ -106,6 +108,8 @@ class HarvestSource(db.Owned, db.Document):
     autoarchive = db.BooleanField(default=True)
     validation = db.EmbeddedDocumentField(HarvestSourceValidation,
                                           default=HarvestSourceValidation)
+    # HTTP validators (ETag/Last-Modified) of remote URLs, keyed by URL hash
+    validators = db.DictField()
 
     deleted = db.DateTimeField()
 
@@ -170,6 +174,19 @@ class HarvestJob(db.Document):
         'ordering': ['-created'],
     }
 
+    def update_items(self, *items):
+        '''
+        Persist some items state with targeted positional updates
+        instead of rewriting the whole job document.
+        '''
+        if not items:
+            return
+        self._get_collection().bulk_write([
+            UpdateOne({'_id': self.id, 'items.remote_id': item.remote_id},
+                      {'$set': {'items.$': item.to_mongo()}})
+            for item in items
+        ], ordered=False)
+
 
 def archive_harvested_dataset(dataset, reason, dryrun=False):
     '''
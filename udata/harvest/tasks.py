@@ -1,6 +1,7 @@
 from celery import chord
 from flask import current_app
 
+from udata.models import db
 from udata.tasks import job, get_logger, task
 
 from . import backends
@@ -27,7 +28,8 @@ def harvest(self, ident):
         ]
         chord(items)(finalize)
     elif items == 0:
-        backend.finalize()
+        with db.coalesce_signals():
+            backend.finalize()
 
 
 @task(ignore_result=False, route='low.harvest')
@@ -40,7 +42,10 @@ def harvest_job_item(job_id, item_id):
 
     item = next(i for i in job.items if i.remote_id == item_id)
 
-    backend.process_item(item)
+    # Signals are coalesced per item as items are processed by distinct tasks
+    with db.coalesce_signals():
+        backend.process_item(item)
+        backend.flush_items()
     return item_id
 
 
@@ -50,7 +55,8 @@ def harvest_job_finalize(results, job_id):
     job = HarvestJob.objects.get(pk=job_id)
     Backend = backends.get(current_app, job.source.backend)
     backend = Backend(job)
-    backend.finalize()
+    with db.coalesce_signals():
+        backend.finalize()
 
 
 @job('purge-harvesters', route='low.harvest')
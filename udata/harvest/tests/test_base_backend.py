@@ -15,6 +15,7 @@ from .factories import HarvestSourceFactory
 
 from ..backends import BaseBackend, HarvestFilter, HarvestFeature
 from ..exceptions import HarvestException
+from ..models import HarvestJob
 
 
 class Unknown:
@@ -44,6 +45,12 @@ class FakeBackend(BaseBackend):
         return dataset
 
 
+class ConditionalBackend(FakeBackend):
+    def process(self, item):
+        self.get('http://remote.test.org/{0}'.format(item.remote_id), conditional=True)
+        return super().process(item)
+
+
 class HarvestFilterTest:
     @pytest.mark.parametrize('type,expected', HarvestFilter.TYPES.items())
     def test_type_ok(self, type, expected):
@@ -172,6 +179,89 @@ class BaseBackendTest:
         assert dataset.last_modified_internal == last_modified
         assert_equal_dates(dataset.harvest.last_update, datetime.utcnow())
 
+    def test_process_item_uses_targeted_updates(self, mocker):
+        source = HarvestSourceFactory(config={'nb_datasets': 2})
+        backend = FakeBackend(source)
+        backend.perform_initialization()
+        save = mocker.spy(HarvestJob, 'save')
+
+        backend.process_item(backend.job.items[0])
+
+        save.assert_not_called()
+        job = HarvestJob.objects.get(pk=backend.job.id)
+        assert job.items[0].status == 'done'
+        assert job.items[0].dataset is not None
+        assert job.items[1].status == 'pending'
+
+    @pytest.mark.options(HARVEST_ITEMS_FLUSH_SIZE=10, HARVEST_ITEMS_FLUSH_DELAY=60)
+    def test_buffered_items_updates(self):
+        source = HarvestSourceFactory(config={'nb_datasets': 2})
+        backend = FakeBackend(source)
+        backend.perform_initialization()
+
+        backend.process_item(backend.job.items[0])
+
+        job = HarvestJob.objects.get(pk=backend.job.id)
+        assert job.items[0].status == 'pending'
+
+        backend.flush_items()
+
+        job.reload()
+        assert job.items[0].status == 'done'
+
+    def test_conditional_get(self, rmock, mocker):
+        source = HarvestSourceFactory(config={'nb_datasets': 1})
+        rmock.get('http://remote.test.org/fake-0', headers={
+            'ETag': '"etag"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'
+        })
+        ConditionalBackend(source).harvest()
+
+        source.reload()
+        assert list(source.validators.values()) == [{
+            'etag': '"etag"', 'last_modified': 'Wed, 21 Oct 2015 07:28:00 GMT'
+        }]
+
+        rmock.get('http://remote.test.org/fake-0', status_code=304)
+        save = mocker.spy(Dataset, 'save')
+
+        job = ConditionalBackend(source).harvest()
+
+        assert rmock.last_request.headers['If-None-Match'] == '"etag"'
+        assert rmock.last_request.headers['If-Modified-Since'] == 'Wed, 21 Oct 2015 07:28:00 GMT'
+        save.assert_not_called()
+        assert job.items[0].status == 'done'
+        assert job.items[0].dataset == Dataset.objects.get()
+
+    def test_conditional_get_refetch_missing_dataset(self, rmock):
+        source = HarvestSourceFactory(config={'nb_datasets': 1})
+        rmock.get('http://remote.test.org/fake-0', headers={'ETag': '"etag"'})
+        ConditionalBackend(source).harvest()
+        Dataset.objects.delete()
+        rmock.get('http://remote.test.org/fake-0', [
+            {'status_code': 304},
+            {'status_code': 200, 'headers': {'ETag': '"other"'}},
+        ])
+
+        job = ConditionalBackend(source.reload()).harvest()
+
+        assert 'If-None-Match' not in rmock.last_request.headers
+        assert job.items[0].status == 'done'
+        assert job.items[0].dataset == Dataset.objects.get()
+        assert list(source.reload().validators.values()) == [{
+            'etag': '"other"', 'last_modified': None
+        }]
+
+    def test_config_change_invalidates_fingerprint(self):
+        source = HarvestSourceFactory(config={'filters': [{'key': 'first', 'value': 'a'}]})
+        backend = FakeBackend(source)
+        fingerprint = backend.fingerprint('content')
+        key = backend.url_key('http://remote.test.org')
+
+        source.config['filters'][0]['value'] = 'b'
+
+        assert backend.fingerprint('content') != fingerprint
+        assert backend.url_key('http://remote.test.org') != key
+
     def test_autoarchive(self, app):
         nb_datasets = 3
         source = HarvestSourceFactory(config={'nb_datasets': nb_datasets})
@@ -6,11 +6,13 @@ import pytest
 from datetime import date
 
 from udata.models import Dataset
+from udata.core.storages import harvest as harvest_storage
 from udata.core.organization.factories import OrganizationFactory
 from udata.core.dataset.factories import LicenseFactory
 
 from .factories import HarvestSourceFactory
 from .. import actions
+from ..backends.dcat import DcatBackend
 
 log = logging.getLogger(__name__)
 
@@ -184,6 +186,42 @@ class DcatBackendTest:
         assert len(datasets['2'].resources) == 2
         assert len(datasets['3'].resources) == 1
 
+    def test_unchanged_items_are_not_saved(self, rmock, mocker):
+        filename = 'flat.jsonld'
+        url = mock_dcat(rmock, filename)
+        org = OrganizationFactory()
+        source = HarvestSourceFactory(backend='dcat',
+                                      url=url,
+                                      organization=org)
+        actions.run(source.slug)
+        first_job = source.get_last_job()
+        save = mocker.spy(Dataset, 'save')
+
+        actions.run(source.slug)
+
+        save.assert_not_called()
+        job = source.get_last_job()
+        assert job.id != first_job.id
+        assert len(job.items) == 3
+        assert all(item.status == 'done' for item in job.items)
+        assert [i.fingerprint for i in job.items] == [i.fingerprint for i in first_job.items]
+        assert Dataset.objects.count() == 3
+
+    @pytest.mark.options(HARVEST_SKIP_UNCHANGED=False)
+    def test_unchanged_items_are_saved_if_disabled(self, rmock, mocker):
+        filename = 'flat.jsonld'
+        url = mock_dcat(rmock, filename)
+        org = OrganizationFactory()
+        source = HarvestSourceFactory(backend='dcat',
+                                      url=url,
+                                      organization=org)
+        actions.run(source.slug)
+        save = mocker.spy(Dataset, 'save')
+
+        actions.run(source.slug)
+
+        assert save.call_count == 3
+
     def test_hydra_partial_collection_view_pagination(self, rmock):
         url = mock_pagination(rmock, 'catalog.jsonld',
                               'partial-collection-{page}.jsonld')
@@ -214,6 +252,69 @@ class DcatBackendTest:
         job = source.get_last_job()
         assert len(job.items) == 4
 
+    def test_pages_are_parsed_once_per_job(self, rmock, mocker):
+        url = mock_pagination(rmock, 'catalog.jsonld',
+                              'partial-collection-{page}.jsonld')
+        org = OrganizationFactory()
+        source = HarvestSourceFactory(backend='dcat',
+                                      url=url,
+                                      organization=org)
+        spy = mocker.spy(DcatBackend, 'parse_page')
+
+        actions.run(source.slug)
+
+        job = source.get_last_job()
+        assert len(job.items) == 4
+        assert all(item.status == 'done' for item in job.items)
+        assert spy.call_count == len(job.data['graphs'])
+
+    @pytest.mark.usefixtures('instance_path')
+    @pytest.mark.options(HARVEST_SPOOL_PAGES=True)
+    def test_spooled_pages(self, rmock, mocker):
+        url = mock_pagination(rmock, 'catalog.jsonld',
+                              'partial-collection-{page}.jsonld')
+        org = OrganizationFactory()
+        source = HarvestSourceFactory(backend='dcat',
+                                      url=url,
+                                      organization=org)
+        delete = mocker.spy(harvest_storage, 'delete')
+
+        actions.run(source.slug)
+
+        job = source.get_last_job()
+        assert 'graphs' not in job.data
+        assert job.data['pages'] == [f'{job.id}/0', f'{job.id}/1']
+        assert len(job.items) == 4
+        assert all(item.status == 'done' for item in job.items)
+        assert Dataset.objects.count() == 4
+        delete.assert_called_once_with(str(job.id))
+        assert not harvest_storage.exists(f'{job.id}/0')
+
+    @pytest.mark.usefixtures('instance_path')
+    @pytest.mark.options(HARVEST_SPOOL_PAGES=True)
+    def test_spooled_pages_cleaned_on_failure(self, rmock, mocker):
+        url = DCAT_URL_PATTERN.format(path='catalog.jsonld', domain=TEST_DOMAIN)
+
+        def callback(request, context):
+            page = request.qs.get('page', [1])[0]
+            if str(page) != '1':
+                return 'should fail'
+            filename = 'partial-collection-1.jsonld'
+            with open(os.path.join(DCAT_FILES_DIR, filename)) as dcatfile:
+                return dcatfile.read()
+
+        rmock.get(rmock.ANY, text=callback)
+        source = HarvestSourceFactory(backend='dcat', url=url,
+                                      organization=OrganizationFactory())
+        delete = mocker.spy(harvest_storage, 'delete')
+
+        actions.run(source.slug)
+
+        job = source.get_last_job()
+        assert job.status == 'failed'
+        delete.assert_called_once_with(str(job.id))
+        assert not harvest_storage.exists(f'{job.id}/0')
+
     def test_failure_on_initialize(self, rmock):
         url = DCAT_URL_PATTERN.format(path='', domain=TEST_DOMAIN)
         rmock.get(url, text='should fail')
@@ -1,7 +1,13 @@
 import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
 
+import requests
+
 from flask import current_app
+from requests.adapters import HTTPAdapter
 
 from udata.entrypoints import get_enabled
 
@@ -10,6 +16,50 @@ log = logging.getLogger(__name__)
 
 ENTRYPOINT = 'udata.linkcheckers'
 
+_session = None
+
+
+def get_session():
+    '''
+    A process-wide pooled HTTP session linkcheckers can share.
+
+    It is sized to match the number of concurrent checks.
+    '''
+    global _session
+    if _session is None:
+        pool_size = current_app.config['LINKCHECKING_WORKERS']
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
+
+def no_limit(url):
+    return nullcontext()
+
+
+def check_many(linkchecker, resources, limit=no_limit):
+    '''
+    Check some resources with a linkchecker instance.
+
+    Linkcheckers may implement an optional `check_many(resources, limit)` method
+    returning the results in the resources order to submit them in one call,
+    otherwise resources are checked one by one.
+
+    :param callable limit: a context manager factory given a resource URL,
+                           entered around each request to this URL
+                           (by `check_many` implementations for batches)
+    '''
+    if hasattr(linkchecker, 'check_many'):
+        return list(linkchecker.check_many(resources, limit=limit))
+    results = []
+    for resource in resources:
+        with limit(resource.url):
+            results.append(linkchecker.check(resource))
+    return results
+
 
 class NoCheckLinkchecker(object):
     """Dummy linkchecker for resources that need no check"""
@@ -21,6 +71,51 @@ class NoCheckLinkchecker(object):
             'check:date': datetime.utcnow()
         }
 
+    def check_many(self, resources, limit=no_limit):
+        return [self.check(resource) for resource in resources]
+
+
+class HttpLinkchecker(object):
+    '''
+    A reference linkchecker performing the checks itself with HTTP requests.
+
+    A `HEAD` request is sent first, falling back on a streamed `GET`
+    for servers not supporting it. `check_many` checks a batch concurrently
+    on the shared session, each request going through the politeness `limit`.
+    '''
+    FALLBACK_STATUSES = (405, 501)
+
+    def __init__(self):
+        self.session = get_session()
+        self.timeout = current_app.config['LINKCHECKING_TIMEOUT']
+        self.workers = current_app.config['LINKCHECKING_MAX_PER_HOST']
+
+    def check(self, resource):
+        try:
+            response = self.session.head(resource.url, timeout=self.timeout,
+                                         allow_redirects=True)
+            if response.status_code in self.FALLBACK_STATUSES:
+                response = self.session.get(resource.url, timeout=self.timeout, stream=True)
+                response.close()
+        except requests.RequestException as e:
+            return {'check:error': str(e)}
+        return {
+            'check:url': resource.url,
+            'check:status': response.status_code,
+            'check:available': response.status_code < 400,
+            'check:date': datetime.utcnow(),
+        }
+
+    def check_many(self, resources, limit=no_limit):
+        def check(resource):
+            with limit(resource.url):
+                return self.check(resource)
+
+        if len(resources) < 2:
+            return [check(resource) for resource in resources]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(check, resources))
+
 
 def get(name):
     '''Get a linkchecker given its name or fallback on default'''
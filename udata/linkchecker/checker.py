@@ -1,8 +1,17 @@
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from urllib.parse import urlparse
 
 from flask import current_app
 
-from .backends import get as get_linkchecker, NoCheckLinkchecker
+from .backends import get as get_linkchecker, check_many, no_limit, NoCheckLinkchecker
+
+log = logging.getLogger(__name__)
 
 
 def _get_check_keys(the_dict, resource, previous_status):
@@ -37,6 +46,77 @@ def dummy_check_response():
     return NoCheckLinkchecker().check(None)
 
 
+def validate_result(result):
+    '''Turn a linkchecker result into a `(result, store)` tuple'''
+    if not result:
+        return ({'error': 'No response from linkchecker'}, 503), False
+    elif result.get('check:error'):
+        return ({'error': result['check:error']}, 500), False
+    elif not result.get('check:status'):
+        return ({'error': 'No status in response from linkchecker'}, 503), False
+    return result, True
+
+
+def run_checks(resources, limit=no_limit):
+    '''
+    Run some resources checks against their linkchecker backends
+    without storing the results.
+
+    Resources sharing a linkchecker are submitted to it in a single
+    `check_many` call when supported.
+    Each linkchecker call is wrapped by the optional `limit` context manager factory.
+
+    Returns
+    -------
+    list of (dict or (dict, int), bool)
+        For each resource, the check results dict and status code (if error)
+        and whether the result should be stored.
+    '''
+    results = [None] * len(resources)
+    by_linkchecker = OrderedDict()
+    for idx, resource in enumerate(resources):
+        LinkChecker = get_linkchecker(resource.extras.get('check:checker'))
+        if not LinkChecker:
+            results[idx] = ({'error': 'No linkchecker configured.'}, 503), False
+        elif is_ignored(resource):
+            results[idx] = dummy_check_response(), False
+        else:
+            by_linkchecker.setdefault(LinkChecker, []).append(idx)
+    for LinkChecker, idxs in by_linkchecker.items():
+        checked = check_many(LinkChecker(), [resources[idx] for idx in idxs], limit)
+        if len(checked) != len(idxs):
+            error = 'Linkchecker returned {0} results for {1} resources'.format(
+                len(checked), len(idxs))
+            log.error(error)
+            for idx in idxs:
+                results[idx] = ({'error': error}, 503), False
+            continue
+        for idx, result in zip(idxs, checked):
+            results[idx] = validate_result(result)
+    return results
+
+
+def run_check(resource):
+    '''
+    Run a resource check against its linkchecker backend
+    without storing the result.
+
+    Returns
+    -------
+    (dict or (dict, int), bool)
+        Check results dict and status code (if error)
+        and whether the result should be stored.
+    '''
+    return run_checks([resource])[0]
+
+
+def get_check_keys(resource, result):
+    '''The `check:*` extras to store for a given check result'''
+    # XXX maybe this logic should be in the `Resource` model?
+    previous_status = resource.extras.get('check:available')
+    return _get_check_keys(result, resource, previous_status)
+
+
 def check_resource(resource):
     '''
     Check a resource availability against a linkchecker backend
@@ -52,23 +132,129 @@ def check_resource(resource):
     dict or (dict, int)
         Check results dict and status code (if error).
     '''
-    linkchecker_type = resource.extras.get('check:checker')
-    LinkChecker = get_linkchecker(linkchecker_type)
-    if not LinkChecker:
-        return {'error': 'No linkchecker configured.'}, 503
-    if is_ignored(resource):
-        return dummy_check_response()
-    result = LinkChecker().check(resource)
-    if not result:
-        return {'error': 'No response from linkchecker'}, 503
-    elif result.get('check:error'):
-        return {'error': result['check:error']}, 500
-    elif not result.get('check:status'):
-        return {'error': 'No status in response from linkchecker'}, 503
-    # store the check result in the resource's extras
-    # XXX maybe this logic should be in the `Resource` model?
-    previous_status = resource.extras.get('check:available')
-    check_keys = _get_check_keys(result, resource, previous_status)
-    resource.extras.update(check_keys)
-    resource.save(signal_kwargs={'ignores': ['post_save']})  # Prevent signal triggering on dataset
+    result, store = run_check(resource)
+    if store:
+        # Only set the `check:*` extras: no dataset validation nor signal
+        resource.update_extras(get_check_keys(resource, result))
     return result
+
+
+class HostLimiter(object):
+    '''
+    Politeness limits for concurrent checks: at most `max_per_host`
+    simultaneous checks per host and at least `delay` seconds
+    between two checks starting on the same host.
+    '''
+    def __init__(self, max_per_host, delay=0):
+        self.max_per_host = max_per_host
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.next_slots = {}
+
+    def wait(self, host):
+        '''Reserve the next check slot for `host` and wait for it'''
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slots.get(host, now))
+            self.next_slots[host] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+    @contextmanager
+    def limit(self, url):
+        host = urlparse(url or '').netloc
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            semaphore = self.semaphores[host]
+        with semaphore:
+            if self.delay:
+                self.wait(host)
+            yield
+
+
+class CheckEngine(object):
+    '''
+    Check resources concurrently, grouped by dataset.
+
+    The resources of a dataset sharing a host are submitted as one batch.
+    Batches run in a bounded thread pool with per-host politeness limits
+    applied to each request, including within `check_many` batches.
+    Each dataset is loaded once per batch and all the checked resources
+    `check:*` extras are written with a single bulk of positional updates,
+    along with the refreshed quality of their datasets.
+    '''
+    def __init__(self, workers=None, max_per_host=None, delay=None, batch_size=None):
+        config = current_app.config
+        self.workers = workers or config['LINKCHECKING_WORKERS']
+        self.batch_size = batch_size or config['LINKCHECKING_BATCH_SIZE']
+        self.limiter = HostLimiter(
+            max_per_host or config['LINKCHECKING_MAX_PER_HOST'],
+            config['LINKCHECKING_HOST_DELAY'] if delay is None else delay,
+        )
+        self.app = current_app._get_current_object()
+        self.checked = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def check(self, resources):
+        '''Check a batch of resources sharing a host'''
+        with self.app.app_context():
+            return run_checks(resources, limit=self.limiter.limit)
+
+    def run(self, resources):
+        '''
+        Check resources given as an iterable of `(dataset_id, resource_id)`.
+        '''
+        by_dataset = OrderedDict()
+        for dataset_id, resource_id in resources:
+            by_dataset.setdefault(dataset_id, set()).add(str(resource_id))
+        dataset_ids = list(by_dataset)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for i in range(0, len(dataset_ids), self.batch_size):
+                batch = dataset_ids[i:i + self.batch_size]
+                self.check_batch(executor, batch, by_dataset)
+
+    def check_batch(self, executor, batch, by_dataset):
+        from udata.models import Dataset
+
+        futures = []
+        for dataset in Dataset.objects(id__in=batch):
+            resource_ids = by_dataset[dataset.id]
+            by_host = OrderedDict()
+            for resource in dataset.resources:
+                if str(resource.id) not in resource_ids:
+                    continue
+                if not resource.need_check():
+                    self.skipped += 1
+                    continue
+                by_host.setdefault(urlparse(resource.url or '').netloc, []).append(resource)
+            for resources in by_host.values():
+                futures.append((resources, executor.submit(self.check, resources)))
+
+        updates = []
+        updated = OrderedDict()
+        for resources, future in futures:
+            try:
+                results = future.result()
+            except Exception:
+                self.errors += len(resources)
+                log.exception('Unable to check resources %s',
+                              ', '.join(str(r.id) for r in resources))
+                continue
+            for resource, (result, store) in zip(resources, results):
+                self.checked += 1
+                if store:
+                    check_keys = get_check_keys(resource, result)
+                    resource.extras.update(check_keys)
+                    updates.append(resource.extras_update(check_keys))
+                    updated[resource.dataset.id] = resource.dataset
+                elif isinstance(result, tuple):
+                    self.errors += 1
+                    log.error('Error checking resource %s: %s',
+                              resource.id, result[0]['error'])
+
+        if updates:
+            updates.extend(dataset.quality_update() for dataset in updated.values())
+            Dataset._get_collection().bulk_write(updates, ordered=False)
@@ -1,13 +1,11 @@
 import logging
-import uuid
 
 from flask import current_app
 
 from udata.models import Dataset
 from udata.tasks import job
-from udata.utils import get_by
 
-from .checker import check_resource
+from .checker import CheckEngine
 
 log = logging.getLogger(__name__)
 
@@ -41,17 +39,8 @@ def check_resources(self, number):
         ]
         resources += list(Dataset.objects.aggregate(*pipeline))
 
-    nb_resources = len(resources)
-    log.info('Checking %s resources...', nb_resources)
-    for idx, dataset_resource in enumerate(resources):
-        dataset_obj = Dataset.objects.get(id=dataset_resource['_id'])
-        resource_id = dataset_resource['resources']['_id']
-        rid = uuid.UUID(resource_id)
-        resource_obj = get_by(dataset_obj.resources, 'id', rid)
-        log.info('Checking resource %s (%s/%s)',
-                 resource_id, idx + 1, nb_resources)
-        if resource_obj.need_check():
-            check_resource(resource_obj)
-        else:
-            log.info("--> Skipping this resource, cache is fresh enough.")
-    log.info('Done.')
+    log.info('Checking %s resources...', len(resources))
+    engine = CheckEngine()
+    engine.run((r['_id'], r['resources']['_id']) for r in resources)
+    log.info('Done: %s checked, %s skipped (cache is fresh enough), %s errors',
+             engine.checked, engine.skipped, engine.errors)
@@ -0,0 +1,15 @@
+'''
+Store the precomputed quality on all datasets.
+'''
+import logging
+
+from udata.core.dataset.tasks import update_datasets_quality
+
+log = logging.getLogger(__name__)
+
+
+def migrate(db):
+    log.info('Processing Dataset collection.')
+    count = update_datasets_quality()
+    log.info(f'{count} Datasets processed.')
+    log.info('Completed.')
@@ -25,6 +25,7 @@ from .uuid_fields import AutoUUIDField
 from .owned import Owned, OwnedQuerySet
 from .queryset import UDataQuerySet
 from .document import UDataDocument, DomainModel
+from .signals import coalesce_signals, send_signal
 
 log = logging.getLogger(__name__)
 
@@ -55,6 +56,8 @@ class UDataMongoEngine(MongoEngine):
         self.OwnedQuerySet = OwnedQuerySet
         self.post_save = post_save
         self.pre_save = pre_save
+        self.coalesce_signals = coalesce_signals
+        self.send_signal = send_signal
 
     def resolve_model(self, model):
         '''
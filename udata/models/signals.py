@@ -0,0 +1,107 @@
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_local = threading.local()
+
+#: Signals names made redundant by another signal sent for the same document
+SUPERSEDED = {
+    'on_update': 'on_create',
+}
+
+#: Default maximum number of pending documents before flushing their signals
+MAX_PENDING = 1000
+
+
+class CoalescedSignals(object):
+    '''
+    Keep track of the document signals to send on `coalesce_signals` exit.
+
+    Signals are also flushed as soon as `max_pending` documents are pending
+    so long blocks (ie. a whole harvest) do not keep all their documents in memory.
+    '''
+    def __init__(self, max_pending=MAX_PENDING):
+        self.pending = OrderedDict()
+        self.max_pending = max_pending
+        self.flushing = False
+
+    def add(self, signal, document, kwargs):
+        key = (document.__class__.__name__, str(document.pk))
+        signals = self.pending.setdefault(key, OrderedDict())
+        # The last sent signal and document state win
+        signals.pop(signal.name, None)
+        signals[signal.name] = (signal, document, kwargs)
+        if len(self.pending) >= self.max_pending and not self.flushing:
+            self.flush()
+            self.flush_indexation()
+
+    def flush_indexation(self):
+        '''Trigger the deferred search indexation of the flushed documents'''
+        from udata.search import deferred_indexation
+
+        deferred = deferred_indexation()
+        if deferred is not None:
+            deferred.flush()
+
+    def flush(self):
+        # Documents saved by the receivers are added to the pending ones
+        self.flushing = True
+        try:
+            self._flush()
+        finally:
+            self.flushing = False
+
+    def _flush(self):
+        while self.pending:
+            _, signals = self.pending.popitem(last=False)
+            # Signals names are prefixed by their model (ie. `Dataset.on_update`)
+            sent = set(name.rsplit('.', 1)[-1] for name in signals)
+            for name, (signal, document, kwargs) in signals.items():
+                if SUPERSEDED.get(name.rsplit('.', 1)[-1]) in sent:
+                    continue
+                signal.send(document, **kwargs)
+
+
+def coalesced_signals():
+    '''The current `coalesce_signals` context if any'''
+    return getattr(_local, 'coalesced', None)
+
+
+def send_signal(signal, document, **kwargs):
+    '''
+    Send a document lifecycle signal (ie. `Dataset.on_update`),
+    deferred until exit if within a `coalesce_signals` block.
+    '''
+    coalesced = coalesced_signals()
+    if coalesced is None:
+        signal.send(document, **kwargs)
+    else:
+        coalesced.add(signal, document, kwargs)
+
+
+@contextmanager
+def coalesce_signals(max_pending=MAX_PENDING):
+    '''
+    Defer the lifecycle signals of the documents saved within the block
+    and send them once per document and signal on exit,
+    or as soon as `max_pending` documents are pending.
+
+    An `on_create` signal supersedes the `on_update` ones of the same document.
+    Search (re|un)indexation is deferred and deduplicated too (see `bulk_indexing`).
+    Nested blocks are merged into the outermost one.
+    '''
+    from udata.search import bulk_indexing
+
+    coalesced = coalesced_signals()
+    if coalesced is not None:
+        yield coalesced
+        return
+    coalesced = _local.coalesced = CoalescedSignals(max_pending)
+    with bulk_indexing():
+        try:
+            yield coalesced
+        finally:
+            _local.coalesced = None
+            # Documents saved by the receivers are indexed on `bulk_indexing` exit
+            coalesced.flush()
@@ -265,9 +265,14 @@ def graph_response(graph, format):
     headers = {
         'Content-Type': RDF_MIME_TYPES[fmt]
     }
+    return serialize_graph(graph, fmt), 200, headers
+
+
+def serialize_graph(graph, fmt):
+    '''Serialize a RDF graph or resource into a known format'''
     kwargs = {}
     if fmt == 'json-ld':
         kwargs['context'] = CONTEXT
     if isinstance(graph, RdfResource):
         graph = graph.graph
-    return escape_xml_illegal_chars(graph.serialize(format=fmt, **kwargs)), 200, headers
+    return escape_xml_illegal_chars(graph.serialize(format=fmt, **kwargs))
@@ -9,6 +9,8 @@ from mongoengine.signals import post_save, post_delete
 from udata.models import db
 from udata.tasks import task, as_task_param
 
+from .indexer import BulkIndexer, bulk_indexing, deferred_indexation  # noqa
+
 log = logging.getLogger(__name__)
 
 adapter_catalog = {}
@@ -60,16 +62,65 @@ def unindex(classname, id):
         log.exception('Unable to unindex %s "%s"', model.__name__, id)
 
 
+@task(route='high.search')
+def reindex_many(classname, ids):
+    '''(Re|Un)index a batch of documents in bulk'''
+    model = db.resolve_model(classname)
+    adapter_class = adapter_catalog.get(model)
+    log.info('Bulk indexing %s %s', len(ids), model.__name__)
+    with BulkIndexer() as indexer:
+        found = set()
+        for obj in model.objects(id__in=ids).no_cache():
+            found.add(str(obj.id))
+            indexer.index(obj, adapter_class)
+        # Documents deleted in the meantime
+        for id in set(ids) - found:
+            indexer.unindex(id, adapter_class)
+
+
+@task(route='high.search')
+def unindex_many(classname, ids):
+    '''Unindex a batch of documents in bulk'''
+    model = db.resolve_model(classname)
+    adapter_class = adapter_catalog.get(model)
+    log.info('Bulk unindexing %s %s', len(ids), model.__name__)
+    with BulkIndexer() as indexer:
+        for id in ids:
+            indexer.unindex(id, adapter_class)
+
+
 def reindex_model_on_save(sender, document, **kwargs):
     '''(Re/Un)Index Mongo document on post_save'''
     if current_app.config.get('AUTO_INDEX') and current_app.config['SEARCH_SERVICE_API_URL']:
-        reindex.delay(*as_task_param(document))
+        deferred = deferred_indexation()
+        if deferred is not None:
+            deferred.add(document, 'index')
+        else:
+            reindex.delay(*as_task_param(document))
 
 
 def unindex_model_on_delete(sender, document, **kwargs):
     '''Unindex Mongo document on post_delete'''
     if current_app.config.get('AUTO_INDEX') and current_app.config['SEARCH_SERVICE_API_URL']:
-        unindex.delay(*as_task_param(document))
+        deferred = deferred_indexation()
+        if deferred is not None:
+            deferred.add(document, 'unindex')
+        else:
+            unindex.delay(*as_task_param(document))
+
+
+def reindex_ids(model, ids):
+    '''(Re/Un)Index documents updated without being saved (ie. bulk updates)'''
+    ids = [str(id) for id in ids]
+    if not ids or model not in adapter_catalog:
+        return
+    if current_app.config.get('AUTO_INDEX') and current_app.config['SEARCH_SERVICE_API_URL']:
+        deferred = deferred_indexation()
+        if deferred is not None:
+            for id in ids:
+                deferred.add_id(model.__name__, id, 'index')
+        else:
+            reindex_many.delay(model.__name__, ids)
 
 
 def register(adapter):
@@ -83,7 +134,7 @@ def register(adapter):
     return adapter
 
 
-from .adapter import ModelSearchAdapter  # noqa
+from .adapter import ModelSearchAdapter, prefetch, reference_id  # noqa
 from .result import SearchResult  # noqa
 from .fields import *  # noqa
 
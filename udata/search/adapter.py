@@ -6,6 +6,29 @@ from udata.search.query import SearchQuery
 log = logging.getLogger(__name__)
 
 
+def reference_id(document, field):
+    '''Get a reference field identifier without dereferencing it'''
+    value = document._data.get(field)
+    if value is None:
+        return None
+    # Either a DBRef, a dereferenced Document or a raw identifier
+    return getattr(value, 'id', value)
+
+
+def prefetch(model, ids, *only):
+    '''
+    Fetch all the objects of a given model matching some identifiers
+    in a single query and return them indexed by their identifier.
+    '''
+    ids = set(id for id in ids if id is not None)
+    if not ids:
+        return {}
+    qs = model.objects(id__in=list(ids))
+    if only:
+        qs = qs.only(*only)
+    return dict((obj.id, obj) for obj in qs)
+
+
 class ModelSearchAdapter:
     """This class allow to describe and customize the search behavior."""
     model = None
@@ -20,6 +43,15 @@ class ModelSearchAdapter:
         """
         return document.to_dict(exclude=('_id', '_cls', 'owner'))
 
+    @classmethod
+    def serialize_many(cls, documents):
+        """Serialize a batch of documents.
+
+        Adapters should override this method to prefetch
+        the related objects once for the whole batch.
+        """
+        return [cls.serialize(document) for document in documents]
+
     @classmethod
     def is_indexable(cls, document):
         return True
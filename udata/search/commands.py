@@ -7,7 +7,8 @@ import requests
 import click
 
 from udata.commands import cli
-from udata.search import adapter_catalog
+from udata.search import adapter_catalog, BulkIndexer
+from udata.search.reindex import Reindexation
 
 
 log = logging.getLogger(__name__)
@@ -33,20 +34,49 @@ def iter_adapters():
     return sorted(adapters, key=lambda a: a.model.__name__)
 
 
+def serialize_chunk(objs, adapter):
+    '''Serialize a chunk of objects yielding a tuple (indexability, serialized documents)'''
+    try:
+        docs = adapter.serialize_many(objs)
+    except Exception:
+        # Fallback on one by one serialization to isolate the faulty document(s)
+        docs = []
+        for obj in objs:
+            try:
+                docs.append(adapter.serialize(obj))
+            except Exception as e:
+                model = adapter.model.__name__
+                log.error('Unable to index %s "%s": %s', model, str(obj.id),
+                          str(e), exc_info=True)
+                docs.append(None)
+    for obj, doc in zip(objs, docs):
+        if doc is not None:
+            yield adapter.is_indexable(obj), doc
+
+
 def iter_qs(qs, adapter):
     '''Safely iterate over a DB QuerySet yielding a tuple (indexability, serialized documents)'''
+    chunk_size = current_app.config['SEARCH_SERVICE_BULK_SIZE']
+    chunk = []
     for obj in qs.no_cache().timeout(False):
-        indexable = adapter.is_indexable(obj)
-        try:
-            doc = adapter.serialize(obj)
-            yield indexable, doc
-        except Exception as e:
-            model = adapter.model.__name__
-            log.error('Unable to index %s "%s": %s', model, str(obj.id),
-                      str(e), exc_info=True)
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            yield from serialize_chunk(chunk, adapter)
+            chunk = []
+    if chunk:
+        yield from serialize_chunk(chunk, adapter)
+
+
+def bulk_index_qs(qs, adapter, index_name, reindex=False):
+    '''Stream a DB QuerySet to the search service in bulk chunks'''
+    with BulkIndexer(index=index_name, reindex=reindex) as indexer:
+        for obj in qs.no_cache().timeout(False):
+            indexer.index(obj, adapter)
+    log.info('%s: %s indexed, %s unindexed, %s errors', adapter.model.__name__,
+             indexer.indexed, indexer.unindexed, indexer.errors)
 
 
-def index_model(adapter, start, reindex=False, from_datetime=None):
+def index_model(adapter, start, reindex=False, from_datetime=None, bulk=False):
     '''Index or unindex all objects given a model'''
     model = adapter.model
     log.info('Indexing %s objects', model.__name__)
@@ -63,6 +93,9 @@ def index_model(adapter, start, reindex=False, from_datetime=None):
         r = requests.post(url, json=payload)
         r.raise_for_status()
 
+    if bulk:
+        return bulk_index_qs(qs, adapter, index_name, reindex)
+
     docs = iter_qs(qs, adapter)
     for indexable, doc in docs:
         try:
@@ -86,36 +119,15 @@ def index_model(adapter, start, reindex=False, from_datetime=None):
                       str(e), exc_info=True)
 
 
-def finalize_reindex(models, start):
-    try:
-        url = f"{current_app.config['SEARCH_SERVICE_API_URL']}/set-index-alias"
-        payload = {
-            'index_suffix_name': default_index_suffix_name(start),
-            'indices': models
-        }
-        r = requests.post(url, json=payload)
-        r.raise_for_status()
-    except Exception:
-        log.exception(f'Unable to set alias for index')
-
-    modified_since_reindex = 0
-    for adapter in iter_adapters():
-        if not models or adapter.model.__name__.lower() in models:
-            modified_since_reindex += adapter.model.objects(last_modified__gte=start).count()
-
-    log.warning(
-        f'{modified_since_reindex} documents have been modified since reindexation start. '
-        f'After having set the appropriate alias, you can index last changes since the '
-        f'beginning of the indexation. Example, you can run:\n'
-        f'`udata search index -f {default_index_suffix_name(start)}`'
-    )
-
-
 @grp.command()
 @click.argument('models', nargs=-1, metavar='[<model> ...]')
 @click.option('-r', '--reindex', default=False, type=bool)
 @click.option('-f', '--from_datetime', type=str)
-def index(models=None, reindex=True, from_datetime=None):
+@click.option('-b', '--bulk', is_flag=True, help='Send documents to the search service in bulk')
+@click.option('-w', '--workers', type=int, help='Number of concurrent reindexation workers')
+@click.option('--resume', type=str, metavar='SUFFIX',
+              help='Resume an interrupted reindexation given its index suffix')
+def index(models=None, reindex=True, from_datetime=None, bulk=False, workers=None, resume=None):
     '''
     Initialize or rebuild the search index
 
@@ -125,6 +137,13 @@ def index(models=None, reindex=True, from_datetime=None):
     If reindex is true, indexation will be made on a new index and unindexable documents ignored.
 
     If from_datetime is specified, only models modified since this datetime will be indexed.
+
+    If bulk is set, documents are serialized by chunks and sent over pooled connections,
+    using the search service bulk endpoints if `SEARCH_SERVICE_BULK_ENDPOINTS` is enabled.
+
+    Reindexation splits models into ranges indexed in bulk by concurrent workers.
+    Its progress is checkpointed so it can be resumed if interrupted.
+    Documents modified in the meantime are caught up before switching the aliases.
     '''
     if not current_app.config['SEARCH_SERVICE_API_URL']:
         log.error('Missing URL for search service')
@@ -141,9 +160,21 @@ def index(models=None, reindex=True, from_datetime=None):
             log.error('Unknown model %s', model)
             sys.exit(-1)
 
-    for adapter in iter_adapters():
-        if not models or adapter.model.__name__.lower() in models:
-            index_model(adapter, start, reindex, from_datetime)
+    adapters = [adapter for adapter in iter_adapters()
+                if not models or adapter.model.__name__.lower() in models]
+
+    if reindex or resume:
+        suffix = resume or default_index_suffix_name(start)
+        if resume:
+            # The suffix is the truncated start date
+            start = datetime.strptime(resume, TIMESTAMP_FORMAT)
+        reindexation = Reindexation(adapters, suffix, workers=workers)
+        if not reindexation.run():
+            log.error('Reindexation is incomplete, you can resume it with:\n'
+                      '`udata search index --resume %s`', suffix)
+            sys.exit(-1)
+        reindexation.finalize(start, models)
+        return
 
-    if reindex:
-        finalize_reindex(models, start)
+    for adapter in adapters:
+        index_model(adapter, start, reindex, from_datetime, bulk)
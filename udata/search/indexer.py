@@ -0,0 +1,232 @@
+import logging
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+
+log = logging.getLogger(__name__)
+
+_session = None
+_local = threading.local()
+
+
+def get_session():
+    '''
+    A process-wide pooled HTTP session for the search service.
+
+    Connections are kept alive and reused between calls
+    instead of being opened for each (un)indexed document.
+    '''
+    global _session
+    if _session is None:
+        pool_size = current_app.config['SEARCH_SERVICE_POOL_SIZE']
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
+
+class BulkIndexer(object):
+    '''
+    Collect (re)index and unindex operations per search adapter
+    and send them to the search service as bulk payloads.
+
+    Operations are debounced by document id: saving the same document
+    several times before a flush only sends its last state.
+
+    Unless the search service exposes the bulk endpoints
+    (see `SEARCH_SERVICE_BULK_ENDPOINTS`), each flushed document is sent
+    through the per-document `index` and `unindex` endpoints.
+
+    :param str index: an optional target index name
+    :param bool reindex: if ``True``, non-indexable documents are ignored
+                         instead of being unindexed (ie. fresh index).
+    :param int batch_size: the maximum number of documents per bulk request.
+    :param bool bulk: whether to use the bulk endpoints,
+                      defaults to `SEARCH_SERVICE_BULK_ENDPOINTS`.
+    '''
+    def __init__(self, index=None, reindex=False, batch_size=None, session=None, bulk=None):
+        config = current_app.config
+        self.index_name = index
+        self.reindex = reindex
+        self.batch_size = batch_size or config['SEARCH_SERVICE_BULK_SIZE']
+        self.bulk = config['SEARCH_SERVICE_BULK_ENDPOINTS'] if bulk is None else bulk
+        self.session = session or get_session()
+        self.pending = OrderedDict()
+        self.indexed = 0
+        self.unindexed = 0
+        self.errors = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def _queue(self, adapter, id, obj):
+        ops = self.pending.setdefault(adapter, OrderedDict())
+        # Debounce: the last operation on a given id wins
+        ops.pop(id, None)
+        ops[id] = obj
+        if len(ops) >= self.batch_size:
+            self.flush_adapter(adapter)
+
+    def index(self, obj, adapter):
+        '''Queue a document for (re|un)indexation depending on its indexability'''
+        self._queue(adapter, str(obj.id), obj)
+
+    def unindex(self, id, adapter):
+        '''Queue a document identifier for unindexation'''
+        self._queue(adapter, str(id), None)
+
+    def url(self, adapter, action):
+        return f"{current_app.config['SEARCH_SERVICE_API_URL']}{adapter.search_url}{action}"
+
+    def flush_adapter(self, adapter):
+        ops = self.pending.pop(adapter, None)
+        if not ops:
+            return
+        to_index, ids = [], []
+        for id, obj in ops.items():
+            if obj is None:
+                ids.append(id)
+            elif adapter.is_indexable(obj):
+                to_index.append(obj)
+            elif not self.reindex:
+                ids.append(id)
+        documents = self.serialize(adapter, to_index)
+        if not self.bulk:
+            for document in documents:
+                self.send_one(adapter, document)
+            for id in ids:
+                self.delete_one(adapter, id)
+            return
+        if documents:
+            self.send(adapter, 'bulk-index', documents=documents)
+            self.indexed += len(documents)
+        if ids:
+            self.send(adapter, 'bulk-unindex', ids=ids)
+            self.unindexed += len(ids)
+
+    def serialize(self, adapter, objs):
+        '''Serialize a chunk at once, falling back on one by one serialization on error'''
+        try:
+            return adapter.serialize_many(objs)
+        except Exception:
+            documents = []
+            for obj in objs:
+                try:
+                    documents.append(adapter.serialize(obj))
+                except Exception:
+                    self.errors += 1
+                    log.exception('Unable to serialize %s "%s"', adapter.model.__name__, obj.id)
+            return documents
+
+    def send(self, adapter, action, **payload):
+        count = len(payload.get('documents') or payload.get('ids'))
+        if self.index_name:
+            payload['index'] = self.index_name
+        timeout = current_app.config['SEARCH_SERVICE_REQUEST_TIMEOUT']
+        try:
+            r = self.session.post(self.url(adapter, action), json=payload, timeout=timeout)
+            r.raise_for_status()
+        except Exception:
+            self.errors += 1
+            log.exception('Unable to %s %s %s documents', action, count,
+                          adapter.model.__name__)
+
+    def send_one(self, adapter, document):
+        '''Index a single document through the per-document endpoint'''
+        payload = {'document': document}
+        if self.index_name:
+            payload['index'] = self.index_name
+        timeout = current_app.config['SEARCH_SERVICE_REQUEST_TIMEOUT']
+        try:
+            r = self.session.post(self.url(adapter, 'index'), json=payload, timeout=timeout)
+            r.raise_for_status()
+            self.indexed += 1
+        except Exception:
+            self.errors += 1
+            log.exception('Unable to index %s "%s"', adapter.model.__name__, document['id'])
+
+    def delete_one(self, adapter, id):
+        '''Unindex a single document through the per-document endpoint'''
+        timeout = current_app.config['SEARCH_SERVICE_REQUEST_TIMEOUT']
+        try:
+            r = self.session.delete(self.url(adapter, f'{id}/unindex'), timeout=timeout)
+            # Unindexed already, we don't want to raise
+            if r.status_code != 404:
+                r.raise_for_status()
+            self.unindexed += 1
+        except Exception:
+            self.errors += 1
+            log.exception('Unable to unindex %s "%s"', adapter.model.__name__, id)
+
+    def flush(self):
+        '''Send all pending operations'''
+        for adapter in list(self.pending):
+            self.flush_adapter(adapter)
+
+
+class DeferredIndexation(object):
+    '''Keep track of the documents to (re|un)index on `bulk_indexing` exit'''
+    def __init__(self):
+        self.pending = OrderedDict()
+
+    def add(self, document, action):
+        self.add_id(document.__class__.__name__, document.pk, action)
+
+    def add_id(self, classname, id, action):
+        ops = self.pending.setdefault(classname, OrderedDict())
+        id = str(id)
+        ops.pop(id, None)
+        ops[id] = action
+
+    def ids(self, classname, action):
+        return [id for id, a in self.pending[classname].items() if a == action]
+
+    def flush(self):
+        '''Trigger the pending (re|un)indexations in bulk'''
+        from udata.search import reindex_many, unindex_many
+
+        for classname in self.pending:
+            to_index = self.ids(classname, 'index')
+            to_unindex = self.ids(classname, 'unindex')
+            if to_index:
+                reindex_many.delay(classname, to_index)
+            if to_unindex:
+                unindex_many.delay(classname, to_unindex)
+        self.pending.clear()
+
+
+def deferred_indexation():
+    '''The current `bulk_indexing` context if any'''
+    return getattr(_local, 'deferred', None)
+
+
+@contextmanager
+def bulk_indexing():
+    '''
+    Defer the search (re|un)indexation of documents saved or deleted
+    within the block and trigger it in bulk on exit.
+
+    Nested blocks are merged into the outermost one.
+    '''
+    deferred = deferred_indexation()
+    if deferred is not None:
+        yield deferred
+        return
+    deferred = _local.deferred = DeferredIndexation()
+    try:
+        yield deferred
+    finally:
+        _local.deferred = None
+        deferred.flush()
@@ -0,0 +1,176 @@
+'''
+Parallel and resumable full reindexation.
+
+Each model is split into `_id` ranges indexed into a new index
+by a pool of workers, through the bulk endpoints if the search service exposes them
+(see `SEARCH_SERVICE_BULK_ENDPOINTS`) or document by document otherwise.
+The ranges progress is checkpointed in the `search_reindex` collection
+so an interrupted reindexation can be resumed.
+'''
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from mongoengine.connection import get_db
+
+from .indexer import BulkIndexer, get_session
+
+log = logging.getLogger(__name__)
+
+
+def checkpoints():
+    '''The reindexation ranges progress collection'''
+    return get_db().search_reindex
+
+
+def modified_field(model):
+    '''The field holding a model documents last modification date'''
+    if 'last_modified_internal' in model._fields:
+        return 'last_modified_internal'
+    return 'last_modified'
+
+
+def split_ranges(model, size):
+    '''
+    Split a model documents into `(lower, upper)` `_id` ranges
+    of at most `size` documents, the last one being unbounded.
+    '''
+    bounds = []
+    cursor = model._get_collection().find({}, {'_id': 1}).sort('_id', 1)
+    for idx, doc in enumerate(cursor):
+        if idx % size == 0:
+            bounds.append(doc['_id'])
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+class Reindexation(object):
+    '''
+    Reindex some search adapters models into new indices.
+
+    :param list adapters: the search adapters to reindex
+    :param str suffix: the new indices suffix, also identifying the reindexation
+                       checkpoints to resume it
+    :param int workers: the number of ranges indexed concurrently
+    :param int range_size: the maximum number of documents per range
+    '''
+    def __init__(self, adapters, suffix, workers=None, range_size=None, session=None):
+        config = current_app.config
+        self.adapters = adapters
+        self.suffix = suffix
+        self.workers = workers or config['SEARCH_REINDEX_WORKERS']
+        self.range_size = range_size or config['SEARCH_REINDEX_RANGE_SIZE']
+        self.session = session or get_session()
+        self.app = current_app._get_current_object()
+
+    def index_name(self, adapter):
+        return '-'.join((adapter.model.__name__.lower(), self.suffix))
+
+    def post(self, action, payload):
+        url = f"{current_app.config['SEARCH_SERVICE_API_URL']}/{action}"
+        timeout = current_app.config['SEARCH_SERVICE_REQUEST_TIMEOUT']
+        r = self.session.post(url, json=payload, timeout=timeout)
+        r.raise_for_status()
+
+    def prepare(self, adapter):
+        '''Create the adapter index and checkpoint its ranges unless resuming'''
+        model = adapter.model.__name__
+        if checkpoints().count_documents({'reindex': self.suffix, 'model': model}):
+            log.info('Resuming %s reindexation', model)
+            return
+        self.post('create-index', {'index': self.index_name(adapter)})
+        # An empty collection still gets an unbounded range to be resumable
+        ranges = split_ranges(adapter.model, self.range_size) or [(None, None)]
+        checkpoints().insert_many([{
+            'reindex': self.suffix,
+            'model': model,
+            'lower': lower,
+            'upper': upper,
+            'done': False,
+        } for lower, upper in ranges])
+
+    def index_range(self, adapter, checkpoint):
+        '''Index a range and mark it as done if no error occured'''
+        with self.app.app_context():
+            qs = adapter.model.objects
+            if checkpoint['lower'] is not None:
+                qs = qs.filter(id__gte=checkpoint['lower'])
+            if checkpoint['upper'] is not None:
+                qs = qs.filter(id__lt=checkpoint['upper'])
+            indexer = BulkIndexer(index=self.index_name(adapter), reindex=True,
+                                  session=self.session)
+            with indexer:
+                for obj in qs.no_cache().timeout(False):
+                    indexer.index(obj, adapter)
+            if indexer.errors:
+                log.error('%s range starting at %s: %s errors, it will be retried on resume',
+                          adapter.model.__name__, checkpoint['lower'], indexer.errors)
+                return indexer
+            checkpoints().update_one({'_id': checkpoint['_id']}, {'$set': {
+                'done': True,
+                'indexed': indexer.indexed,
+                'date': datetime.utcnow(),
+            }})
+            return indexer
+
+    @property
+    def pending_query(self):
+        return {
+            'reindex': self.suffix,
+            'model': {'$in': [adapter.model.__name__ for adapter in self.adapters]},
+            'done': False,
+        }
+
+    def run(self):
+        '''
+        Index all the pending ranges.
+
+        Returns whether all ranges are done.
+        '''
+        for adapter in self.adapters:
+            self.prepare(adapter)
+        adapters = {adapter.model.__name__: adapter for adapter in self.adapters}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                (checkpoint, executor.submit(self.index_range,
+                                             adapters[checkpoint['model']], checkpoint))
+                for checkpoint in checkpoints().find(self.pending_query)
+            ]
+            for checkpoint, future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    log.exception('Unable to index %s range starting at %s',
+                                  checkpoint['model'], checkpoint['lower'])
+        return not checkpoints().count_documents(self.pending_query)
+
+    def catch_up(self, since):
+        '''(Re|Un)index the documents modified since a given date into the new indices'''
+        count = 0
+        for adapter in self.adapters:
+            qs = adapter.model.objects(**{f'{modified_field(adapter.model)}__gte': since})
+            with BulkIndexer(index=self.index_name(adapter), session=self.session) as indexer:
+                for obj in qs.no_cache().timeout(False):
+                    indexer.index(obj, adapter)
+            count += indexer.indexed + indexer.unindexed
+        return count
+
+    def finalize(self, start, models=None):
+        '''
+        Catch up the documents modified since the reindexation `start`,
+        switch the aliases to the new indices and clear the checkpoints.
+
+        Documents modified while catching up are caught up again
+        once the aliases are switched.
+        '''
+        catch_up_start = datetime.utcnow()
+        count = self.catch_up(start)
+        log.info('Caught up %s documents modified since %s', count, start)
+        self.post('set-index-alias', {
+            'index_suffix_name': self.suffix,
+            'indices': models or [],
+        })
+        count = self.catch_up(catch_up_start)
+        log.info('Caught up %s documents modified while switching aliases', count)
+        checkpoints().delete_many({'reindex': self.suffix})
@@ -31,6 +31,11 @@ class Defaults(object):
     # Search service configuration
     SEARCH_SERVICE_API_URL = None
     SEARCH_SERVICE_REQUEST_TIMEOUT = 20
+    SEARCH_SERVICE_BULK_SIZE = 100  # Max documents per bulk (un)indexation request
+    SEARCH_SERVICE_BULK_ENDPOINTS = False  # Whether the search service exposes bulk endpoints
+    SEARCH_SERVICE_POOL_SIZE = 10  # Max kept-alive connections to the search service
+    SEARCH_REINDEX_WORKERS = 4  # Concurrent ranges indexed on full reindexation
+    SEARCH_REINDEX_RANGE_SIZE = 10000  # Max documents per reindexation checkpointed range
 
     # BROKER_TRANSPORT = 'redis'
     CELERY_BROKER_URL = 'redis://localhost:6379'
@@ -214,6 +219,10 @@ class Defaults(object):
 
     MD_ALLOWED_PROTOCOLS = ['http', 'https', 'ftp', 'ftps']
 
+    # Rendered markdown cache
+    MD_CACHE_SIZE = 1000  # Rendered contents kept in memory by each process
+    MD_CACHE_TIMEOUT = 3600  # Flask cache timeout in seconds, 0 to disable
+
     # Tags constraints
     TAG_MIN_LENGTH = 3
     TAG_MAX_LENGTH = 96
@@ -250,6 +259,20 @@ class Defaults(object):
 
     HARVEST_VALIDATION_CONTACT_FORM = None
 
+    # Skip rebuilding and saving datasets whose remote content did not change
+    HARVEST_SKIP_UNCHANGED = True
+
+    # Harvest items states are written by batches of this size...
+    HARVEST_ITEMS_FLUSH_SIZE = 1
+    # ... or at least every given number of seconds
+    HARVEST_ITEMS_FLUSH_DELAY = 5
+
+    # The number of parsed DCAT page graphs kept in memory by each harvest worker
+    HARVEST_GRAPHS_CACHE_SIZE = 10
+
+    # Spool DCAT pages to the `harvest` storage instead of storing them in the job
+    HARVEST_SPOOL_PAGES = False
+
     ACTIVATE_TERRITORIES = False
     # The order is important to compute parents/children, smaller first.
     HANDLED_LEVELS = tuple()
@@ -263,6 +286,11 @@ class Defaults(object):
     LINKCHECKING_MAX_CACHE_DURATION = 1080  # in minutes (1 week)
     LINKCHECKING_UNAVAILABLE_THRESHOLD = 100
     LINKCHECKING_DEFAULT_LINKCHECKER = 'no_check'
+    LINKCHECKING_WORKERS = 10  # Concurrent checks
+    LINKCHECKING_MAX_PER_HOST = 2  # Concurrent checks on a given host
+    LINKCHECKING_HOST_DELAY = 0  # Minimum delay in seconds between two checks on a given host
+    LINKCHECKING_BATCH_SIZE = 100  # Datasets loaded and saved per batch
+    LINKCHECKING_TIMEOUT = 10  # in seconds, for the builtin `http` linkchecker
 
     # Ignore some endpoint from API tracking
     # By default ignore the 3 most called APIs
@@ -397,6 +425,11 @@ class Defaults(object):
     EXPORT_CSV_MODELS = ('dataset', 'resource', 'discussion', 'organization',
                          'reuse', 'tag', 'harvest')
     EXPORT_CSV_DATASET_ID = None
+    EXPORT_CSV_CHUNK_SIZE = 1000  # Objects rendered per chunk
+    EXPORT_CSV_WORKERS = 4  # Chunks rendered concurrently
+    EXPORT_CSV_GZIP = False  # Also export a gzipped CSV
+    CSV_STREAM_BLOCK_SIZE = 64 * 1024  # Min characters per streamed CSV response chunk
+    CSV_STREAM_GZIP = False  # Gzip streamed CSV responses when accepted by the client
 
     # Autocomplete parameters
     #########################
@@ -414,6 +447,23 @@ class Defaults(object):
 
     API_DOC_EXTERNAL_LINK = 'https://guides.data.gouv.fr/publier-des-donnees/guide-data.gouv.fr/api/reference'
 
+    # Authenticated API principals cache
+    API_AUTH_CACHE_TIMEOUT = 60  # in seconds, 0 to disable
+    API_AUTH_CACHE_SIZE = 10000
+
+    # Cached DCAT datasets fragments timeout in seconds, 0 to disable
+    SITE_CATALOG_CACHE_TIMEOUT = 3600
+    # Formats of the full DCAT catalog dumps (see `dump-site-catalog` job)
+    SITE_CATALOG_DUMP_FORMATS = ['xml', 'turtle', 'json-ld']
+    SITE_CATALOG_DUMP_PAGE_SIZE = 1000  # Datasets serialized at once in catalog dumps
+
+    # In-memory tags, zones and organizations suggest indexes max age
+    SUGGEST_INDEX_TTL = 300  # in seconds
+    # Minimum age before rebuilding an index after a change of its model
+    SUGGEST_INDEX_REBUILD_DELAY = 30  # in seconds
+    # Rebuild expired indexes in a background thread while serving the previous ones
+    SUGGEST_INDEX_BACKGROUND = True
+
     # Read Only Mode
     ####################
     # This mode can be used to mitigate a spam attack for example.
@@ -466,6 +516,9 @@ class Testing(object):
     FS_IMAGES_OPTIMIZE = True
     SECURITY_EMAIL_VALIDATOR_ARGS = {"check_deliverability": False}  # Disables deliverability for email domain name
     PUBLISH_ON_RESOURCE_EVENTS = False
+    API_AUTH_CACHE_TIMEOUT = 0
+    SUGGEST_INDEX_REBUILD_DELAY = 0
+    SUGGEST_INDEX_BACKGROUND = False
 
 
 class Debug(Defaults):
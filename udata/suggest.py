@@ -0,0 +1,150 @@
+'''
+In-memory substring suggestion indexes.
+
+Each index is loaded from the database into a trigram index
+and ranked once, then rebuilt when it expires (`SUGGEST_INDEX_TTL`)
+or after a change of its model in the current process, at most once
+every `SUGGEST_INDEX_REBUILD_DELAY` seconds.
+Only the first build blocks a request: rebuilds happen in a background thread
+(unless `SUGGEST_INDEX_BACKGROUND` is disabled) while the previous entries are served.
+'''
+import logging
+import threading
+import time
+
+from flask import current_app, has_app_context
+from mongoengine.signals import post_save, post_delete
+
+log = logging.getLogger(__name__)
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class Entries(object):
+    '''A built index state: ranked entries and their trigrams postings'''
+    def __init__(self, items):
+        # Best ranked first: postings are built in rank order
+        items = sorted(items, key=lambda item: item[0], reverse=True)
+        self.texts = [[t.lower() for t in texts if t] for _, texts, _ in items]
+        self.payloads = [payload for _, _, payload in items]
+        self.postings = {}
+        for idx, texts in enumerate(self.texts):
+            for gram in set().union(*(trigrams(t) for t in texts)):
+                self.postings.setdefault(gram, []).append(idx)
+        self.sets = {gram: set(idxs) for gram, idxs in self.postings.items()}
+
+    def candidates(self, q):
+        if len(q) < 3:
+            return range(len(self.texts))
+        grams = trigrams(q)
+        if any(gram not in self.postings for gram in grams):
+            return []
+        grams = sorted(grams, key=lambda gram: len(self.postings[gram]))
+        others = [self.sets[gram] for gram in grams[1:]]
+        return (idx for idx in self.postings[grams[0]]
+                if all(idx in s for s in others))
+
+    def search(self, q, size):
+        q = q.lower()
+        results = []
+        for idx in self.candidates(q):
+            if any(q in text for text in self.texts[idx]):
+                results.append(self.payloads[idx])
+                if len(results) >= size:
+                    break
+        return results
+
+
+class SuggestIndex(object):
+    '''
+    A case-insensitive substring suggestion index.
+
+    :param str name: a unique index name
+    :param callable load: a callable yielding `(score, texts, payload)` tuples,
+                          matching payloads being returned by decreasing score
+    :param model: an optional model class whose changes invalidate the index
+    '''
+    def __init__(self, name, load, model=None):
+        self.name = name
+        self.load = load
+        self.lock = threading.Lock()
+        self.building = None  # The background rebuild thread if any
+        if model is not None:
+            post_save.connect(self.invalidate, sender=model, weak=False)
+            post_delete.connect(self.invalidate, sender=model, weak=False)
+
+    @property
+    def states(self):
+        # One state per application
+        return current_app.extensions.setdefault('suggest', {})
+
+    @property
+    def invalidations(self):
+        return current_app.extensions.setdefault('suggest-invalidations', {})
+
+    def invalidate(self, *args, **kwargs):
+        '''Mark the index as to be rebuilt'''
+        if has_app_context():
+            self.invalidations[self.name] = time.monotonic()
+
+    def build(self):
+        '''Load and rank the index entries'''
+        start = time.monotonic()
+        entries = Entries(self.load())
+        entries.loaded_at = start
+        self.states[self.name] = entries
+        log.debug('Built %s suggest index in %.3fs', self.name, time.monotonic() - start)
+        return entries
+
+    def needs_rebuild(self, entries):
+        config = current_app.config
+        age = time.monotonic() - entries.loaded_at
+        if age > config['SUGGEST_INDEX_TTL']:
+            return True
+        invalidated_at = self.invalidations.get(self.name)
+        if invalidated_at is None or invalidated_at < entries.loaded_at:
+            return False
+        return age >= config['SUGGEST_INDEX_REBUILD_DELAY']
+
+    def rebuild_in_background(self):
+        app = current_app._get_current_object()
+
+        def rebuild():
+            try:
+                with app.app_context():
+                    self.build()
+            except Exception:
+                log.exception('Unable to rebuild %s suggest index', self.name)
+            finally:
+                with self.lock:
+                    self.building = None
+
+        self.building = threading.Thread(target=rebuild, name=f'suggest-{self.name}',
+                                         daemon=True)
+        self.building.start()
+
+    def entries(self):
+        entries = self.states.get(self.name)
+        if entries is None:
+            # Nothing to serve yet: build it in the request
+            with self.lock:
+                entries = self.states.get(self.name)
+                if entries is None:
+                    entries = self.build()
+            return entries
+        if self.building is None and self.needs_rebuild(entries):
+            with self.lock:
+                if self.building is None and self.needs_rebuild(self.states[self.name]):
+                    if current_app.config['SUGGEST_INDEX_BACKGROUND']:
+                        self.rebuild_in_background()
+                    else:
+                        entries = self.build()
+        return entries
+
+    def search(self, q, size):
+        '''Get the `size` best ranked payloads whose texts contain `q`'''
+        if not q or size <= 0:
+            return []
+        return self.entries().search(q, size)
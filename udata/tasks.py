@@ -168,6 +168,7 @@ def init_app(app):
     import udata.core.discussions.tasks  # noqa
     import udata.core.badges.tasks  # noqa
     import udata.core.storages.tasks  # noqa
+    import udata.core.site.tasks  # noqa
     import udata.harvest.tasks  # noqa
 
     entrypoints.get_enabled('udata.tasks', app)
@@ -1,4 +1,5 @@
 import pytest
+import time
 
 from base64 import b64encode
 from urllib.parse import parse_qs
@@ -11,9 +12,11 @@ from authlib.oauth2.rfc7636 import (
 )
 
 from udata.api import api, API
+from udata.api import auth_cache
 from udata.api.oauth2 import OAuth2Client, OAuth2Token
 from udata.auth import PermissionDenied
 from udata.core.user.factories import UserFactory
+from udata.core.user.models import User
 from udata.forms import Form, fields, validators
 from udata.tests.helpers import (
     assert200, assert400, assert401, assert403, assert_status
@@ -60,6 +63,88 @@ def oauth(app, request):
     )
 
 
+@pytest.mark.usefixtures('clean_db')
+@pytest.mark.options(API_AUTH_CACHE_TIMEOUT=60)
+class AuthCacheTest:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self, app):
+        auth_cache.cache.clear()
+
+    def test_apikey_is_cached_until_user_is_saved(self):
+        user = UserFactory()
+        user.generate_api_key()
+        user.save()
+
+        assert auth_cache.user_for_apikey(user.apikey) == user
+        cached = auth_cache.user_for_apikey(user.apikey)
+        assert cached == user
+        assert cached is not user
+        assert auth_cache.cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+        apikey = user.apikey
+        user.generate_api_key()
+        user.save()
+        assert auth_cache.cache.stats()['size'] == 0
+        assert auth_cache.user_for_apikey(apikey) is None
+        assert auth_cache.user_for_apikey(user.apikey) == user
+
+    def test_apikey_is_invalidated_on_user_deletion(self):
+        user = UserFactory()
+        user.generate_api_key()
+        user.save()
+        auth_cache.user_for_apikey(user.apikey)
+
+        user.delete()
+
+        assert auth_cache.user_for_apikey(user.apikey) is None
+
+    def test_token_is_cached_until_saved(self, oauth):
+        user = UserFactory()
+        token = OAuth2Token.objects.create(
+            client=oauth,
+            user=user,
+            access_token='access-token',
+            refresh_token='refresh-token',
+        )
+
+        assert auth_cache.token_for_access_token('access-token') == token
+        cached = auth_cache.token_for_access_token('access-token')
+        assert cached == token
+        assert cached.user == user
+        assert auth_cache.cache.hits == 1
+
+        token.revoked = True
+        token.save()
+        assert auth_cache.token_for_access_token('access-token').revoked
+
+    def test_invalidation_from_another_process(self, mocker):
+        user = UserFactory()
+        user.generate_api_key()
+        user.save()
+        stamps = {}
+        mocker.patch.object(auth_cache.shared_cache, 'get_many',
+                            side_effect=lambda *keys: [stamps.get(k) for k in keys])
+        auth_cache.user_for_apikey(user.apikey)
+
+        # Another process clears the API key and stamps the invalidation
+        User.objects(id=user.id).update_one(unset__apikey=True)
+        stamps[auth_cache.cache.stamp_key(user_id=user.id)] = time.time()
+
+        assert auth_cache.user_for_apikey(user.apikey) is None
+        assert auth_cache.cache.hits == 0
+
+    def test_disabled(self, app):
+        app.config['API_AUTH_CACHE_TIMEOUT'] = 0
+        user = UserFactory()
+        user.generate_api_key()
+        user.save()
+
+        auth_cache.user_for_apikey(user.apikey)
+        auth_cache.user_for_apikey(user.apikey)
+
+        assert auth_cache.cache.stats() == {'hits': 0, 'misses': 0, 'size': 0}
+
+
 @pytest.mark.usefixtures('clean_db')
 class APIAuthTest:
     modules = []
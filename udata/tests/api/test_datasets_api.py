@@ -119,6 +119,28 @@ class DatasetAPITest(APITestCase):
         self.assert200(response)
         self.assertEqual(response.json['data'][0]['id'], str(first.id))
 
+    def test_dataset_api_sorting_and_filtering_quality(self):
+        '''Should sort and filter datasets on their stored quality score'''
+        self.login()
+        low = VisibleDatasetFactory(description='')
+        high = VisibleDatasetFactory(description='', license=LicenseFactory(),
+                                     frequency='continuous')
+
+        response = self.get(url_for('api.datasets', sort='-quality'))
+        self.assert200(response)
+        self.assertEqual([d['id'] for d in response.json['data']],
+                         [str(high.id), str(low.id)])
+        self.assertEqual(response.json['data'][0]['quality'], high.quality)
+
+        response = self.get(url_for('api.datasets', sort='quality'))
+        self.assert200(response)
+        self.assertEqual(response.json['data'][0]['id'], str(low.id))
+
+        response = self.get(url_for('api.datasets', quality=high.quality['score']))
+        self.assert200(response)
+        self.assertEqual(len(response.json['data']), 1)
+        self.assertEqual(response.json['data'][0]['id'], str(high.id))
+
     def test_dataset_api_default_sorting(self):
         # Default sort should be -created
         self.login()
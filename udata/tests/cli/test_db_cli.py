@@ -1,7 +1,15 @@
+import json
+
 from datetime import datetime
 
 import pytest
 
+from udata.core.dataset.factories import DatasetFactory
+from udata.core.discussions.factories import DiscussionFactory
+from udata.core.organization.factories import OrganizationFactory
+from udata.core.reuse.factories import ReuseFactory
+from udata.models import Organization, Dataset
+
 
 @pytest.fixture
 def migrations(db):
@@ -55,3 +63,31 @@ def test_unrecord_with_too_many_parameters(cli, migrations):
     result = cli('db unrecord udata test.py too many', check=False)
     assert result.exit_code != 0
     assert migrations.count_documents({}) == 1
+
+
+@pytest.mark.usefixtures('clean_db')
+def test_check_integrity_report(cli, tmp_path):
+    '''Should report dangling references ids and their documents'''
+    org = OrganizationFactory()
+    DatasetFactory.create_batch(2, organization=org)
+    DatasetFactory(organization=OrganizationFactory())
+    deleted = DatasetFactory()
+    ReuseFactory(datasets=[deleted, DatasetFactory()])
+    DiscussionFactory(subject=deleted)
+    Organization._get_collection().delete_one({'_id': org.id})
+    Dataset._get_collection().delete_one({'_id': deleted.id})
+
+    report = tmp_path / 'report.json'
+    result = cli('db', 'check-integrity', '--models', 'Dataset', '--models', 'Reuse',
+                 '--models', 'Discussion', '-w', '2', '-b', '1', '-r', str(report))
+    assert 'Total errors: 3' in result.output
+
+    data = json.loads(report.read_text())
+    by_reference = {r['reference']: r for r in data['references']}
+    assert data['total'] == 3
+    assert by_reference['Dataset.organization']['dangling'] == [str(org.id)]
+    assert by_reference['Dataset.organization']['checked'] == 2
+    assert by_reference['Dataset.organization']['documents'] == 2
+    assert by_reference['Reuse.datasets']['dangling'] == [str(deleted.id)]
+    assert by_reference['Reuse.datasets']['documents'] == 1
+    assert by_reference['Discussion.subject']['dangling'] == [str(deleted.id)]
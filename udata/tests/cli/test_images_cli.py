@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from udata.commands.images import render_executor, render_model, is_rendered
+from udata.core.organization.factories import OrganizationFactory
+from udata.core.organization.models import Organization, LOGO_SIZES
+from udata.core.user.factories import UserFactory
+from udata.models import User
+from udata.tests.helpers import create_test_image
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def org_with_logo():
+    org = OrganizationFactory()
+    org.logo.save(create_test_image(), filename='logo.png')
+    org.save()
+    return org
+
+
+@pytest.mark.usefixtures('clean_db', 'instance_path')
+class RenderImagesTest:
+    def test_is_rendered(self):
+        field = Organization._fields['logo']
+        thumbnails = {str(size): f'logo-{size}.png' for size in LOGO_SIZES}
+        assert is_rendered(field, {'filename': 'logo.png', 'thumbnails': thumbnails})
+        del thumbnails[str(LOGO_SIZES[0])]
+        assert not is_rendered(field, {'filename': 'logo.png', 'thumbnails': thumbnails})
+        assert not is_rendered(field, {'filename': 'logo.png'})
+
+    def test_render_missing_thumbnails(self, executor, mocker):
+        up_to_date = org_with_logo()
+        outdated = org_with_logo()
+        Organization._get_collection().update_one({'_id': outdated.id},
+                                                  {'$unset': {'logo.thumbnails': ''}})
+        OrganizationFactory()  # without logo
+        save = mocker.spy(Organization, 'save')
+
+        rendered, skipped, errors = render_model(executor, Organization, 'logo')
+
+        assert (rendered, skipped, errors) == (1, 1, 0)
+        assert not save.called
+        outdated.reload()
+        assert set(outdated.logo.thumbnails) == set(str(size) for size in LOGO_SIZES)
+        assert up_to_date.reload().logo.thumbnails
+
+    def test_render_in_forked_processes(self, app):
+        outdated = org_with_logo()
+        Organization._get_collection().update_one({'_id': outdated.id},
+                                                  {'$unset': {'logo.thumbnails': ''}})
+
+        with render_executor(app, workers=2) as executor:
+            rendered, skipped, errors = render_model(executor, Organization, 'logo')
+
+        assert (rendered, skipped, errors) == (1, 0, 0)
+        outdated.reload()
+        assert set(outdated.logo.thumbnails) == set(str(size) for size in LOGO_SIZES)
+
+    def test_force(self, executor):
+        org_with_logo()
+
+        assert render_model(executor, Organization, 'logo', force=True) == (1, 0, 0)
+
+    def test_errors_are_skipped(self, executor):
+        user = UserFactory()
+        User._get_collection().update_one({'_id': user.id},
+                                          {'$set': {'avatar': {'filename': 'missing.png'}}})
+
+        assert render_model(executor, User, 'avatar') == (0, 0, 1)
+        assert user.reload().avatar.filename == 'missing.png'
@@ -3,8 +3,10 @@ from datetime import datetime, timedelta
 import pytest
 
 from udata.core.dataset.csv import ResourcesCsvAdapter, DatasetCsvAdapter
-from udata.core.dataset.factories import DatasetFactory, ResourceFactory
+from udata.core.dataset.factories import DatasetFactory, ResourceFactory, LicenseFactory
 from udata.core.dataset.models import Dataset
+from udata.core.organization.factories import OrganizationFactory
+from udata.core.spatial.factories import SpatialCoverageFactory
 
 
 @pytest.mark.frontend
@@ -62,3 +64,24 @@ class DatasetCSVAdapterTest:
         assert 'dummy_backend' in d_row
         # harvest.domain
         assert 'example.com' in d_row
+
+    @pytest.mark.parametrize('Adapter', [DatasetCsvAdapter, ResourcesCsvAdapter])
+    def test_projection_rows(self, Adapter):
+        DatasetFactory(
+            organization=OrganizationFactory(),
+            license=LicenseFactory(),
+            spatial=SpatialCoverageFactory(),
+            tags=['foo', 'bar'],
+            frequency='weekly',
+            metrics={'views': 42, 'reuses': 2},
+            resources=ResourceFactory.build_batch(2),
+            harvest={'domain': 'example.com', 'created_at': datetime(2022, 12, 31)},
+        )
+        DatasetFactory(archived=datetime.utcnow(), private=True)
+        adapter = Adapter(Dataset.objects.order_by('id'))
+
+        assert 'extras' not in adapter.projection()
+        # Same rows as full documents
+        full = Adapter(list(Dataset.objects.order_by('id')))
+        assert full.projection() is None
+        assert list(adapter.rows()) == list(full.rows())
@@ -250,6 +250,42 @@ class DatasetModelTest:
             'update_fulfilled_in_time'
         ]
 
+    def test_quality_stored(self):
+        dataset = DatasetFactory(description='')
+        assert Dataset.objects.get(id=dataset.id).quality == dataset.quality
+        assert Dataset.objects(quality__score=0).count() == 1
+
+        dataset.license = LicenseFactory()
+        dataset.save()
+        assert Dataset.objects.get(id=dataset.id).quality['score'] == Dataset.normalize_score(1)
+
+    def test_quality_not_computed_before_save(self):
+        assert Dataset(title='test').quality == {}
+
+    def test_quality_updated_with_resources_extras(self):
+        dataset = DatasetFactory(description='', resources=[ResourceFactory()])
+        assert dataset.quality['all_resources_available']
+
+        dataset.resources[0].update_extras({'check:available': False})
+
+        assert dataset.quality['all_resources_available'] is False
+        stored = Dataset.objects.get(id=dataset.id).quality
+        assert stored['all_resources_available'] is False
+        assert stored['score'] == dataset.quality['score']
+
+    def test_update_quality(self):
+        dataset = DatasetFactory(description='', frequency='daily')
+        assert dataset.quality['update_fulfilled_in_time']
+        # Time goes by without any save
+        Dataset.objects(id=dataset.id).update(
+            last_modified_internal=datetime.utcnow() - timedelta(days=3))
+        dataset.reload()
+        assert dataset.quality['update_fulfilled_in_time']
+
+        dataset.update_quality()
+
+        assert Dataset.objects.get(id=dataset.id).quality['update_fulfilled_in_time'] is False
+
     def test_tags_normalized(self):
         tags = [' one another!', ' one another!', 'This IS a "tag"…']
         dataset = DatasetFactory(tags=tags)
@@ -300,6 +336,28 @@ class ResourceModelTest:
             resource.title = 'New title'
             resource.save(signal_kwargs={'ignores': ['post_save']})
 
+    def test_update_extras(self):
+        resources = ResourceFactory.build_batch(2)
+        dataset = DatasetFactory(resources=resources)
+        resource = dataset.resources[1]
+        resource.extras = {'existing': 'value'}
+        dataset.save()
+        other = Dataset.objects.get(id=dataset.id)
+        other.title = 'Changed in memory only'
+
+        with assert_not_emit(post_save, Dataset.after_save, Dataset.on_update):
+            resource.update_extras({'check:status': 200, 'check:available': True})
+
+        assert resource.extras['check:status'] == 200
+        dataset.reload()
+        assert dataset.resources[1].extras == {
+            'existing': 'value',
+            'check:status': 200,
+            'check:available': True,
+        }
+        assert dataset.resources[0].extras == {}
+        assert dataset.title != other.title
+
 
 class LicenseModelTest:
     @pytest.fixture(autouse=True)
@@ -1,9 +1,15 @@
 from udata.core.user.factories import UserFactory
+import gzip
 import pytest
 
+from io import StringIO
+
 from udata.models import Dataset, Topic, CommunityResource, Transfer
 from udata.core.dataset import tasks
+from udata.core import storages
 from udata.core.dataset.factories import DatasetFactory, CommunityResourceFactory
+from udata.core.organization.factories import OrganizationFactory
+from udata.frontend import csv
 # Those imports seem mandatory for the csv adapters to be registered.
 # This might be because of the decorator mechanism.
 from udata.core.dataset.csv import DatasetCsvAdapter, ResourcesCsvAdapter  # noqa
@@ -63,3 +69,27 @@ def test_export_csv(app):
         assert model in extras
     fs_filenames = [r.fs_filename for r in dataset.resources if r.url.endswith(r.fs_filename)]
     assert len(fs_filenames) == len(dataset.resources)
+
+
+@pytest.mark.usefixtures('instance_path')
+@pytest.mark.options(EXPORT_CSV_MODELS=['organization'], EXPORT_CSV_CHUNK_SIZE=2,
+                     EXPORT_CSV_WORKERS=2, EXPORT_CSV_GZIP=True)
+def test_export_csv_chunked_and_gzipped(app):
+    dataset = DatasetFactory()
+    app.config['EXPORT_CSV_DATASET_ID'] = dataset.id
+    organizations = OrganizationFactory.create_batch(5)
+
+    tasks.export_csv()
+
+    dataset = Dataset.objects.get(id=dataset.id)
+    assert len(dataset.resources) == 2
+    plain, compressed = sorted(dataset.resources,
+                               key=lambda r: r.extras.get('csv-export:gzip', False))
+    assert compressed.extras['csv-export:gzip'] is True
+    assert compressed.fs_filename.endswith('.csv.gz')
+
+    content = storages.resources.read(plain.fs_filename)
+    assert gzip.decompress(storages.resources.read(compressed.fs_filename)) == content
+    rows = list(csv.get_reader(StringIO(content.decode('utf8'))))
+    assert len(rows) == len(organizations) + 1
+    assert [row[0] for row in rows[1:]] == sorted(str(o.id) for o in organizations)
@@ -1,7 +1,9 @@
+import gzip
 import re
 from io import StringIO
 
 import factory
+import pytest
 
 from random import randint
 
@@ -11,7 +13,7 @@ from flask import url_for, Blueprint
 
 from udata.models import db
 from udata.frontend import csv
-from udata.utils import faker
+from udata.utils import faker, recursive_get
 
 from . import FrontTestCase
 
@@ -378,3 +380,81 @@ class CsvTest(FrontTestCase):
         self.assertEqual(len(row), len(header))
         self.assertEqual(row[0], fake.title)
         self.assertEqual(row[1], fake.description)
+
+    def test_yield_rows_by_blocks(self):
+        @csv.adapter(Fake)
+        class Adapter(csv.Adapter):
+            fields = ['title', 'description']
+
+        objects = FakeFactory.build_batch(10)
+        adapter = Adapter(objects)
+
+        blocks = list(csv.yield_rows(adapter, block_size=100))
+
+        # Header first then blocks of several rows
+        self.assertEqual(blocks[0], '"title";"description"\r\n')
+        self.assertLess(len(blocks), len(objects) + 1)
+        self.assertTrue(all(len(block) >= 100 for block in blocks[1:-1]))
+        rows = list(csv.get_reader(StringIO(''.join(blocks[1:]))))
+        self.assertEqual([row[0] for row in rows], [o.title for o in objects])
+
+    @pytest.mark.options(CSV_STREAM_GZIP=True)
+    def test_stream_gzip(self):
+        @csv.adapter(Fake)
+        class Adapter(csv.Adapter):
+            fields = ['title', 'description']
+
+        fakes = [FakeFactory() for _ in range(3)]
+
+        response = self.get(url_for('testcsv.from_adapter'),
+                            headers={'Accept-Encoding': 'gzip, deflate'})
+
+        self.assert200(response)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        data = gzip.decompress(response.data).decode('utf8')
+        rows = list(csv.get_reader(StringIO(data)))
+        self.assertEqual(rows[0], ['title', 'description'])
+        self.assertEqual([row[0] for row in rows[1:]], [f.title for f in fakes])
+
+    @pytest.mark.options(CSV_STREAM_GZIP=True)
+    def test_stream_gzip_not_accepted(self):
+        response = self.assert_stream_csv('testcsv.from_adapter')
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_compile_getter(self):
+        fake = FakeFactory.build(sub=NestedFake(key='key'), metrics={'a': {'b': 1}})
+
+        for path in ('title', 'sub.key', 'metrics.a.b', 'metrics.c', 'sub.unknown.key', 'unknown'):
+            self.assertEqual(csv.compile_getter(path)(fake), recursive_get(fake, path))
+        self.assertIsNone(csv.compile_getter('title')(None))
+
+    def test_projection(self):
+        class Adapter(csv.Adapter):
+            fields = ['title', ('key', 'sub.key'), ('tags', lambda o: ','.join(o.tags))]
+            requires = ('tags',)
+
+        FakeFactory(sub=NestedFake(key='key'), other=['other'])
+
+        adapter = Adapter(Fake.objects)
+        self.assertEqual(adapter.projection(), ['sub', 'tags', 'title'])
+        fake = adapter.get_queryset().first()
+        self.assertEqual(fake.other, [])
+        self.assertEqual(list(adapter.rows()), [[fake.title, 'key', ','.join(fake.tags)]])
+
+    def test_no_projection(self):
+        class Adapter(csv.Adapter):
+            fields = ['title']
+
+        self.assertIsNone(Adapter(Fake.objects).projection())
+        self.assertIsNone(Adapter(FakeFactory.build_batch(2)).projection())
+
+    def test_faulty_field_is_blanked(self):
+        def fail(obj):
+            raise ValueError('KO')
+
+        class Adapter(csv.Adapter):
+            fields = ['title', ('fail', fail), 'description']
+
+        fake = FakeFactory.build()
+        self.assertEqual(Adapter([fake]).to_row(fake), [fake.title, '', fake.description])
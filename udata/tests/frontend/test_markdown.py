@@ -4,7 +4,7 @@ from bleach._vendor import html5lib
 from flask import render_template_string
 
 from udata.utils import faker
-from udata.frontend.markdown import md, parse_html, EXCERPT_TOKEN
+from udata.frontend.markdown import md, mdstrip, parse_html, EXCERPT_TOKEN
 
 parser = html5lib.HTMLParser(tree=html5lib.getTreeBuilder("dom"))
 
@@ -282,6 +282,47 @@ class MdStripTest:
 
         assert result.strip() == '1234$'
 
+    def test_mdstrip_fast_path_is_consistent(self, app, mocker):
+        '''mdstrip should only render leading paragraphs when long enough'''
+        paragraphs = ['[link {0}](http://example.com/{0}) '.format(i) + 'word ' * 20
+                      for i in range(20)]
+        text = '\n\n'.join(paragraphs)
+        extension = app.extensions['markdown']
+        with app.test_request_context('/'):
+            render = mocker.spy(extension, 'render')
+            result = mdstrip(text, 50)
+            assert len(render.call_args[0][0]) < len(text)
+            extension.cache.clear()
+            assert result == mdstrip(text + '\n\n[ref]: http://example.com', 50)
+
+
+@pytest.mark.frontend
+class MarkdownCacheTest:
+    def test_rendering_is_cached(self, app, mocker):
+        extension = app.extensions['markdown']
+        render = mocker.spy(extension, 'render')
+        text = '[foo](/)'
+        with app.test_request_context('/'):
+            first = md(text)
+            assert md(text) == first
+            assert mdstrip(text) == mdstrip(text) == 'foo'
+        assert render.call_count == 2  # One for `md`, one for `mdstrip`
+
+    def test_cache_depends_on_scheme(self, app):
+        text = '[foo](/)'
+        with app.test_request_context('/'):
+            http = md(text)
+        with app.test_request_context('/', base_url='https://local.test'):
+            https = md(text)
+        assert 'http://local.test/' in http
+        assert 'https://local.test/' in https
+
+    def test_cleaner_is_reused(self, app):
+        extension = app.extensions['markdown']
+        with app.test_request_context('/'):
+            assert extension.cleaner() is extension.cleaner()
+            assert extension.cleaner(True) is not extension.cleaner()
+
 
 class HtmlToMarkdownTest:
     def test_string_is_untouched(self):
@@ -1,17 +1,23 @@
 import datetime
+import pytest
 
 from flask import current_app
 from flask_restx import inputs
 from flask_restx.reqparse import RequestParser
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 
 from udata import search
 from udata.i18n import gettext as _
 from udata.utils import clean_string
-from udata.search import reindex, as_task_param
+from udata.search import reindex, as_task_param, BulkIndexer, bulk_indexing
 from udata.search.commands import index_model
 from udata.core.dataset.search import DatasetSearch
-from udata.core.dataset.factories import DatasetFactory, VisibleDatasetFactory
+from udata.core.dataset.factories import DatasetFactory, VisibleDatasetFactory, LicenseFactory
+from udata.core.dataset.models import Dataset
+from udata.core.organization.factories import OrganizationFactory
+from udata.core.reuse.factories import VisibleReuseFactory
+from udata.core.reuse.search import ReuseSearch
+from udata.core.user.factories import UserFactory
 from udata.tests.api import APITestCase
 
 from . import FakeSearch
@@ -166,3 +172,127 @@ class IndexingLifecycleTest(APITestCase):
         }
         url = f"{current_app.config['SEARCH_SERVICE_API_URL']}/datasets/index"
         mock_req.assert_called_with(url, json=expected_value)
+
+
+@pytest.mark.options(SEARCH_SERVICE_BULK_ENDPOINTS=True)
+class BulkIndexerTest(APITestCase):
+
+    def test_debounce_and_flush_by_adapter(self):
+        session = MagicMock()
+        dataset = VisibleDatasetFactory()
+        other = VisibleDatasetFactory()
+
+        with BulkIndexer(session=session) as indexer:
+            indexer.index(dataset, DatasetSearch)
+            indexer.index(other, DatasetSearch)
+            indexer.index(dataset, DatasetSearch)
+            session.post.assert_not_called()
+
+        api_url = current_app.config['SEARCH_SERVICE_API_URL']
+        url = f"{api_url}{DatasetSearch.search_url}bulk-index"
+        session.post.assert_called_once_with(url, json={
+            'documents': [DatasetSearch.serialize(other), DatasetSearch.serialize(dataset)]
+        }, timeout=current_app.config['SEARCH_SERVICE_REQUEST_TIMEOUT'])
+        assert indexer.indexed == 2
+
+    def test_flush_when_batch_size_is_reached(self):
+        session = MagicMock()
+        datasets = VisibleDatasetFactory.create_batch(3)
+
+        indexer = BulkIndexer(batch_size=2, session=session)
+        for dataset in datasets:
+            indexer.index(dataset, DatasetSearch)
+        assert session.post.call_count == 1
+
+        indexer.flush()
+        assert session.post.call_count == 2
+        assert indexer.indexed == 3
+
+    def test_unindex_non_indexable(self):
+        session = MagicMock()
+        dataset = DatasetFactory()
+
+        with BulkIndexer(session=session) as indexer:
+            indexer.index(dataset, DatasetSearch)
+
+        api_url = current_app.config['SEARCH_SERVICE_API_URL']
+        url = f"{api_url}{DatasetSearch.search_url}bulk-unindex"
+        timeout = current_app.config['SEARCH_SERVICE_REQUEST_TIMEOUT']
+        session.post.assert_called_once_with(url, json={'ids': [str(dataset.id)]}, timeout=timeout)
+
+    def test_ignore_non_indexable_on_reindex(self):
+        session = MagicMock()
+        dataset = DatasetFactory()
+
+        indexer = BulkIndexer(index='dataset-2022-02-20-20-02', reindex=True, session=session)
+        with indexer:
+            indexer.index(dataset, DatasetSearch)
+
+        session.post.assert_not_called()
+
+    def test_fallback_on_per_document_endpoints(self):
+        session = MagicMock()
+        dataset = VisibleDatasetFactory()
+        hidden = DatasetFactory()
+
+        with BulkIndexer(index='dataset-index', session=session, bulk=False) as indexer:
+            indexer.index(dataset, DatasetSearch)
+            indexer.index(hidden, DatasetSearch)
+
+        api_url = current_app.config['SEARCH_SERVICE_API_URL']
+        timeout = current_app.config['SEARCH_SERVICE_REQUEST_TIMEOUT']
+        session.post.assert_called_once_with(f'{api_url}{DatasetSearch.search_url}index', json={
+            'document': DatasetSearch.serialize(dataset),
+            'index': 'dataset-index',
+        }, timeout=timeout)
+        session.delete.assert_called_once_with(
+            f'{api_url}{DatasetSearch.search_url}{hidden.id}/unindex', timeout=timeout)
+        assert indexer.indexed == 1
+        assert indexer.unindexed == 1
+
+    @pytest.mark.options(AUTO_INDEX=True, SEARCH_SERVICE_API_URL='http://search.local/api/1/')
+    @patch('udata.search.reindex_many.delay')
+    @patch('udata.search.reindex.delay')
+    def test_bulk_indexing_defers_and_deduplicates(self, mock_reindex, mock_reindex_many):
+        dataset = VisibleDatasetFactory()
+        mock_reindex.reset_mock()
+
+        with bulk_indexing():
+            dataset.save()
+            dataset.save()
+
+        mock_reindex.assert_not_called()
+        mock_reindex_many.assert_called_once_with('Dataset', [str(dataset.id)])
+
+
+class SerializeManyTest(APITestCase):
+
+    def test_dataset_serialize_many(self):
+        org = OrganizationFactory()
+        user = UserFactory()
+        license = LicenseFactory()
+        datasets = [
+            VisibleDatasetFactory(organization=org, license=license),
+            VisibleDatasetFactory(organization=org),
+            VisibleDatasetFactory(owner=user),
+        ]
+        ids = [d.id for d in datasets]
+        datasets = list(Dataset.objects(id__in=ids).order_by('created_at_internal'))
+
+        docs = DatasetSearch.serialize_many(datasets)
+
+        assert docs == [DatasetSearch.serialize(d) for d in datasets]
+        assert docs[0]['organization']['id'] == str(org.id)
+        assert docs[0]['license'] == license.id
+        assert docs[2]['owner'] == str(user.id)
+
+    def test_reuse_serialize_many(self):
+        org = OrganizationFactory()
+        user = UserFactory()
+        reuses = [VisibleReuseFactory(organization=org), VisibleReuseFactory(owner=user)]
+
+        docs = ReuseSearch.serialize_many(reuses)
+
+        assert docs == [ReuseSearch.serialize(r) for r in reuses]
+        assert docs[0]['organization']['name'] == org.name
+        assert docs[1]['owner'] == str(user.id)
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+
+from udata.core.dataset.factories import DatasetFactory, VisibleDatasetFactory
+from udata.core.dataset.models import Dataset
+from udata.core.dataset.search import DatasetSearch
+from udata.search.reindex import Reindexation, checkpoints, split_ranges
+
+
+def indexed_ids(session):
+    '''The documents ids indexed in bulk or one by one'''
+    ids = []
+    for call in session.post.call_args_list:
+        payload = call.kwargs['json']
+        if call.args[0].endswith('bulk-index'):
+            ids += [d['id'] for d in payload['documents']]
+        elif call.args[0].endswith('/index'):
+            ids.append(payload['document']['id'])
+    return ids
+
+
+@pytest.mark.usefixtures('clean_db')
+class ReindexationTest:
+    def test_split_ranges(self):
+        datasets = sorted(DatasetFactory.create_batch(5), key=lambda d: d.id)
+
+        ranges = split_ranges(Dataset, 2)
+
+        assert ranges == [
+            (datasets[0].id, datasets[2].id),
+            (datasets[2].id, datasets[4].id),
+            (datasets[4].id, None),
+        ]
+
+    def test_split_ranges_empty(self):
+        assert split_ranges(Dataset, 2) == []
+
+    def test_run_index_all_ranges(self):
+        datasets = VisibleDatasetFactory.create_batch(5)
+        session = MagicMock()
+
+        reindexation = Reindexation([DatasetSearch], 'suffix', workers=2,
+                                    range_size=2, session=session)
+
+        assert reindexation.run()
+        assert sorted(indexed_ids(session)) == sorted(str(d.id) for d in datasets)
+        assert session.post.call_args_list[0].kwargs['json'] == {'index': 'dataset-suffix'}
+        assert checkpoints().count_documents({'reindex': 'suffix', 'done': True}) == 3
+
+    @pytest.mark.options(SEARCH_SERVICE_BULK_ENDPOINTS=True)
+    def test_run_index_all_ranges_in_bulk(self):
+        datasets = VisibleDatasetFactory.create_batch(5)
+        session = MagicMock()
+
+        reindexation = Reindexation([DatasetSearch], 'suffix', workers=2,
+                                    range_size=2, session=session)
+
+        assert reindexation.run()
+        urls = [call.args[0] for call in session.post.call_args_list]
+        assert all(url.endswith(('create-index', 'bulk-index')) for url in urls)
+        assert sorted(indexed_ids(session)) == sorted(str(d.id) for d in datasets)
+        assert checkpoints().count_documents({'reindex': 'suffix', 'done': True}) == 3
+
+    def test_resume(self):
+        datasets = sorted(VisibleDatasetFactory.create_batch(4), key=lambda d: d.id)
+        session = MagicMock()
+        reindexation = Reindexation([DatasetSearch], 'suffix', range_size=2, session=session)
+        reindexation.prepare(DatasetSearch)
+        # The first range has been indexed before an interruption
+        checkpoints().update_one({'reindex': 'suffix', 'lower': datasets[0].id},
+                                 {'$set': {'done': True}})
+        session.reset_mock()
+
+        assert reindexation.run()
+
+        assert sorted(indexed_ids(session)) == sorted(str(d.id) for d in datasets[2:])
+        # The index is not created again
+        assert not any(call.args[0].endswith('create-index')
+                       for call in session.post.call_args_list)
+
+    def test_failed_range_stays_pending(self):
+        VisibleDatasetFactory.create_batch(2)
+        session = MagicMock()
+        session.post.return_value.raise_for_status.side_effect = [None, Exception('KO')]
+
+        reindexation = Reindexation([DatasetSearch], 'suffix', session=session)
+
+        assert not reindexation.run()
+        assert checkpoints().count_documents({'reindex': 'suffix', 'done': False}) == 1
+
+    def test_finalize_catch_up_modified_documents(self):
+        start = datetime.utcnow().replace(microsecond=0)
+        VisibleDatasetFactory(last_modified_internal=start - timedelta(days=1))
+        modified = VisibleDatasetFactory(last_modified_internal=start)
+        session = MagicMock()
+        reindexation = Reindexation([DatasetSearch], 'suffix', session=session)
+        assert reindexation.run()
+        session.reset_mock()
+
+        reindexation.finalize(start, ['dataset'])
+
+        urls = [call.args[0] for call in session.post.call_args_list]
+        assert urls[0].endswith('/index')
+        assert urls[1].endswith('set-index-alias')
+        assert indexed_ids(session) == [str(modified.id)]
+        assert session.post.call_args_list[0].kwargs['json']['index'] == 'dataset-suffix'
+        assert session.post.call_args_list[1].kwargs['json'] == {
+            'index_suffix_name': 'suffix',
+            'indices': ['dataset'],
+        }
+        assert not checkpoints().count_documents({'reindex': 'suffix'})
@@ -68,3 +68,40 @@ class SiteMetricTest:
         site.count_org_for_badge(PUBLIC_SERVICE)
 
         assert site.get_metrics()[PUBLIC_SERVICE] == len(public_services)
+        site.reload()
+        assert site.get_metrics()[PUBLIC_SERVICE] == len(public_services)
+
+    def test_update_metrics(self, app):
+        site = SiteFactory.create(id=app.config['SITE_ID'], metrics={'legacy': 1})
+        dataset = VisibleDatasetFactory()
+        VisibleDatasetFactory()
+        DatasetFactory(nb_resources=5, private=True)
+        reuse = VisibleReuseFactory()
+        org = OrganizationFactory(badges=[Badge(kind=PUBLIC_SERVICE)])
+        dataset.update(set__metrics__followers=4)
+        reuse.update(set__metrics__datasets=3)
+        org.update(set__metrics__datasets=7)
+
+        timings = site.update_metrics()
+
+        assert set(timings) == set(Site.__metrics_keys__)
+        for metrics in site.metrics, Site.objects.get(id=site.id).metrics:
+            assert metrics['legacy'] == 1
+            assert metrics['datasets'] == 2
+            assert metrics['resources'] == 2
+            assert metrics['reuses'] == 1
+            assert metrics['organizations'] == 1
+            assert metrics[PUBLIC_SERVICE] == 1
+            assert metrics['max_dataset_followers'] == 4
+            assert metrics['max_reuse_datasets'] == 3
+            assert metrics['max_org_datasets'] == 7
+            assert metrics['max_org_reuses'] == 0
+
+    def test_update_metrics_drop(self, app):
+        site = SiteFactory.create(id=app.config['SITE_ID'], metrics={'legacy': 1})
+
+        site.update_metrics(drop=True)
+
+        site.reload()
+        assert 'legacy' not in site.metrics
+        assert site.metrics['datasets'] == 0
@@ -1,5 +1,8 @@
+import gzip
+
 import pytest
 
+from cachelib import SimpleCache
 from flask import url_for
 
 from rdflib import URIRef, Literal, Graph
@@ -10,7 +13,9 @@ from udata.core.dataset.factories import VisibleDatasetFactory
 from udata.core.dataset.models import Dataset
 from udata.core.organization.factories import OrganizationFactory
 from udata.core.site.factories import SiteFactory
-from udata.core.site.rdf import build_catalog
+from udata.core import storages
+from udata.core.site import rdf as site_rdf
+from udata.core.site.rdf import build_catalog, dump_catalog
 from udata.core.user.factories import UserFactory
 from udata.rdf import CONTEXT, DCAT, DCT, HYDRA
 from udata.tests.helpers import assert200, assert404, assert_redirects
@@ -73,6 +78,36 @@ class CatalogTest:
         user_names = list(graph.objects(users[0], FOAF.name))
         assert len(user_names) == 1
 
+    def test_publishers_serialized_once(self, mocker):
+        site = SiteFactory()
+        org = OrganizationFactory()
+        VisibleDatasetFactory.create_batch(3, organization=org)
+        to_rdf = mocker.spy(site_rdf, 'organization_to_rdf')
+
+        catalog = build_catalog(site, Dataset.objects.visible())
+
+        to_rdf.assert_called_once()
+        publishers = set(catalog.graph.objects(None, DCT.publisher))
+        assert len(publishers) == 2  # There is the site publisher
+
+    @pytest.mark.options(SITE_CATALOG_CACHE_TIMEOUT=60)
+    def test_cached_fragments(self, mocker):
+        mocker.patch.object(site_rdf, 'cache', SimpleCache())
+        to_rdf = mocker.spy(site_rdf, 'dataset_to_rdf')
+        site = SiteFactory()
+        dataset, other = VisibleDatasetFactory.create_batch(2)
+
+        expected = len(build_catalog(site, [dataset, other]).graph)
+        assert to_rdf.call_count == 2
+        assert len(build_catalog(site, [dataset, other]).graph) == expected
+        assert to_rdf.call_count == 2
+
+        dataset.title = 'A new title'
+        dataset.save()
+        graph = build_catalog(site, [dataset, other]).graph
+        assert to_rdf.call_count == 3
+        assert Literal('A new title') in set(graph.objects(None, DCT.title))
+
     def test_pagination(self):
         site = SiteFactory()
         page_size = 3
@@ -228,3 +263,50 @@ class SiteRdfViewsTest:
         url = url_for('api.site_rdf_catalog_format', format='unknown')
         response = client.get(url)
         assert404(response)
+
+
+@pytest.mark.usefixtures('instance_path')
+class CatalogDumpTest:
+    def test_dump_catalog(self):
+        site = SiteFactory()
+        VisibleDatasetFactory.create_batch(3)
+
+        filenames = dump_catalog(site, Dataset.objects.visible(), ['turtle', 'json-ld'])
+
+        assert filenames == ['catalog.ttl.gz', 'catalog.json.gz']
+        with storages.catalogs.open('catalog.ttl.gz', 'rb') as f:
+            graph = Graph().parse(data=gzip.decompress(f.read()), format='turtle')
+        assert len(list(graph.subjects(RDF.type, DCAT.Dataset))) == 3
+
+    @pytest.mark.parametrize('fmt', ['xml', 'turtle', 'nt', 'json-ld'])
+    def test_dump_catalog_by_pages(self, fmt):
+        site = SiteFactory()
+        datasets = VisibleDatasetFactory.create_batch(5)
+        expected = build_catalog(site, datasets).graph
+
+        filename, = dump_catalog(site, Dataset.objects.visible(), [fmt], page_size=2)
+
+        with storages.catalogs.open(filename, 'rb') as f:
+            graph = Graph().parse(data=gzip.decompress(f.read()), format=fmt)
+        assert len(list(graph.subjects(RDF.type, DCAT.Dataset))) == 5
+        assert len(list(graph.subjects(RDF.type, DCAT.Catalog))) == 1
+        catalog = next(graph.subjects(RDF.type, DCAT.Catalog))
+        assert len(list(graph.objects(catalog, DCAT.dataset))) == 5
+        assert len(list(graph.objects(catalog, DCT.publisher))) == 1
+        assert len(graph) == len(expected)
+
+    def test_dump_empty_catalog(self):
+        filename, = dump_catalog(SiteFactory(), Dataset.objects.visible(), ['xml'])
+
+        with storages.catalogs.open(filename, 'rb') as f:
+            graph = Graph().parse(data=gzip.decompress(f.read()), format='xml')
+        assert len(list(graph.subjects(RDF.type, DCAT.Catalog))) == 1
+
+    def test_dump_endpoint(self, api):
+        dump_catalog(SiteFactory(), Dataset.objects.visible(), ['xml'])
+
+        response = api.get(url_for('api.site_rdf_catalog_dump', format='xml'))
+        assert_redirects(response, storages.catalogs.url('catalog.xml.gz', external=True))
+
+        response = api.get(url_for('api.site_rdf_catalog_dump', format='ttl'))
+        assert404(response)
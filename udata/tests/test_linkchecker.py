@@ -1,6 +1,10 @@
 import mock
 import pytest
+import requests
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from udata.auth import login_user
 from udata.tests import TestCase
@@ -8,7 +12,10 @@ from udata.core.activity import init_app as init_activity
 from udata.core.activity.models import Activity
 from udata.core.dataset.factories import DatasetFactory, ResourceFactory
 from udata.core.user.factories import UserFactory
-from udata.linkchecker.checker import check_resource
+from udata.core.dataset.models import Dataset
+from udata.linkchecker.backends import HttpLinkchecker
+from udata.linkchecker.checker import check_resource, run_checks, CheckEngine, HostLimiter
+from udata.linkchecker.tasks import check_resources
 from udata.settings import Testing
 
 
@@ -269,3 +276,273 @@ class LinkcheckerTest(TestCase):
             'check:count-availability': 300
         }
         self.assertTrue(self.resource.need_check())
+
+
+@pytest.mark.usefixtures('clean_db')
+@pytest.mark.options(LINKCHECKING_MIN_CACHE_DURATION=0.5,
+                     LINKCHECKING_UNAVAILABLE_THRESHOLD=100,
+                     LINKCHECKING_MAX_CACHE_DURATION=100)
+class CheckEngineTest:
+    @pytest.fixture
+    def linkchecker(self, mocker):
+        checked = []
+
+        class DummyLinkchecker:
+            def check(self, resource):
+                checked.append(resource.id)
+                return {'check:status': 200, 'check:available': True,
+                        'check:date': datetime.utcnow()}
+        mocker.patch('udata.linkchecker.checker.get_linkchecker',
+                     return_value=DummyLinkchecker)
+        return checked
+
+    def test_check_resources_grouped_by_dataset(self, linkchecker, mocker):
+        datasets = [DatasetFactory(resources=ResourceFactory.build_batch(3))
+                    for _ in range(2)]
+        save = mocker.spy(Dataset, 'save')
+
+        check_resources(6)
+
+        assert len(linkchecker) == 6
+        assert not save.called
+        for dataset in datasets:
+            dataset.reload()
+            for resource in dataset.resources:
+                assert resource.extras['check:status'] == 200
+                assert resource.extras['check:count-availability'] == 1
+
+    def test_skip_fresh_resources(self, linkchecker):
+        fresh = ResourceFactory(extras={'check:available': True,
+                                        'check:date': datetime.utcnow(),
+                                        'check:status': 200})
+        dataset = DatasetFactory(resources=[fresh, ResourceFactory()])
+
+        engine = CheckEngine(workers=2, batch_size=1)
+        engine.run((dataset.id, r.id) for r in dataset.resources)
+
+        assert linkchecker == [dataset.resources[1].id]
+        assert engine.checked == 1
+        assert engine.skipped == 1
+
+    def test_errors_are_not_stored(self, mocker):
+        class FailingLinkchecker:
+            def check(self, _):
+                return {'check:error': 'ERROR'}
+        mocker.patch('udata.linkchecker.checker.get_linkchecker',
+                     return_value=FailingLinkchecker)
+        dataset = DatasetFactory(resources=[ResourceFactory()])
+
+        engine = CheckEngine()
+        engine.run([(dataset.id, dataset.resources[0].id)])
+
+        assert engine.errors == 1
+        dataset.reload()
+        assert 'check:status' not in dataset.resources[0].extras
+
+    def test_datasets_quality_updated(self, mocker):
+        class UnavailableLinkchecker:
+            def check(self, _):
+                return {'check:status': 404, 'check:available': False,
+                        'check:date': datetime.utcnow()}
+        mocker.patch('udata.linkchecker.checker.get_linkchecker',
+                     return_value=UnavailableLinkchecker)
+        dataset = DatasetFactory(resources=[ResourceFactory()])
+        assert dataset.quality['all_resources_available']
+
+        engine = CheckEngine()
+        engine.run([(dataset.id, dataset.resources[0].id)])
+
+        dataset.reload()
+        assert dataset.quality['all_resources_available'] is False
+
+    def test_check_many_by_dataset_and_host(self, mocker):
+        batches = []
+
+        class BatchLinkchecker:
+            def check(self, resource):
+                raise AssertionError('check_many should be used')
+
+            def check_many(self, resources, limit):
+                batches.append(sorted(str(r.id) for r in resources))
+                return [{'check:status': 200, 'check:available': True,
+                         'check:date': datetime.utcnow()} for _ in resources]
+        mocker.patch('udata.linkchecker.checker.get_linkchecker',
+                     return_value=BatchLinkchecker)
+        dataset = DatasetFactory(resources=[
+            ResourceFactory(url='http://example.com/a'),
+            ResourceFactory(url='http://example.com/b'),
+            ResourceFactory(url='http://example.org/c'),
+        ])
+
+        engine = CheckEngine()
+        engine.run((dataset.id, r.id) for r in dataset.resources)
+
+        assert engine.checked == 3
+        ids = [str(r.id) for r in dataset.resources]
+        assert sorted(batches) == sorted([sorted(ids[:2]), ids[2:]])
+        dataset.reload()
+        for resource in dataset.resources:
+            assert resource.extras['check:status'] == 200
+
+    def test_limit_each_check(self, linkchecker, mocker):
+        limit = mocker.spy(HostLimiter, 'limit')
+        dataset = DatasetFactory(resources=[
+            ResourceFactory(url='http://example.com/a'),
+            ResourceFactory(url='http://example.com/b'),
+        ])
+
+        engine = CheckEngine(max_per_host=1)
+        engine.run((dataset.id, r.id) for r in dataset.resources)
+
+        assert len(linkchecker) == 2
+        assert limit.call_count == 2
+
+    def test_limit_each_request_of_a_batch(self, mocker, stand_in_server):
+        limit = mocker.spy(HostLimiter, 'limit')
+        mocker.patch('udata.linkchecker.checker.get_linkchecker',
+                     return_value=HttpLinkchecker)
+        dataset = DatasetFactory(resources=[
+            ResourceFactory(url=stand_in_server + '/ok'),
+            ResourceFactory(url=stand_in_server + '/missing'),
+        ])
+
+        engine = CheckEngine(max_per_host=1)
+        engine.run((dataset.id, r.id) for r in dataset.resources)
+
+        assert engine.checked == 2
+        assert limit.call_count == 2
+        dataset.reload()
+        assert [r.extras['check:status'] for r in dataset.resources] == [200, 404]
+
+    def test_check_many_missing_results(self, mocker):
+        class ShortLinkchecker:
+            def check_many(self, resources, limit):
+                return [{'check:status': 200, 'check:available': True,
+                         'check:date': datetime.utcnow()}]
+        mocker.patch('udata.linkchecker.checker.get_linkchecker',
+                     return_value=ShortLinkchecker)
+        dataset = DatasetFactory(resources=[
+            ResourceFactory(url='http://example.com/a'),
+            ResourceFactory(url='http://example.com/b'),
+        ])
+
+        engine = CheckEngine()
+        engine.run((dataset.id, r.id) for r in dataset.resources)
+
+        assert engine.errors == 2
+        dataset.reload()
+        assert all('check:status' not in r.extras for r in dataset.resources)
+
+
+@pytest.mark.options(LINKCHECKING_IGNORE_DOMAINS=['example-ignore.com'])
+def test_run_checks_keeps_order(app, mocker):
+    class EchoLinkchecker:
+        def check_many(self, resources, limit):
+            return [{'check:status': int(r.title)} for r in resources]
+    mocker.patch('udata.linkchecker.checker.get_linkchecker',
+                 return_value=EchoLinkchecker)
+    resources = [
+        ResourceFactory.build(title='200', url='http://example.com/a'),
+        ResourceFactory.build(title='404', url='http://example-ignore.com/b'),
+        ResourceFactory.build(title='404', url='http://example.com/c'),
+    ]
+
+    results = run_checks(resources)
+
+    assert results[0] == ({'check:status': 200}, True)
+    assert results[1][0]['check:status'] == 204
+    assert results[1][1] is False
+    assert results[2] == ({'check:status': 404}, True)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''Answer with the status given by the path, `/nohead` not supporting `HEAD`'''
+    STATUSES = {'/ok': 200, '/missing': 404, '/nohead': 200}
+
+    def respond(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.respond(405 if self.path == '/nohead' else self.STATUSES.get(self.path, 404))
+
+    def do_GET(self):
+        self.respond(self.STATUSES.get(self.path, 404))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_server():
+    '''A local HTTP server, yielding its root URL'''
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+class HttpLinkcheckerTest:
+    def test_check_many(self, app, stand_in_server):
+        urls = [stand_in_server + path for path in ('/ok', '/missing', '/nohead')]
+        resources = [ResourceFactory.build(url=url) for url in urls]
+        limited = []
+
+        @contextmanager
+        def limit(url):
+            limited.append(url)
+            yield
+
+        results = HttpLinkchecker().check_many(resources, limit=limit)
+
+        assert [r['check:status'] for r in results] == [200, 404, 200]
+        assert [r['check:available'] for r in results] == [True, False, True]
+        assert [r['check:url'] for r in results] == urls
+        # Each request of the batch goes through the politeness limit
+        assert sorted(limited) == sorted(urls)
+
+    def test_check(self, app, rmock):
+        rmock.head('http://example.com/ok', status_code=200)
+        rmock.head('http://example.com/missing', status_code=404)
+        rmock.head('http://example.com/nohead', status_code=405)
+        rmock.get('http://example.com/nohead', status_code=200)
+        resources = [
+            ResourceFactory.build(url='http://example.com/ok'),
+            ResourceFactory.build(url='http://example.com/missing'),
+            ResourceFactory.build(url='http://example.com/nohead'),
+        ]
+
+        linkchecker = HttpLinkchecker()
+        results = [linkchecker.check(resource) for resource in resources]
+
+        assert [r['check:status'] for r in results] == [200, 404, 200]
+        assert [r['check:available'] for r in results] == [True, False, True]
+        assert results[2]['check:url'] == 'http://example.com/nohead'
+
+    def test_check_error(self, app, rmock):
+        rmock.head('http://example.com/down', exc=requests.exceptions.ConnectionError)
+        resource = ResourceFactory.build(url='http://example.com/down')
+
+        result = HttpLinkchecker().check(resource)
+
+        assert 'check:error' in result
+
+
+def test_host_limiter_delay(mocker):
+    sleep = mocker.patch('udata.linkchecker.checker.time.sleep')
+    limiter = HostLimiter(max_per_host=1, delay=10)
+
+    with limiter.limit('http://example.com/a'):
+        pass
+    with limiter.limit('http://example.org/a'):
+        pass
+    assert not sleep.called
+
+    with limiter.limit('http://example.com/b'):
+        pass
+    sleep.assert_called_once()
+    assert sleep.call_args[0][0] > 9
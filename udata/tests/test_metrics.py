@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+
+from udata.core.dataset.factories import DatasetFactory, VisibleDatasetFactory
+from udata.core.discussions.factories import DiscussionFactory
+from udata.core.metrics import engine
+from udata.core.organization.factories import OrganizationFactory
+from udata.core.reuse.factories import ReuseFactory, VisibleReuseFactory
+from udata.core.user.factories import UserFactory
+from udata.models import Dataset, Follow, Member, Organization, Reuse, User
+
+
+def reset_metrics(*models):
+    for model in models:
+        model._get_collection().update_many({}, {'$set': {'metrics': {}}})
+
+
+@pytest.mark.usefixtures('clean_db')
+class MetricsEngineTest:
+    def test_dataset_metrics(self):
+        user = UserFactory()
+        dataset, other = VisibleDatasetFactory.create_batch(2)
+        VisibleReuseFactory(datasets=[dataset, dataset, other])
+        VisibleReuseFactory(datasets=[dataset])
+        ReuseFactory(datasets=[dataset], private=True)
+        DiscussionFactory(subject=dataset, user=user)
+        DiscussionFactory(subject=dataset, user=user, closed=datetime.utcnow())
+        DiscussionFactory(subject=VisibleReuseFactory(), user=user)
+        Follow.objects.create(follower=user, following=dataset)
+        Follow.objects.create(follower=user, following=other, until=datetime.utcnow())
+        reset_metrics(Dataset)
+
+        updated = engine.update_metrics(Dataset.objects.visible(), engine.dataset_metrics)
+
+        assert updated == 2
+        dataset.reload()
+        other.reload()
+        assert dataset.metrics == {'discussions': 1, 'reuses': 2, 'followers': 1}
+        assert other.metrics == {'discussions': 0, 'reuses': 1, 'followers': 0}
+
+    def test_organization_and_user_metrics(self):
+        user, follower = UserFactory.create_batch(2)
+        org = OrganizationFactory(members=[Member(user=user, role='admin')])
+        VisibleDatasetFactory.create_batch(2, organization=org)
+        VisibleDatasetFactory(owner=user)
+        DatasetFactory(owner=user)  # Not visible
+        VisibleReuseFactory(owner=user)
+        Follow.objects.create(follower=follower, following=org)
+        Follow.objects.create(follower=follower, following=user)
+        reset_metrics(Organization, User)
+
+        engine.update_metrics(Organization.objects.visible(), engine.organization_metrics)
+        engine.update_metrics(User.objects, engine.user_metrics)
+
+        org.reload()
+        assert org.metrics == {'datasets': 2, 'reuses': 0, 'followers': 1, 'members': 1}
+        user.reload()
+        assert user.metrics == {'datasets': 1, 'reuses': 1, 'followers': 1, 'following': 0}
+        follower.reload()
+        assert follower.metrics['following'] == 2
+
+    def test_only_changed_metrics_are_written(self):
+        VisibleDatasetFactory()
+        reset_metrics(Dataset)
+        assert engine.update_metrics(Dataset.objects, engine.dataset_metrics) == 1
+        assert engine.update_metrics(Dataset.objects, engine.dataset_metrics) == 0
+
+    def test_drop(self):
+        reuse = VisibleReuseFactory()
+        Reuse._get_collection().update_one({'_id': reuse.id},
+                                           {'$set': {'metrics': {'legacy': 42}}})
+
+        engine.update_metrics(Reuse.objects, engine.reuse_metrics)
+        reuse.reload()
+        assert reuse.metrics == {'legacy': 42, 'discussions': 0, 'followers': 0}
+
+        engine.update_metrics(Reuse.objects, engine.reuse_metrics, drop=True)
+        reuse.reload()
+        assert reuse.metrics == {'discussions': 0, 'followers': 0}
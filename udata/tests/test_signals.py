@@ -0,0 +1,75 @@
+import pytest
+
+from udata.core.dataset.factories import DatasetFactory
+from udata.models import db, Dataset
+
+
+@pytest.mark.usefixtures('clean_db')
+class CoalesceSignalsTest:
+    @pytest.fixture
+    def received(self):
+        received = []
+
+        def on_create(dataset):
+            received.append(('create', dataset.title))
+
+        def on_update(dataset):
+            received.append(('update', dataset.title))
+
+        with Dataset.on_create.connected_to(on_create), \
+                Dataset.on_update.connected_to(on_update):
+            yield received
+
+    def test_signals_sent_immediately_outside_block(self, received):
+        dataset = DatasetFactory(title='first')
+        dataset.title = 'second'
+        dataset.save()
+
+        assert received == [('create', 'first'), ('update', 'second')]
+
+    def test_updates_are_coalesced(self, received):
+        dataset = DatasetFactory(title='initial')
+        received.clear()
+
+        with db.coalesce_signals():
+            for title in 'first', 'second', 'last':
+                dataset.title = title
+                dataset.save()
+            assert received == []
+
+        assert received == [('update', 'last')]
+
+    def test_create_supersedes_updates(self, received):
+        with db.coalesce_signals():
+            dataset = DatasetFactory(title='first')
+            dataset.title = 'last'
+            dataset.save()
+            other = DatasetFactory(title='other')
+
+        assert received == [('create', 'last'), ('create', other.title)]
+
+    def test_nested_blocks_are_merged(self, received):
+        dataset = DatasetFactory(title='initial')
+        received.clear()
+
+        with db.coalesce_signals():
+            with db.coalesce_signals():
+                dataset.title = 'inner'
+                dataset.save()
+            assert received == []
+            dataset.title = 'outer'
+            dataset.save()
+
+        assert received == [('update', 'outer')]
+
+    def test_flushed_by_batches(self, received):
+        datasets = [DatasetFactory(title='initial') for _ in range(3)]
+        received.clear()
+
+        with db.coalesce_signals(max_pending=2):
+            for dataset in datasets:
+                dataset.title = 'updated'
+                dataset.save()
+            assert received == [('update', 'updated')] * 2
+
+        assert received == [('update', 'updated')] * 3
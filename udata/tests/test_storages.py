@@ -8,7 +8,7 @@ from flask import url_for, json
 
 from udata.core import storages
 from udata.core.storages import utils
-from udata.core.storages.api import chunk_filename, META
+from udata.core.storages.api import chunk_filename, combine_chunks, META, DEFAULT_MIME
 from udata.core.storages.tasks import purge_chunks
 from udata.utils import faker
 
@@ -53,6 +53,16 @@ class StorageUtilsTest:
         expected = 'CA975130'  # Output of cksfv
         assert utils.crc32(self.file) == expected
 
+    def test_hasher(self):
+        hasher = utils.Hasher()
+        out = BytesIO()
+        utils.copy(self.file, out, hasher, buffer_size=1000)
+        assert out.getvalue() == b'a' * 2 * (2 ** 16)
+        assert hasher.size == 2 * (2 ** 16)
+        assert hasher.sha1 == 'ce5653590804baa9369f72d483ed9eba72f04d29'
+        assert hasher.md5 == '81615449a98aaaad8dc179b3bec87f38'
+        assert hasher.crc32 == 'CA975130'
+
     def test_mime(self):
         assert utils.mime('test.txt') == 'text/plain'
         assert utils.mime('test') is None
@@ -175,6 +185,29 @@ class StorageUploadViewTest:
         assert response.json['mime'] == 'text/plain'
         assert storages.tmp.read(filename) == b'aaaa'
         assert list(storages.chunks.list_files()) == []
+        # Metadata computed while combining should match the storage ones
+        metadata = storages.tmp.metadata(filename)
+        assert response.json['sha1'] == metadata['checksum'].split(':', 1)[1]
+        assert response.json['size'] == metadata['size']
+        assert response.json['mime'] == metadata['mime']
+        assert filename == metadata['filename']
+
+    def test_combine_chunks_metadata_with_prefix_and_unknown_type(self):
+        uuid = uuid4()
+        for i in range(2):
+            storages.chunks.write(chunk_filename(uuid, i), b'a')
+        storages.chunks.write(chunk_filename(uuid, META), '{}')
+
+        fs_filename, metadata = combine_chunks(storages.tmp, {
+            'uuid': uuid,
+            'filename': 'file.unknown',
+            'totalparts': 2,
+        }, prefix='some/prefix')
+
+        assert fs_filename == 'some/prefix/file.unknown'
+        assert metadata['mime'] == DEFAULT_MIME
+        assert metadata['filename'] == storages.tmp.metadata(fs_filename)['filename']
+        assert metadata['filename'] == 'file.unknown'
 
     def test_chunked_upload_bad_chunk(self, client):
         client.login()
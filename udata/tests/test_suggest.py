@@ -0,0 +1,101 @@
+import pytest
+
+from udata.core.organization.api import suggest_index as organizations_index
+from udata.core.organization.factories import OrganizationFactory
+from udata.suggest import SuggestIndex
+
+
+ITEMS = [
+    (1, ['Paris'], 'paris'),
+    (3, ['Parisot', '81310'], 'parisot'),
+    (2, ['Cormeilles-en-Parisis'], 'cormeilles'),
+    (5, ['Lyon', '69000'], 'lyon'),
+]
+
+
+@pytest.mark.options(SUGGEST_INDEX_TTL=300)
+class SuggestIndexTest:
+    def index(self, items=ITEMS):
+        return SuggestIndex('test', lambda: iter(items))
+
+    def test_search_by_rank(self, app):
+        index = self.index()
+        assert index.search('paris', 5) == ['parisot', 'cormeilles', 'paris']
+
+    def test_search_is_case_insensitive_substring(self, app):
+        index = self.index()
+        assert index.search('EILLES-EN', 5) == ['cormeilles']
+        assert index.search('1310', 5) == ['parisot']
+
+    def test_short_queries(self, app):
+        index = self.index()
+        assert index.search('y', 5) == ['lyon']
+        assert index.search('pa', 2) == ['parisot', 'cormeilles']
+
+    def test_size(self, app):
+        index = self.index()
+        assert index.search('is', 1) == ['parisot']
+        assert index.search('is', 0) == []
+        assert index.search('', 5) == []
+
+    def test_no_match(self, app):
+        index = self.index()
+        assert index.search('marseille', 5) == []
+        assert index.search('sip', 5) == []
+
+    def test_built_once(self, app, mocker):
+        load = mocker.Mock(return_value=iter(ITEMS))
+        index = SuggestIndex('test', load)
+        index.search('paris', 5)
+        index.search('lyon', 5)
+        load.assert_called_once()
+
+    def test_expired(self, app, mocker):
+        load = mocker.Mock(side_effect=lambda: iter(ITEMS))
+        index = SuggestIndex('test', load)
+        index.search('paris', 5)
+        app.config['SUGGEST_INDEX_TTL'] = 0
+        index.search('paris', 5)
+        assert load.call_count == 2
+
+    def test_rebuilt_in_background(self, app, mocker):
+        items = [ITEMS, ITEMS[:1]]
+        load = mocker.Mock(side_effect=lambda: iter(items[load.call_count - 1]))
+        index = SuggestIndex('test', load)
+        index.search('paris', 5)
+        app.config.update(SUGGEST_INDEX_TTL=0, SUGGEST_INDEX_BACKGROUND=True)
+
+        # The previous entries are served while rebuilding
+        assert index.search('lyon', 5) == ['lyon']
+        building = index.building
+        if building is not None:
+            building.join()
+
+        assert load.call_count == 2
+        app.config['SUGGEST_INDEX_TTL'] = 300
+        assert index.search('lyon', 5) == []
+
+    def test_invalidation_is_delayed(self, app, mocker):
+        load = mocker.Mock(side_effect=lambda: iter(ITEMS))
+        index = SuggestIndex('test', load)
+        index.search('paris', 5)
+        app.config['SUGGEST_INDEX_REBUILD_DELAY'] = 300
+
+        index.invalidate()
+        index.search('paris', 5)
+        assert load.call_count == 1
+
+        app.config['SUGGEST_INDEX_REBUILD_DELAY'] = 0
+        index.search('paris', 5)
+        assert load.call_count == 2
+
+    @pytest.mark.usefixtures('clean_db')
+    def test_invalidated_on_change(self, app):
+        org = OrganizationFactory(name='Old name')
+        assert organizations_index.search('old', 5) == [org.id]
+
+        org.name = 'New name'
+        org.save()
+
+        assert organizations_index.search('old', 5) == []
+        assert organizations_index.search('new', 5) == [org.id]
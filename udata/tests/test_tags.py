@@ -68,6 +68,47 @@ class TagsTests:
             assert tag.counts['reuses'] == count
 
 
+@pytest.mark.usefixtures('clean_db')
+class TagsCountsTest:
+    def counts(self):
+        return {t.name: (t.counts, t.total) for t in Tag.objects}
+
+    def test_counts_are_updated_on_save_and_delete(self):
+        dataset = DatasetFactory(tags=['a', 'b'])
+        reuse = ReuseFactory(tags=['b'])
+        assert self.counts() == {
+            'a': ({'datasets': 1}, 1),
+            'b': ({'datasets': 1, 'reuses': 1}, 2),
+        }
+
+        dataset.tags = ['b', 'c']
+        dataset.save()
+        assert self.counts() == {
+            'a': ({'datasets': 0}, 0),
+            'b': ({'datasets': 1, 'reuses': 1}, 2),
+            'c': ({'datasets': 1}, 1),
+        }
+
+        dataset.title = 'Tags unchanged'
+        dataset.save()
+        reuse.delete()
+        assert self.counts()['b'] == ({'datasets': 1, 'reuses': 0}, 1)
+
+    def test_count_fixes_inconsistencies(self):
+        DatasetFactory(tags=['a', 'b'])
+        Tag.objects(name='a').update(set__counts={'datasets': 42}, set__total=42)
+        Tag.objects.create(name='stale', counts={'reuses': 3})
+        Tag.objects(name='b').delete()
+
+        count_tags.run()
+
+        assert self.counts() == {
+            'a': ({'datasets': 1}, 1),
+            'b': ({'datasets': 1}, 1),
+            'stale': ({}, 0),
+        }
+
+
 class TagsUtilsTest:
 
     def test_tags_list(self):